@@ -0,0 +1,5 @@
+@rem Copyright (c) 2014 Turbulenz Limited
+@echo off
+@rem Convert many assets in parallel using a pool of processes.
+
+@python -m turbulenz_tools.tools.convertassets %*
@@ -0,0 +1,96 @@
+# Copyright (c) 2014 Turbulenz Limited
+"""
+Tests of the Collada converter.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from multiprocessing import Pool
+from xml.etree import ElementTree
+
+from turbulenz_tools.tools import dae2json
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+SCENE_DAE = os.path.join(DATA_DIR, 'scene.dae')
+
+def convert(input_filename, output_filename, args):
+    (options, _) = dae2json.dae2json_parser('dae2json').parse_args(args)
+    return dae2json.parse(input_filename, output_filename, '', DATA_DIR, None, options).asset
+
+def _convert_job(args):
+    return convert(*args)
+
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_streamed_elements_are_released(self):
+        streamed = [ ]
+        for collada_e, library_e, element_e in dae2json.iterparse_collada(SCENE_DAE):
+            if element_e is None:
+                break
+            # Each element is complete when yielded and the ones before it have been removed from its library
+            self.assertTrue(len(element_e) > 0)
+            self.assertTrue(library_e[0] is element_e)
+            for previous_e in streamed:
+                self.assertEqual(len(previous_e), 0)
+                self.assertEqual(previous_e.attrib, { })
+            streamed.append(element_e)
+        self.assertEqual(len(streamed), 5)
+        for element_e in streamed:
+            self.assertEqual(len(element_e), 0)
+            self.assertEqual(element_e.attrib, { })
+        for library in ('library_geometries', 'library_animations'):
+            library_e = collada_e.find(dae2json.tag(library))
+            self.assertEqual(len(library_e), 0)
+        # The other libraries are kept
+        self.assertEqual(len(collada_e.find(dae2json.tag('library_visual_scenes'))), 1)
+        self.assertEqual(len(collada_e.find(dae2json.tag('library_physics_models'))), 1)
+
+    def test_stream_matches_document(self):
+        document = convert(SCENE_DAE, os.path.join(self.output_dir, 'document.json'), [ ])
+        streamed = convert(SCENE_DAE, os.path.join(self.output_dir, 'streamed.json'), [ '--stream' ])
+        self.assertEqual(streamed, document)
+        # The convex hull read before the mesh it references is resolved once all the geometries are converted
+        self.assertEqual(sorted(streamed['geometries'].keys()), [ 'grid', 'hull', 'strip' ])
+        self.assertEqual(streamed['physicsmodels']['pm/body']['shape'], 'convexhull')
+
+class WorkersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def _convert_in_daemonic_process(self, input_filename):
+        serial = convert(input_filename, os.path.join(self.output_dir, 'serial.json'), [ ])
+        # The workers of a pool, like the ones of convertassets, cannot start a pool of their own
+        pool = Pool(1)
+        try:
+            job = (input_filename, os.path.join(self.output_dir, 'workers.json'), [ '--workers', '2' ])
+            workers = pool.apply(_convert_job, (job,))
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(workers, serial)
+
+    def test_geometries_in_daemonic_process(self):
+        collada_e = ElementTree.parse(SCENE_DAE).getroot()
+        collada_e.remove(collada_e.find(dae2json.tag('library_animations')))
+        input_filename = os.path.join(self.output_dir, 'geometries.dae')
+        ElementTree.ElementTree(collada_e).write(input_filename)
+        self._convert_in_daemonic_process(input_filename)
+
+    def test_joints_in_daemonic_process(self):
+        self._convert_in_daemonic_process(SCENE_DAE)
+
+if __name__ == '__main__':
+    unittest.main()
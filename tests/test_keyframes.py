@@ -0,0 +1,51 @@
+# Copyright (c) 2014 Turbulenz Limited
+"""
+Tests of the keyframe reduction and quantization.
+"""
+
+import math
+import unittest
+
+from turbulenz_tools.tools import keyframes
+
+def _decode_rotation(value, fields):
+    """Decode a smallest three rotation from the fields listed in the quantization, most significant first."""
+    components = [ ]
+    shift = sum(bits for (_, bits) in fields)
+    for (_, bits) in fields:
+        shift -= bits
+        components.append((value >> shift) & ((1 << bits) - 1))
+    largest = components[0]
+    levels = (1 << fields[1][1]) - 1
+    limit = math.sqrt(0.5)
+    q = [ c * 2.0 * limit / levels - limit for c in components[1:] ]
+    q.insert(largest, math.sqrt(max(0.0, 1.0 - sum(c * c for c in q))))
+    return q
+
+class QuantizeRotationsTest(unittest.TestCase):
+
+    ROTATIONS = [ 0.0, 0.0, 0.0, 1.0,
+                  0.5, -0.5, 0.5, -0.5,
+                  0.0, -0.9238795, 0.0, 0.3826834,
+                  0.1825742, 0.3651484, 0.5477226, 0.7302967 ]
+    BOUNDS = [ { 'center': [ 0.0, 0.0, 0.0 ], 'halfExtent': [ 1.0, 1.0, 1.0 ] } ]
+
+    def test_fit_in_32_bits(self):
+        tracks = [ { 'times': [ 0.0, 1.0, 2.0, 3.0 ], 'rotation': list(self.ROTATIONS) } ]
+        (quantization, (rotation_error, _)) = keyframes.quantize_tracks(tracks, self.BOUNDS)
+        fields = quantization['rotation']['fields']
+        self.assertEqual(fields[0], [ 'largest', 2 ])
+        self.assertEqual(sum(bits for (_, bits) in fields), 32)
+        self.assertEqual(quantization['rotation']['type'], 'uint32')
+        for (n, value) in enumerate(tracks[0]['rotation']):
+            self.assertTrue(0 <= value < (1 << 32))
+            decoded = _decode_rotation(value, fields)
+            original = self.ROTATIONS[4 * n:4 * n + 4]
+            self.assertTrue(keyframes._rotation_error(decoded, original) <= rotation_error + 1e-9)
+        self.assertTrue(rotation_error < 0.2)
+
+    def test_reject_more_bits(self):
+        self.assertRaises(ValueError, keyframes.quantize_rotations, self.ROTATIONS, keyframes.MAX_ROTATION_BITS + 1)
+
+if __name__ == '__main__':
+    unittest.main()
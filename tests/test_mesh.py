@@ -0,0 +1,51 @@
+# Copyright (c) 2014 Turbulenz Limited
+"""
+Tests of the mesh processing.
+"""
+
+import unittest
+
+from turbulenz_tools.tools.mesh import Mesh, ArrayMesh, numpy
+
+class WeldVertexesTest(unittest.TestCase):
+
+    mesh_class = Mesh
+
+    def weld(self, positions, uvs, tolerance):
+        mesh = self.mesh_class()
+        mesh.positions.extend(positions)
+        mesh.uvs[0].extend(uvs)
+        mesh.primitives.extend([ (i, i + 1, i + 2) for i in xrange(0, len(positions), 3) ])
+        mesh.weld_vertexes([ 'POSITION', 'TEXCOORD0' ], tolerance)
+        return ([ tuple(p) for p in mesh.positions ], [ tuple(t) for t in mesh.primitives ])
+
+    def test_exact(self):
+        positions = [ (0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 0, 0), (0, 1, 0), (1, 1, 0) ]
+        uvs = [ (0, 0), (1, 0), (0, 1), (1, 0), (0, 1), (1, 1) ]
+        (welded_positions, primitives) = self.weld(positions, uvs, 0.0)
+        self.assertEqual(welded_positions, [ (0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 1, 0) ])
+        self.assertEqual(primitives, [ (0, 1, 2), (1, 2, 3) ])
+
+    def test_tolerance_across_cells(self):
+        # Rounding to a grid of the tolerance would put these on either side of a cell boundary.
+        positions = [ (0.0149, 0, 0), (1, 0, 0), (0, 1, 0), (0.0151, 0, 0), (0, 1, 0), (1, 1, 0) ]
+        uvs = [ (0, 0), (1, 0), (0, 1), (0.005, 0), (0, 1), (1, 1) ]
+        (welded_positions, primitives) = self.weld(positions, uvs, 0.01)
+        self.assertEqual(welded_positions, [ (0.0149, 0, 0), (1, 0, 0), (0, 1, 0), (1, 1, 0) ])
+        self.assertEqual(primitives, [ (0, 1, 2), (0, 2, 3) ])
+
+    def test_tolerance_on_all_streams(self):
+        # Close positions are kept apart by their uvs, and equal uvs by their positions.
+        positions = [ (0, 0, 0), (1, 0, 0), (0, 1, 0), (0.005, 0, 0), (1.02, 0, 0), (0, 1, 0) ]
+        uvs = [ (0, 0), (1, 0), (0, 1), (0.5, 0), (1, 0), (0, 1.005) ]
+        (welded_positions, primitives) = self.weld(positions, uvs, 0.01)
+        self.assertEqual(len(welded_positions), 5)
+        self.assertEqual(primitives, [ (0, 1, 2), (3, 4, 2) ])
+
+@unittest.skipIf(numpy is None, 'requires numpy')
+class ArrayWeldVertexesTest(WeldVertexesTest):
+
+    mesh_class = ArrayMesh
+
+if __name__ == '__main__':
+    unittest.main()
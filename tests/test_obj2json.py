@@ -0,0 +1,103 @@
+# Copyright (c) 2014 Turbulenz Limited
+"""
+Tests of the OBJ converter.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from multiprocessing import Pool
+
+from turbulenz_tools.tools import obj2json
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+GRID_OBJ = os.path.join(DATA_DIR, 'grid.obj')
+
+def convert(input_filename, output_filename, args):
+    (options, _) = obj2json.obj2json_parser('obj2json').parse_args(args)
+    return obj2json.parse(input_filename, output_filename, '', DATA_DIR, None, options).asset
+
+def _convert_job(args):
+    return convert(*args)
+
+def write_relative_obj(filename, num_rows):
+    """Write strips of quads whose faces use indices relative to the vertexes before them, some of them parsed by
+    earlier chunks, in each of the face formats."""
+    lines = [ 'g strips', 'usemtl strips' ]
+    for row in xrange(num_rows):
+        for x in xrange(4):
+            lines.append('v %i %i 0' % (x, row))
+            lines.append('v %i %i 1' % (x, row))
+            lines.append('vt %i %i' % (x, row))
+            lines.append('vn 0 1 0')
+        lines.append('f -8 -6 -5 -7')
+        lines.append('f -6/-3/-1 -4/-2/-1 -3/-2/-1 -5/-3/-1')
+        lines.append('f -4//-2 -2//-1 -1//-1 -3//-2')
+        # Mixed formats in a face are parsed a line at a time
+        lines.append('f -4/-1 -2/-1/-1 -1 -3/-2')
+        if row > 0:
+            lines.append('f -9 -10 -2 -1')
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+class WorkersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_workers_match_serial(self):
+        serial = convert(GRID_OBJ, os.path.join(self.output_dir, 'serial.json'), [ ])
+        workers = convert(GRID_OBJ, os.path.join(self.output_dir, 'workers.json'), [ '--workers', '2' ])
+        self.assertEqual(workers, serial)
+
+    def test_relative_indices_match_serial(self):
+        input_filename = os.path.join(self.output_dir, 'relative.obj')
+        write_relative_obj(input_filename, 64)
+        serial = convert(input_filename, os.path.join(self.output_dir, 'serial.json'), [ ])
+        workers = convert(input_filename, os.path.join(self.output_dir, 'workers.json'), [ '--workers', '2' ])
+        self.assertEqual(workers, serial)
+
+    def test_workers_in_daemonic_process(self):
+        serial = convert(GRID_OBJ, os.path.join(self.output_dir, 'serial.json'), [ ])
+        # The workers of a pool, like the ones of convertassets, cannot start a pool of their own
+        pool = Pool(1)
+        try:
+            job = (GRID_OBJ, os.path.join(self.output_dir, 'workers.json'), [ '--workers', '2' ])
+            workers = pool.apply(_convert_job, (job,))
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(workers, serial)
+
+class RelativeIndicesTest(unittest.TestCase):
+
+    def test_split_and_rebase(self):
+        vertex_bases = (10, 20, 30)
+        with open(GRID_OBJ) as f:
+            text = f.read()
+        text = text + 'v 0 0 0\nvt 0 0\nvn 0 1 0\nf -1/-1/-1 1/1/1 -1/-1/-1\nf -1 -1/-1 2//-1\n'
+        expected = obj2json.Obj2json(None).parse_records(text, vertex_bases)['records']
+        records = obj2json.Obj2json(None).parse_records(text, obj2json.RELATIVE_INDEX_BASES)['records']
+        self.assertEqual(len(records), len(expected))
+        num_relative = 0
+        for (record, expected_record) in zip(records, expected):
+            if isinstance(record[1], basestring):
+                self.assertEqual(record, expected_record)
+                continue
+            (packed, num_triangles, relative) = record
+            if relative is not None:
+                num_relative += 1
+            self.assertEqual(num_triangles, expected_record[1])
+            # The line parser keeps the single indices in lists
+            self.assertEqual(map(tuple, obj2json._rebase_relative_indices(packed, relative, vertex_bases)),
+                             map(tuple, obj2json._unpack_tuples(expected_record[0], 'l')))
+        # The absolute faces of the grid and the relative ones appended are in separate records
+        self.assertEqual(num_relative, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+# Copyright (c) 2014 Turbulenz Limited
+"""
+Tests of the standard tool utilities.
+"""
+
+import os
+import sys
+import time
+import socket
+import shutil
+import tempfile
+import unittest
+
+from threading import Thread
+
+from turbulenz_tools.tools import dae2json, stdtool
+from turbulenz_tools.tools.asset2json import JsonAsset
+from turbulenz_tools.tools.stdtool import ConversionCache
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+SCENE_DAE = os.path.join(DATA_DIR, 'scene.dae')
+
+class ConversionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ConversionCache(self.cache_dir, 1024 * 1024)
+        self.argv = sys.argv[:]
+
+    def tearDown(self):
+        sys.argv[:] = self.argv
+        shutil.rmtree(self.cache_dir)
+
+    def key(self, args, tool_name='dae2json'):
+        (options, _) = dae2json.dae2json_parser('dae2json').parse_args([ '-i', SCENE_DAE ] + args)
+        return self.cache.key(tool_name, dae2json.__version__, dae2json.__dependencies__, options)
+
+    def test_key_ignores_running_script(self):
+        sys.argv[0] = 'dae2json'
+        key = self.key([ ])
+        sys.argv[0] = 'convertassets'
+        self.assertEqual(self.key([ ]), key)
+
+    def test_key_ignores_workers(self):
+        self.assertEqual(self.key([ '--workers', '4' ]), self.key([ ]))
+
+    def test_key_includes_tool_and_output_options(self):
+        key = self.key([ ])
+        self.assertNotEqual(self.key([ ], 'obj2json'), key)
+        self.assertNotEqual(self.key([ '--weld-vertexes' ]), key)
+
+class ConversionCacheEvictTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.output_dir = tempfile.mkdtemp()
+        self.listdir = os.listdir
+        self.scans = 0
+
+        def _listdir(path):
+            if path == self.cache_dir:
+                self.scans += 1
+            return self.listdir(path)
+        stdtool.os.listdir = _listdir
+
+    def tearDown(self):
+        stdtool.os.listdir = self.listdir
+        shutil.rmtree(self.cache_dir)
+        shutil.rmtree(self.output_dir)
+
+    def store(self, cache, key, size):
+        output_filename = os.path.join(self.output_dir, key + '.json')
+        with open(output_filename, 'wb') as output:
+            output.write('x' * size)
+        cache.store(key, output_filename)
+        # Order the entries by modification time regardless of the timestamps resolution.
+        os.utime(cache.entry(key), (self.time, self.time))
+        self.time += 1
+
+    def test_scans_only_over_size(self):
+        self.time = 1000000
+        cache = ConversionCache(self.cache_dir, 1000)
+        for n in xrange(9):
+            self.store(cache, 'entry%i' % n, 100)
+        # Scanned once on the first store, the others update the size of the cache.
+        self.assertEqual(self.scans, 1)
+        self.assertEqual(cache.size, 900)
+        self.store(cache, 'entry0', 100)
+        self.assertEqual(self.scans, 1)
+
+        self.store(cache, 'entry9', 250)
+        self.assertEqual(self.scans, 2)
+        self.assertEqual(cache.size, 950)
+        self.assertEqual(sorted(self.listdir(self.cache_dir)),
+                         [ 'entry%i.json' % n for n in (0, 3, 4, 5, 6, 7, 8, 9) ])
+
+class JsonOutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def json_out(self, json_asset, args):
+        (options, _) = dae2json.dae2json_parser('dae2json').parse_args(args)
+        output_filename = os.path.join(self.output_dir, 'asset.json')
+        stdtool.standard_json_out(json_asset, output_filename, options)
+        return os.path.exists(os.path.join(self.output_dir, 'asset.bin'))
+
+    def test_no_buffer_without_geometry(self):
+        json_asset = JsonAsset()
+        self.assertFalse(self.json_out(json_asset, [ '--binary-buffers' ]))
+        self.assertFalse('buffers' in json_asset.asset)
+        json_asset = JsonAsset()
+        self.json_out(json_asset, [ '--base64-encoding' ])
+        self.assertFalse('buffers' in json_asset.asset)
+
+    def test_buffer_with_geometry(self):
+        (options, _) = dae2json.dae2json_parser('dae2json').parse_args([ ])
+        json_asset = dae2json.parse(SCENE_DAE, os.path.join(self.output_dir, 'scene.json'), '', DATA_DIR, None,
+                                    options)
+        self.assertTrue(self.json_out(json_asset, [ '--binary-buffers' ]))
+        self.assertEqual(json_asset.asset['buffers'][0]['uri'], 'asset.bin')
+
+class ServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.parser = dae2json.dae2json_parser('dae2json')
+        (self.options, _) = self.parser.parse_args([ ])
+        self.converted = [ ]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def convert(self, options):
+        self.converted.append(options.input)
+
+    def serve(self, socket_path):
+        result = [ ]
+        thread = Thread(target=lambda: result.append(stdtool.standard_server(self.convert, self.parser, self.options,
+                                                                              socket_path)))
+        thread.start()
+        return (thread, result)
+
+    def test_jobs_sent_to_socket(self):
+        socket_path = os.path.join(self.temp_dir, 'server', 'socket')
+        (thread, result) = self.serve(socket_path)
+        for _ in xrange(100):
+            if os.path.exists(socket_path):
+                break
+            time.sleep(0.01)
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(socket_path)
+        stream = client.makefile('rwb')
+        stream.write('-i %s\n-i missing.dae\nquit\n' % SCENE_DAE)
+        stream.flush()
+        self.assertEqual(stream.readline(), 'ok\n')
+        self.assertTrue(stream.readline().startswith('error'))
+        stream.close()
+        client.close()
+        thread.join()
+        self.assertEqual(result, [ 0 ])
+        self.assertEqual(self.converted, [ SCENE_DAE ])
+        self.assertEqual(os.stat(os.path.dirname(socket_path)).st_mode & 077, 0)
+        self.assertFalse(os.path.exists(socket_path))
+
+    def test_rejects_shared_directory(self):
+        os.chmod(self.temp_dir, 0755)
+        (thread, result) = self.serve(os.path.join(self.temp_dir, 'socket'))
+        thread.join()
+        self.assertEqual(result, [ 1 ])
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'socket')))
+
+    def test_batch_returns_0(self):
+        manifest = os.path.join(self.temp_dir, 'manifest')
+        with open(manifest, 'w') as f:
+            f.write('-i %s\n' % SCENE_DAE)
+        (options, _) = self.parser.parse_args([ '--batch', manifest ])
+        self.assertEqual(stdtool.standard_batch_main(self.convert, self.parser, options), 0)
+        with open(manifest, 'w') as f:
+            f.write('-i missing.dae\n')
+        self.assertEqual(stdtool.standard_batch_main(self.convert, self.parser, options), 1)
+
+if __name__ == '__main__':
+    unittest.main()
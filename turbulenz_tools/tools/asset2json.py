@@ -3,23 +3,26 @@
 Asset class used to build Turbulenz JSON assets.
 """
 
+import sys
 import logging
 LOG = logging.getLogger('asset')
 
+from array import array
+from base64 import b64encode
 from itertools import chain as itertools_chain
-from simplejson import encoder as json_encoder, dumps as json_dumps, dump as json_dump
 from types import StringType
 
 # pylint: disable=W0403
 import turbulenz_tools.tools.vmath as vmath
+import turbulenz_tools.tools.quantize as quantize
 
-from turbulenz_tools.utils.json_utils import float_to_string, metrics
+from turbulenz_tools.utils.json_utils import dumps_asset, dump_asset, metrics
 from turbulenz_tools.tools.node import NodeName
 from turbulenz_tools.tools.material import Material
 # pylint: enable=W0403
 
-__version__ = '1.2.0'
-__dependencies__ = ['vmath', 'json2json', 'node', 'material']
+__version__ = '1.5.1'
+__dependencies__ = ['vmath', 'json2json', 'node', 'material', 'quantize']
 
 #######################################################################################################################
 
@@ -91,6 +94,17 @@ DEFAULT_SKIN_NAME = 'skin-0'
 DEFAULT_PROCEDURALEFFECT_NAME = 'effect-0'
 DEFAULT_APPLICATION_NAME = 'player'
 
+# Typecodes of the array module for each buffer type.
+BUFFER_TYPECODES = {
+    'float32': 'f',
+    'int8': 'b',
+    'uint8': 'B',
+    'int16': 'h',
+    'uint16': 'H',
+    'int32': 'i',
+    'uint32': 'I'
+}
+
 # pylint: disable=R0904
 class JsonAsset(object):
     """Contains a JSON asset."""
@@ -137,16 +151,15 @@ class JsonAsset(object):
 
     def json_to_string(self, sort=True, indent=1):
         """Convert the asset to JSON and return it as a string."""
-        json_encoder.FLOAT_REPR = float_to_string
-        return json_dumps(self.asset, sort_keys=sort, indent=indent)
+        return dumps_asset(self.asset, sort_keys=sort, indent=indent)
 
-    def json_to_file(self, target, sort=True, indent=0):
-        """Convert the asset to JSON and write it to the file stream."""
-        json_encoder.FLOAT_REPR = float_to_string
+    def json_to_file(self, target, sort=True, indent=0, release=False):
+        """Convert the asset to JSON and write it to the file stream.
+        With `release` each section is removed from the asset once written to lower the peak memory use."""
         if indent > 0:
-            return json_dump(self.asset, target, sort_keys=sort, indent=indent)
+            return dump_asset(self.asset, target, sort_keys=sort, indent=indent, release=release)
         else:
-            return json_dump(self.asset, target, sort_keys=sort, separators=(',', ':'))
+            return dump_asset(self.asset, target, sort_keys=sort, release=release)
 
     def clean(self):
         """Remove any toplevel elements which are empty."""
@@ -164,6 +177,118 @@ class JsonAsset(object):
         for k in keys:
             LOG.info('json_asset:%s:%s', k, m[k])
 
+    def pack_buffers(self, uri=None):
+        """Move the geometry source data and surface indices into a single packed little-endian binary buffer.
+        Each array is replaced by a view { 'buffer', 'offset', 'count', 'type' } into the 'buffers' list, offsets are
+        in bytes and aligned to 4 bytes. Source data is stored as float32, or as the type of its quantization, and
+        indices as uint16 when they fit, uint32 otherwise.
+
+        The buffer is written by the caller to `uri`, or embedded as base64 if no `uri` is given.
+        Returns the packed buffer, or None without adding a buffer if there is no data to pack."""
+        buffer_index = len(self.asset.get('buffers', [ ]))
+        chunks = [ ]
+        offset = [ 0 ]
+
+        def _pack(values, typecode, type_name):
+            packed = array(typecode, values)
+            if sys.byteorder != 'little':
+                packed.byteswap()
+            data = packed.tostring()
+            view = { 'buffer': buffer_index, 'offset': offset[0], 'count': len(packed), 'type': type_name }
+            padding = -len(data) % 4
+            if padding:
+                data += '\0' * padding
+            chunks.append(data)
+            offset[0] += len(data)
+            return view
+
+        def _pack_indices(container):
+            for key in ('lines', 'triangles', 'quads'):
+                indices = container.get(key)
+                if isinstance(indices, list):
+                    if indices and max(indices) > 65535:
+                        container[key] = _pack(indices, 'I', 'uint32')
+                    else:
+                        container[key] = _pack(indices, 'H', 'uint16')
+
+        for shape_name in sorted(self.asset.get('geometries', { }).iterkeys()):
+            shape = self.asset['geometries'][shape_name]
+            sources = shape.get('sources', { })
+            quantization = shape.get('meta', { }).get('quantization', { })
+            for source_name in sorted(sources.iterkeys()):
+                source = sources[source_name]
+                if isinstance(source.get('data'), list):
+                    type_name = quantization.get(source_name, { }).get('type', 'float32')
+                    source['data'] = _pack(source['data'], BUFFER_TYPECODES[type_name], type_name)
+            _pack_indices(shape)
+            surfaces = shape.get('surfaces', { })
+            for surface_name in sorted(surfaces.iterkeys()):
+                _pack_indices(surfaces[surface_name])
+
+        if not chunks:
+            return None
+        buffers = self.asset.setdefault('buffers', [ ])
+        packed = ''.join(chunks)
+        if uri is not None:
+            buffers.append({ 'uri': uri, 'size': len(packed) })
+        else:
+            buffers.append({ 'base64': b64encode(packed), 'size': len(packed) })
+        LOG.info('Packed %i bytes of geometry data into buffer %i', len(packed), buffer_index)
+        return packed
+
+    # pylint: disable=R0914
+    def quantize_sources(self, position_bits=quantize.DEFAULT_POSITION_BITS, normal_bits=quantize.DEFAULT_NORMAL_BITS,
+                         uv_bits=quantize.DEFAULT_UV_BITS, weight_bits=quantize.DEFAULT_WEIGHT_BITS):
+        """Quantize the geometry sources into integers. Positions and UVs are stored relative to their min and max,
+        normals, tangents and binormals as 2 octahedral components and skin weights as fractions of the largest
+        integer. The dequantization parameters of each source are added to 'quantization' in the geometry meta:
+        { 'type', 'scale', 'offset' } with value = offset + data * scale per component, octahedral sources also
+        have 'encoding': 'octahedral' and no offset.
+        Returns the largest error of each (shape, source) against the original floats, in degrees for directions."""
+        errors = { }
+        for shape_name in sorted(self.asset.get('geometries', { }).iterkeys()):
+            shape = self.asset['geometries'][shape_name]
+            sources = shape.get('sources', { })
+            quantization = shape.get('meta', { }).get('quantization', { })
+            quantized = { }
+            for semantic, shape_input in sorted(shape.get('inputs', { }).iteritems()):
+                source_name = shape_input['source']
+                source = sources.get(source_name)
+                if source is None or not isinstance(source.get('data'), list) or not source['data']:
+                    continue
+                if source_name in quantization or source_name in quantized:
+                    continue
+                stride = source['stride']
+                data = source['data']
+                if semantic.startswith('POSITION') or semantic.startswith('TEXCOORD'):
+                    bits = position_bits if semantic.startswith('POSITION') else uv_bits
+                    (data, offset, scale, error) = quantize.quantize_linear(data, stride, bits,
+                                                                            source.get('min'), source.get('max'))
+                    params = { 'type': quantize.type_name(bits), 'offset': offset, 'scale': scale }
+                elif (semantic.startswith('NORMAL') or semantic.startswith('TANGENT') or
+                      semantic.startswith('BINORMAL')) and stride == 3:
+                    (data, error) = quantize.quantize_octahedral(data, normal_bits)
+                    stride = 2
+                    levels = (1 << (normal_bits - 1)) - 1
+                    params = { 'type': quantize.type_name(normal_bits, True), 'encoding': 'octahedral',
+                               'scale': [ 1.0 / levels ] * 2 }
+                elif semantic.startswith('BLENDWEIGHT'):
+                    (data, scale, error) = quantize.quantize_weights(data, stride, weight_bits)
+                    params = { 'type': quantize.type_name(weight_bits), 'offset': [ 0.0 ] * stride,
+                               'scale': [ scale ] * stride }
+                else:
+                    continue
+                source['data'] = data
+                source['stride'] = stride
+                quantized[source_name] = params
+                errors[(shape_name, source_name)] = error
+                LOG.info('Quantized:geometry:%s:source:%s:%s:error %g', shape_name, source_name, params['type'],
+                         error)
+            if quantized:
+                shape.setdefault('meta', { }).setdefault('quantization', { }).update(quantized)
+        return errors
+    # pylint: enable=R0914
+
 #######################################################################################################################
 
     def __set_source(self, shape, name, stride, min_element=None, max_element=None, data=None):
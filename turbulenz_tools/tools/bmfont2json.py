@@ -12,11 +12,11 @@ import logging
 from optparse import OptionParser, OptionGroup, TitledHelpFormatter
 
 # pylint: disable=W0403
-from stdtool import standard_output_version, standard_json_out
+from stdtool import standard_output_version, standard_json_out, standard_cache_options, standard_cached_convert
 from asset2json import JsonAsset
 # pylint: enable=W0403
 
-__version__ = '2.0.0'
+__version__ = '2.1.0'
 __dependencies__ = ['asset2json']
 
 
@@ -287,6 +287,8 @@ def bmfont2json_parser(description, epilog=None):
                      help="output FILE to write to")
     parser.add_option_group(group)
 
+    standard_cache_options(parser)
+
     return parser
 
 def parse(input_filename="default.fontdat", output_filename="default.json", texture_prefix="", asset_root=".",
@@ -307,6 +309,29 @@ def parse(input_filename="default.fontdat", output_filename="default.json", text
             LOG.error(str(e))
         # pylint: enable=W0703
 
+def convert(options):
+    """Convert the input of the command line options."""
+    LOG.info("input: %s", options.input)
+    LOG.info("output: %s", options.output)
+
+    if options.texture_prefix != '':
+        options.texture_prefix = options.texture_prefix.replace('\\', '/')
+        if options.texture_prefix[-1] != '/':
+            options.texture_prefix = options.texture_prefix + '/'
+        LOG.info("texture URL prefix: %s", options.texture_prefix)
+
+    if options.asset_root != '.':
+        LOG.info("root: %s", options.asset_root)
+
+    def _parse():
+        return parse(options.input,
+                     options.output,
+                     options.texture_prefix,
+                     options.asset_root,
+                     options)
+
+    return standard_cached_convert(_parse, 'bmfont2json', __version__, __dependencies__, options)
+
 def main():
     description = ("Convert Bitmap Font Generator data (.fnt) files into a Turbulenz JSON asset.\n" +
                    "http://www.angelcode.com/products/bmfont/")
@@ -331,23 +356,7 @@ def main():
         level = logging.WARNING
     logging.basicConfig(level=level, stream=sys.stdout)
 
-    LOG.info("input: %s", options.input)
-    LOG.info("output: %s", options.output)
-
-    if options.texture_prefix != '':
-        options.texture_prefix = options.texture_prefix.replace('\\', '/')
-        if options.texture_prefix[-1] != '/':
-            options.texture_prefix = options.texture_prefix + '/'
-        LOG.info("texture URL prefix: %s", options.texture_prefix)
-
-    if options.asset_root != '.':
-        LOG.info("root: %s", options.asset_root)
-
-    parse(options.input,
-          options.output,
-          options.texture_prefix,
-          options.asset_root,
-          options)
+    convert(options)
 
 if __name__ == "__main__":
     exit(main())
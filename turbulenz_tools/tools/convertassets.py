@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Turbulenz Limited
+"""
+Convert many assets in parallel using a pool of processes.
+
+Each line of the manifests is a job naming the tool followed by its options, for example:
+
+    dae2json -i models/duck.dae -o staticmax/duck.json -d definitions.json
+    material2json -i materials/wall.material -o staticmax/wall.json
+
+Blank lines and lines starting with '#' are ignored.
+"""
+
+import sys
+import time
+import logging
+LOG = logging.getLogger('asset')
+
+from multiprocessing import Pool, cpu_count
+from itertools import imap
+from optparse import OptionParser, TitledHelpFormatter
+
+# pylint: disable=W0403
+from turbulenz_tools.tools.stdtool import simple_options, standard_parser, standard_converter, standard_batch_job
+from turbulenz_tools.utils.profiler import Profiler
+# pylint: enable=W0403
+
+__version__ = '1.0.0'
+__dependencies__ = ['dae2json', 'obj2json', 'material2json', 'effect2json', 'bmfont2json']
+
+#######################################################################################################################
+
+# Supported tools and the name of the function building their parser, the standard parser is used otherwise.
+TOOLS = {
+    'dae2json': 'dae2json_parser',
+    'obj2json': 'obj2json_parser',
+    'material2json': None,
+    'effect2json': None,
+    'bmfont2json': 'bmfont2json_parser'
+}
+
+# Tools already imported by this process.
+_LOADED_TOOLS = { }
+
+def _load_tool(tool):
+    """Import the tool and build its converter, parser and default options."""
+    loaded = _LOADED_TOOLS.get(tool)
+    if loaded is None:
+        module = __import__('turbulenz_tools.tools.' + tool, globals(), locals(), ['parse'])
+        parser_name = TOOLS[tool]
+        if parser_name is not None:
+            parser = getattr(module, parser_name)(tool)
+        else:
+            parser = standard_parser(tool)
+        # Tools with their own main provide a convert function, the others are standard tools.
+        convert = getattr(module, 'convert', None)
+        if convert is None:
+            convert = standard_converter(module.parse, module.__version__, module.__dependencies__)
+        (defaults, _) = parser.parse_args([])
+        loaded = (convert, parser, defaults)
+        _LOADED_TOOLS[tool] = loaded
+    return loaded
+
+def _init_worker(level):
+    """Set up the logging of a worker process."""
+    logging.basicConfig(level=level, stream=sys.stdout)
+
+def _convert_job(job):
+    """Convert a job. Returns its index, the error message or None, and the time taken."""
+    (index, tool, line) = job
+    start_time = time.time()
+    try:
+        (convert, parser, defaults) = _load_tool(tool)
+    except ImportError as e:
+        error = 'failed to import %s: %s' % (tool, e)
+    else:
+        error = standard_batch_job(convert, parser, defaults, line)
+    return (index, error, time.time() - start_time)
+
+#######################################################################################################################
+
+def read_jobs(manifests):
+    """Read the jobs of the manifests, in order. Returns the list of (tool, line) jobs."""
+    jobs = [ ]
+    for manifest in manifests:
+        if manifest == '-':
+            lines = sys.stdin.readlines()
+        else:
+            with open(manifest, 'r') as manifest_file:
+                lines = manifest_file.readlines()
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                (tool, _, options) = line.partition(' ')
+                jobs.append((tool, options.strip()))
+    return jobs
+
+def convert_jobs(jobs, workers, level=logging.WARNING):
+    """Convert the jobs with a pool of worker processes.
+       Returns the list of (error, duration) results in the order of the jobs, error is None on success."""
+    results = [ None ] * len(jobs)
+    pending = [ ]
+    for index, (tool, line) in enumerate(jobs):
+        if tool in TOOLS:
+            pending.append((index, tool, line))
+        else:
+            results[index] = ('unknown tool %s' % tool, 0.0)
+
+    # Convert in this process when there is a single worker, which is easier to debug.
+    if workers == 1:
+        pool = None
+        converted = imap(_convert_job, pending)
+    else:
+        pool = Pool(workers, _init_worker, (level,))
+        converted = pool.imap_unordered(_convert_job, pending)
+    try:
+        for (index, error, duration) in converted:
+            results[index] = (error, duration)
+            LOG.info('%s %s (%.3f)', 'converted' if error is None else 'failed', jobs[index][1], duration)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return results
+
+def _parser():
+    parser = OptionParser(description='Convert the asset jobs listed in the manifests in parallel.',
+                          usage='%prog [options] MANIFEST...',
+                          formatter=TitledHelpFormatter())
+    parser.add_option("--version", action="store_true", dest="output_version", default=False,
+                      help="output version number")
+    parser.add_option("-v", "--verbose", action="store_true", dest="verbose", default=False, help="verbose output")
+    parser.add_option("-s", "--silent", action="store_true", dest="silent", default=False, help="silent running")
+    parser.add_option("-w", "--workers", action="store", dest="workers", type="int", default=cpu_count(),
+                      metavar="COUNT", help="number of worker processes, defaults to the number of cpus")
+    return parser
+
+def main():
+    (options, args, parser_) = simple_options(_parser, __version__, __dependencies__)
+
+    jobs = read_jobs(args)
+    workers = max(1, min(options.workers, len(jobs)))
+
+    Profiler.enable()
+    Profiler.start('convertassets')
+    results = convert_jobs(jobs, workers, logging.getLogger().level)
+
+    # Report in manifest order so the output doesn't depend on the scheduling of the workers.
+    tool_durations = { }
+    tool_counts = { }
+    failed = 0
+    for (tool, line), (error, duration) in zip(jobs, results):
+        tool_durations[tool] = tool_durations.get(tool, 0.0) + duration
+        tool_counts[tool] = tool_counts.get(tool, 0) + 1
+        if error is not None:
+            LOG.error('Failed: %s %s', tool, line)
+            LOG.error('  >> %s', error)
+            failed += 1
+
+    for tool in sorted(tool_durations.keys()):
+        Profiler.add_result('%s (%i)' % (tool, tool_counts[tool]), tool_durations[tool])
+    Profiler.stop('convertassets')
+
+    if not options.silent:
+        print 'Converted %i of %i jobs with %i workers' % (len(jobs) - failed, len(jobs), workers)
+        Profiler.dump_data()
+
+    if failed:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -21,19 +21,29 @@ from xml.parsers.expat import ExpatError
 
 # pylint: disable=W0403
 import sys
+import copy
 import math
 import subprocess
 
+from array import array
+from bisect import bisect_left
+from itertools import izip
+from multiprocessing import Pool
+
 from turbulenz_tools.tools.stdtool import standard_parser, standard_main, standard_include, standard_json_out
+from turbulenz_tools.tools.stdtool import standard_workers
 from turbulenz_tools.tools.asset2json import JsonAsset, attach_skins_and_materials, remove_unreferenced_images
 
 import turbulenz_tools.tools.vmath as vmath
 from turbulenz_tools.tools.node import NodeName
-from turbulenz_tools.tools.mesh import Mesh
+from turbulenz_tools.tools.mesh import Mesh, ArrayMesh, numpy
+import turbulenz_tools.tools.vertexcache as vertexcache
+import turbulenz_tools.tools.simplify as simplify
+import turbulenz_tools.tools.keyframes as keyframes
 # pylint: enable=W0403
 
-__version__ = '1.7.2'
-__dependencies__ = ['asset2json', 'node', 'mesh']
+__version__ = '1.20.6'
+__dependencies__ = ['asset2json', 'node', 'mesh', 'vertexcache', 'simplify', 'keyframes']
 
 def tag(t):
     return str(ElementTree.QName('http://www.collada.org/2005/11/COLLADASchema', t))
@@ -47,6 +57,68 @@ def pack(a, n):
         return a[:]
     return [ tuple(a[i:i + n]) for i in range(0, len(a), n) ]
 
+def parse_floats(text, count, scale=1.0):
+    """Convert the text of a float_array into a contiguous array of doubles, multiplied by scale.
+    With NumPy the text is converted in bulk without creating a Python float for each value."""
+    text = text or ''
+    if numpy is not None:
+        values = numpy.fromstring(text, dtype=numpy.float64, sep=' ')
+        # A malformed number stops the conversion early, leave those to float() to report
+        if len(values) == count:
+            if scale != 1.0:
+                values *= scale
+            return array('d', values.tostring())
+    values = array('d', map(float, text.split()))
+    if scale != 1.0:
+        values = array('d', [ scale * x for x in values ])
+    return values
+
+class FloatView(object):
+    """A read only sequence of tuples of stride values over a flat array of floats, each tuple is only unpacked
+    when it is accessed. Replaces the list built by pack for sources of more than one component."""
+
+    def __init__(self, data, stride):
+        self.data = data
+        self.stride = stride
+
+    def __len__(self):
+        return len(self.data) // self.stride
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ self[i] for i in xrange(*index.indices(len(self))) ]
+        count = len(self)
+        if index < 0:
+            index += count
+        if index < 0 or index >= count:
+            raise IndexError('FloatView index out of range')
+        start = index * self.stride
+        return tuple(self.data[start:start + self.stride])
+
+    def __iter__(self):
+        values = iter(self.data)
+        return izip(*([ values ] * self.stride))
+
+    def __repr__(self):
+        return 'FloatView<stride:%i:count:%i>' % (self.stride, len(self))
+
+    def tolist(self):
+        """Unpack every tuple at once, much faster than indexing the view for each of them."""
+        values = iter(self.data)
+        return zip(*([ values ] * self.stride))
+
+def float_view(data, stride):
+    """View a flat array of floats as tuples of stride values, or as the floats themselves for a stride of 1."""
+    if stride == 1:
+        return data
+    return FloatView(data, stride)
+
+def unpack(values):
+    """The list of the values of a source, unpacking a FloatView."""
+    if isinstance(values, FloatView):
+        return values.tolist()
+    return values
+
 def _remove_prefix(line, prefix):
     if line.startswith(prefix):
         return line[len(prefix):]
@@ -155,34 +227,17 @@ def tidy_semantic(s, semantic_set=None):
             semantic = semantic + semantic_set
     return semantic
 
-def find_semantic(source_name, mesh_node_e):
-
-    def _test_source(tags):
-        if tags:
-            for v_e in tags:
-                for i in v_e.findall(tag('input')):
-                    source = tidy_name(i.get('source'))
-                    if (source is not None) and (source == source_name):
-                        return tidy_semantic(i.get('semantic'), i.get('set'))
-        return None
-
-    semantic = _test_source(mesh_node_e.findall(tag('vertices')))
-    if semantic is not None:
-        return semantic
-
-    semantic = _test_source(mesh_node_e.findall(tag('triangles')))
-    if semantic is not None:
-        return semantic
-
-    semantic = _test_source(mesh_node_e.findall(tag('polylist')))
-    if semantic is not None:
-        return semantic
-
-    semantic = _test_source(mesh_node_e.findall(tag('polygons')))
-    if semantic is not None:
-        return semantic
-
-    return None
+def find_semantics(mesh_node_e):
+    """Map the id of each source of a mesh to the semantic of the first input using it, searching the vertices then
+    the triangles, polylist and polygons inputs."""
+    semantics = { }
+    for primitive_tag in ('vertices', 'triangles', 'polylist', 'polygons'):
+        for v_e in mesh_node_e.findall(tag(primitive_tag)):
+            for i in v_e.findall(tag('input')):
+                source = tidy_name(i.get('source'))
+                if source is not None and source not in semantics:
+                    semantics[source] = tidy_semantic(i.get('semantic'), i.get('set'))
+    return semantics
 
 def invert_indices(indices, indices_per_vertex, vertex_per_polygon):
     # If indices_per_vertex = 3 and vertex_per_polygon = 3
@@ -209,42 +264,47 @@ def get_material_name(instance_e):
                 return material_e.get('target')
     return None
 
-def find_controller(source_name, controllers_e):
-    for controller_e in controllers_e.findall(tag('controller')):
-        controller_name = tidy_name(controller_e.get('id', controller_e.get('name')))
-        if controller_name == source_name:
-            return controller_e
-    return None
-
-def find_set_param(effect_e, name):
-    for set_param_e in effect_e.findall(tag('setparam')):
-        ref = set_param_e.get('ref')
-        if ref is not None and ref == name:
-            return set_param_e
-    return None
-
-def find_new_param(profile_e, name):
-    for new_param_e in profile_e.findall(tag('newparam')):
-        sid = new_param_e.get('sid')
-        if sid is not None and sid == name:
-            return new_param_e
-    return None
-
-def find_node(url, collada_e):
-    # This might be better as an XPath of '//*[@id='url'] but the version of ElementTree in python
-    # doesn't support attribute selection
-
+def index_children(parent_e, child_tag, attrib):
+    """Map the attrib value of each child_tag child of parent_e to the first child with that value."""
+    children = { }
+    if parent_e is not None:
+        for child_e in parent_e.findall(tag(child_tag)):
+            key = child_e.get(attrib)
+            if key is not None and key not in children:
+                children[key] = child_e
+    return children
+
+class ColladaIndex(object):
+    """The elements of a Collada document referenced by id, indexed once after fix_sid so each reference is resolved
+    by a dictionary lookup instead of scanning the document."""
+
+    def __init__(self, collada_e):
+        self.nodes = { }
+        for node_e in collada_e.iter(tag('node')):
+            node_id = node_e.get('id')
+            if node_id is not None and node_id not in self.nodes:
+                self.nodes[node_id] = node_e
+
+        self.controllers = { }
+        controllers_e = collada_e.find(tag('library_controllers'))
+        if controllers_e is not None:
+            for controller_e in controllers_e.findall(tag('controller')):
+                controller_name = tidy_name(controller_e.get('id', controller_e.get('name')))
+                if controller_name not in self.controllers:
+                    self.controllers[controller_name] = controller_e
+
+        self.geometries = index_children(collada_e.find(tag('library_geometries')), 'geometry', 'id')
+
+def find_controller(source_name, collada_index):
+    return collada_index.controllers.get(source_name)
+
+def find_node(url, collada_index):
     # Remove the # from the url
     if url is not None and url[0] == '#':
         node_id = url[1:]
     else:
         node_id = url
-    # Find all nodes in the scene and look for the one with a matching id
-    node_iterator = collada_e.getiterator(tag('node'))
-    for node_e in node_iterator:
-        if node_e.attrib.get('id') == node_id:
-            return node_e
-    return None
+    return collada_index.nodes.get(node_id)
 
 def find_name(name_map, id_name):
     if id_name in name_map:
@@ -329,6 +389,12 @@ def build_joint_hierarchy(start_joints, nodes, sid_inputs = False):
 
 #######################################################################################################################
 
+def _unpickle_geometry_part(class_name, state):
+    """Rebuild a Dae2Geometry Source, Input or Surface, pickle can't find nested classes by name."""
+    part = object.__new__(getattr(Dae2Geometry, class_name))
+    part.__dict__.update(state)
+    return part
+
 class Dae2Geometry(object):
 
     class Source(object):
@@ -345,6 +411,9 @@ class Dae2Geometry(object):
             return 'Dae2Geometry.Source<name:%s:semantic:%s:stride:%s:count:%s>' % \
                 (self.name, self.semantic, self.stride, self.count)
 
+        def __reduce__(self):
+            return (_unpickle_geometry_part, ('Source', self.__dict__))
+
     class Input(object):
         def __init__(self, semantic, source='unknown', offset=0):
             self.semantic = semantic
@@ -355,12 +424,18 @@ class Dae2Geometry(object):
         def __repr__(self):
             return 'Dae2Geometry.Input<semantic:%s:source:%s:offset:%s>' % (self.semantic, self.source, self.offset)
 
+        def __reduce__(self):
+            return (_unpickle_geometry_part, ('Input', self.__dict__))
+
     class Surface(object):
         def __init__(self, sources, primitives, primitive_type):
             self.sources = sources
             self.primitives = primitives
             self.type = primitive_type
 
+        def __reduce__(self):
+            return (_unpickle_geometry_part, ('Surface', self.__dict__))
+
     def add_input(self, faces_e, shared_sources):
         # Offset N vertex inputs
         max_offset = 0
@@ -386,17 +461,7 @@ class Dae2Geometry(object):
 
         return max_offset, sources
 
-    # pylint: disable=R0914
-    def __init__(self, geometry_e, scale, library_geometries_e, name_map, geometry_names):
-        self.name = None
-        self.scale = scale
-        self.sources = { }
-        self.inputs = { }
-        self.surfaces = { }
-        self.meta = { }
-        self.type = 'unknown'
-
-        # Name...
+    def __set_name(self, geometry_e, name_map, geometry_names):
         self.id = geometry_e.get('id', 'unknown')
         self.name = geometry_e.get('name', self.id)
         LOG.debug('GEOMETRY:%s', self.name)
@@ -409,6 +474,27 @@ class Dae2Geometry(object):
 
         name_map[self.id] = self.name
 
+    def convex_hull(self, geometry_e, name_map, geometry_names):
+        """The convex_mesh geometry_e built from the mesh of this geometry, for a convex_hull_of reference resolved
+        after the element of this geometry has been released. Must be called before the geometry is processed."""
+        hull = copy.deepcopy(self)
+        hull.__set_name(geometry_e, name_map, geometry_names)
+        hull.type = 'convex_mesh'
+        return hull
+
+    # pylint: disable=R0914
+    def __init__(self, geometry_e, scale, library_geometries, name_map, geometry_names):
+        self.name = None
+        self.scale = scale
+        self.sources = { }
+        self.inputs = { }
+        self.surfaces = { }
+        self.meta = { }
+        self.type = 'unknown'
+
+        # Name...
+        self.__set_name(geometry_e, name_map, geometry_names)
+
         # Mesh...
         mesh_e = geometry_e.find(tag('mesh'))
         if mesh_e is not None:
@@ -419,11 +505,10 @@ class Dae2Geometry(object):
             if convex_mesh_e is not None:
                 reference_name = tidy_name(convex_mesh_e.get('convex_hull_of'))
 
-                for reference_node_e in library_geometries_e.findall(tag('geometry')):
-                    if reference_node_e.get('id') == reference_name:
-                        mesh_e = reference_node_e.find(tag('mesh'))
-                        self.type = 'convex_mesh'
-                        break
+                reference_node_e = library_geometries.get(reference_name)
+                if reference_node_e is not None:
+                    mesh_e = reference_node_e.find(tag('mesh'))
+                    self.type = 'convex_mesh'
 
                 if mesh_e is None:
                     LOG.error('Unknown reference node:%s', reference_name)
@@ -441,6 +526,7 @@ class Dae2Geometry(object):
 
         # Sources...
         geometry_source_names = { }
+        source_semantics = find_semantics(mesh_e)
         source_e = mesh_e.findall(tag('source'))
         for s in source_e:
             source_id = s.get('id', 'unknown')
@@ -451,7 +537,7 @@ class Dae2Geometry(object):
                 name = source_id
             else:
                 geometry_source_names[name] = name
-            semantic = find_semantic(source_id, mesh_e)
+            semantic = source_semantics.get(source_id)
             # We tidy the id after finding the semantic from the sources
             source_id = tidy_name(source_id, prefix=self.id)
             if semantic is not None:
@@ -461,12 +547,11 @@ class Dae2Geometry(object):
                 array_e = s.find(tag('float_array'))
                 count = int(array_e.get('count', '0'))
                 if (0 < count) and (0 < stride):
-                    values_text = array_e.text
-                    values = [float(x) for x in values_text.split()]
-                    if (semantic == 'POSITION') and (scale != 1.0):
-                        values = [scale * x for x in values]
-
-                    values = pack(values, stride)
+                    if semantic == 'POSITION':
+                        values = parse_floats(array_e.text, count, scale)
+                    else:
+                        values = parse_floats(array_e.text, count)
+                    values = float_view(values, stride)
                 else:
                     values = None
                 self.sources[source_id] = Dae2Geometry.Source(values, semantic, name, stride, count)
@@ -582,8 +667,9 @@ class Dae2Geometry(object):
     # pylint: enable=R0914
 
     # pylint: disable=R0914
-    def process(self, definitions_asset, nodes, nvtristrip, materials, effects):
-        # Look at the material to check for geometry requirements
+    def requirements(self, definitions_asset, nodes, materials, effects):
+        """Look at the materials to check for geometry requirements.
+           Returns (generate_normals, generate_tangents, mat_name), mat_name being the last material looked at."""
         need_normals = False
         need_tangents = False
         generate_normals = False
@@ -609,6 +695,7 @@ class Dae2Geometry(object):
                     return material
             return None
 
+        mat_name = None
         for mat_name in self.surfaces.iterkeys():
             # Ok, we have a mat_name but this may need to be mapped if the node has an instanced material.
             # So we find the node referencing this geometry, and see if the material has a mapping on it.
@@ -667,7 +754,21 @@ class Dae2Geometry(object):
         if need_tangents and 'TANGENT' not in self.inputs and 'BINORMAL' not in self.inputs:
             generate_tangents = True
 
-        if generate_normals is False and generate_tangents is False and nvtristrip is None:
+        return (generate_normals, generate_tangents, mat_name)
+
+    # pylint: disable=R0913
+    def process_mesh(self, generate_normals, generate_tangents, mat_name, nvtristrip, mesh_class=Mesh, weld=None,
+                     vertex_cache=False, overdraw=None, vertex_fetch=False, lods=0,
+                     lod_ratio=simplify.DEFAULT_LOD_RATIO, lod_error=simplify.DEFAULT_MAX_ERROR):
+        """Generate the missing normals and tangents and compact the streams. Only the geometry itself is modified,
+           so this can be done in another process.
+           If weld is not None the vertexes are welded into a single index buffer, using weld as the tolerance.
+           With lods each surface is simplified into that many levels of detail, added as SURFACE-lodN surfaces.
+           With vertex_cache the triangles are reordered for the vertex cache instead of using NvTriStrip, then if
+           overdraw is not None their clusters are sorted for overdraw using it as the ACMR threshold.
+           With vertex_fetch the streams are reordered in the order the triangles first use them."""
+        if generate_normals is False and generate_tangents is False and nvtristrip is None and weld is None and \
+                not vertex_cache and overdraw is None and not vertex_fetch and lods == 0:
             return
 
         # Generate a single vertex pool.
@@ -709,6 +810,9 @@ class Dae2Geometry(object):
             else:
                 return
 
+        # Unpack the views of the sources once, indexing them for each vertex is slow.
+        old_values = dict((source, unpack(self.sources[source].values)) for source in old_offsets.iterkeys())
+
         # For each surface in the geometry...
         new_surfaces = { }
 
@@ -726,7 +830,7 @@ class Dae2Geometry(object):
                     for source, offset in old_offsets.iteritems():
                         new_source = new_sources[source]
                         if source in surface_sources:
-                            source_values = self.sources[source].values
+                            source_values = old_values[source]
                             # For each vertex in the primitive (triangle or quad)...
                             for vertex in primitive:
                                 new_source.append( source_values[vertex[offset]] )
@@ -739,7 +843,7 @@ class Dae2Geometry(object):
                     for source in old_offsets.iterkeys():
                         new_source = new_sources[source]
                         if source in surface_sources:
-                            source_values = self.sources[source].values
+                            source_values = old_values[source]
                             # For each vertex in the primitive (triangle or quad)...
                             for vertex in primitive:
                                 new_source.append( source_values[vertex] )
@@ -751,7 +855,7 @@ class Dae2Geometry(object):
             end_index = index
             new_surfaces[mat_name] = (start_index, end_index)
 
-        mesh = Mesh()
+        mesh = mesh_class()
         for semantic, input_stream in self.inputs.iteritems():
             mesh.set_values(new_sources[input_stream.source], semantic)
 
@@ -789,25 +893,108 @@ class Dae2Geometry(object):
             LOG.info('%s stream compacted from %i to %i elements', semantic, len(values), len(new_values))
             return (new_values, new_index)
 
-        # !!! This should be updated to find index buffers that are similar rather than identical.
-        new_indexes = [ ]
-        new_offsets = { }
-        for semantic in old_semantics.iterkeys():
-            values = mesh.get_values(semantic)
-            (new_values, new_values_index) = compact_stream(values, semantic)
-            mesh.set_values(new_values, semantic)
-            for i, indexes in enumerate(new_indexes):
-                if indexes == new_values_index:
-                    new_offsets[semantic] = i
-                    break
+        if weld is not None:
+            # A single index shared by all the streams.
+            semantics = sorted(old_semantics.iterkeys())
+            mesh.weld_vertexes(semantics, weld)
+            new_offsets = dict.fromkeys(semantics, 0)
+            indexes = [ (i,) for primitive in mesh.primitives for i in primitive ]
+        else:
+            new_indexes = [ ]
+            new_offsets = { }
+            index_offsets = { }
+            for semantic in old_semantics.iterkeys():
+                values = mesh.get_values(semantic)
+                (new_values, new_values_index) = compact_stream(values, semantic)
+                mesh.set_values(new_values, semantic)
+                # Share the index streams that are identical.
+                key = tuple(new_values_index)
+                offset = index_offsets.get(key)
+                if offset is None:
+                    offset = len(new_indexes)
+                    index_offsets[key] = offset
+                    new_indexes.append(new_values_index)
+                new_offsets[semantic] = offset
+
+            indexes = zip(*new_indexes)
+
+        if lods > 0 and 'POSITION' in new_offsets:
+            # Simplify each surface into levels of detail, each one from the previous, appended after the surfaces
+            positions = mesh.get_values('POSITION')
+            position_offset = new_offsets['POSITION']
+            if 'NORMAL' in new_offsets:
+                normals = mesh.get_values('NORMAL')
+                normal_offset = new_offsets['NORMAL']
             else:
-                new_offsets[semantic] = len(new_indexes)
-                new_indexes.append(new_values_index)
-
-        indexes = zip(*new_indexes)
+                normals = None
+            for mat_name, (start_index, end_index) in sorted(new_surfaces.items()):
+                vertex_map = { }
+                vertexes = [ ]
+                surface_indexes = [ ]
+                for vertex in indexes[start_index * 3:end_index * 3]:
+                    i = vertex_map.get(vertex)
+                    if i is None:
+                        i = len(vertexes)
+                        vertex_map[vertex] = i
+                        vertexes.append(vertex)
+                    surface_indexes.append(i)
+                surface_positions = [ positions[vertex[position_offset]] for vertex in vertexes ]
+                if normals is not None:
+                    surface_normals = [ normals[vertex[normal_offset]] for vertex in vertexes ]
+                else:
+                    surface_normals = None
+                targets = simplify.lod_targets(end_index - start_index, lods, lod_ratio)
+                for level, target in enumerate(targets, 1):
+                    (lod_indexes, error) = simplify.simplify_triangles(surface_indexes, surface_positions, target,
+                                                                       lod_error, surface_normals)
+                    if len(lod_indexes) == len(surface_indexes):
+                        LOG.warning('LOD:geometry:%s:surface:%s:nothing left to collapse within the error bound, '
+                                    'stopped at level %i',
+                                    self.name, mat_name, level - 1)
+                        break
+                    LOG.info('LOD:geometry:%s:surface:%s:level %i:%i primitives:error %.5f',
+                             self.name, mat_name, level, len(lod_indexes) // 3, error)
+                    lod_name = '%s-lod%i' % (mat_name, level)
+                    new_surfaces[lod_name] = (len(indexes) // 3, len(indexes) // 3 + len(lod_indexes) // 3)
+                    indexes.extend([ vertexes[lod_index] for lod_index in lod_indexes ])
+                    self.surfaces[lod_name] = Dae2Geometry.Surface(self.surfaces[mat_name].sources, [ ],
+                                                                   JsonAsset.SurfaceTriangles)
+                    surface_indexes = lod_indexes
+
+        if vertex_cache or overdraw is not None:
+            # Reorder the triangles of each surface for the post-transform vertex cache
+            if overdraw is not None and 'POSITION' in new_offsets:
+                positions = mesh.get_values('POSITION')
+                position_offset = new_offsets['POSITION']
+            else:
+                positions = None
+            for mat_name, (start_index, end_index) in new_surfaces.iteritems():
+                vertex_map = { }
+                vertexes = [ ]
+                surface_indexes = [ ]
+                for vertex in indexes[start_index * 3:end_index * 3]:
+                    i = vertex_map.get(vertex)
+                    if i is None:
+                        i = len(vertexes)
+                        vertex_map[vertex] = i
+                        vertexes.append(vertex)
+                    surface_indexes.append(i)
+                before = vertexcache.cache_metrics(surface_indexes)
+                surface_indexes = vertexcache.optimize_triangles(surface_indexes)
+                after = vertexcache.cache_metrics(surface_indexes)
+                LOG.info('Vertex cache:geometry:%s:surface:%s:ACMR %.3f to %.3f:ATVR %.3f to %.3f',
+                         self.name, mat_name, before[0], after[0], before[1], after[1])
+                if positions is not None:
+                    surface_positions = [ positions[vertex[position_offset]] for vertex in vertexes ]
+                    surface_indexes = vertexcache.optimize_overdraw(surface_indexes, surface_positions, overdraw)
+                    after = vertexcache.cache_metrics(surface_indexes)
+                    LOG.info('Overdraw:geometry:%s:surface:%s:ACMR %.3f:ATVR %.3f',
+                             self.name, mat_name, after[0], after[1])
+                indexes[start_index * 3:end_index * 3] = [ vertexes[surface_index]
+                                                           for surface_index in surface_indexes ]
 
         # Use NVTriStrip to generate a vertex cache aware triangle list
-        if nvtristrip is not None:
+        elif nvtristrip is not None:
             for (start_index, end_index) in new_surfaces.itervalues():
                 reverse_map = {}
                 indexes_map = {}
@@ -868,6 +1055,27 @@ class Dae2Geometry(object):
                 indexes_map = None
                 reverse_map = None
 
+        if vertex_fetch and indexes:
+            # Reorder each index stream and the values it indexes in the order they are first used
+            mappings = [ ]
+            for offset in xrange(len(indexes[0])):
+                mapping = { }
+                order = [ ]
+                for vertex in indexes:
+                    i = vertex[offset]
+                    if i not in mapping:
+                        mapping[i] = len(order)
+                        order.append(i)
+                for semantic, semantic_offset in new_offsets.iteritems():
+                    if semantic_offset == offset:
+                        values = mesh.get_values(semantic)
+                        mesh.set_values([ values[old_index] for old_index in order ], semantic)
+                mappings.append(mapping)
+            indexes = [ tuple([ mappings[vertex_offset][vertex_index]
+                                for (vertex_offset, vertex_index) in enumerate(vertex) ])
+                        for vertex in indexes ]
+            LOG.info('Vertex fetch:geometry:%s:reordered %i streams', self.name, len(mappings))
+
         primitives = [ (indexes[i], indexes[i + 1], indexes[i + 2]) for i in xrange(0, len(indexes), 3) ]
 
         # Fix up the surfaces...
@@ -901,6 +1109,19 @@ class Dae2Geometry(object):
                                                            len(mesh.tangents))
    # pylint: enable=R0914
 
+    def process(self, definitions_asset, nodes, nvtristrip, materials, effects, mesh_class=Mesh, weld=None,
+                vertex_cache=False, overdraw=None, vertex_fetch=False, lods=0, lod_ratio=simplify.DEFAULT_LOD_RATIO,
+                lod_error=simplify.DEFAULT_MAX_ERROR):
+        (generate_normals, generate_tangents, mat_name) = self.requirements(definitions_asset, nodes, materials,
+                                                                            effects)
+        self.process_mesh(generate_normals, generate_tangents, mat_name, nvtristrip, mesh_class, weld, vertex_cache,
+                          overdraw, vertex_fetch, lods, lod_ratio, lod_error)
+    # pylint: enable=R0913
+
+    def weight(self):
+        """Rough measure of the work needed to process the geometry."""
+        return sum(len(surface.primitives) for surface in self.surfaces.itervalues())
+
     def attach(self, json_asset):
         json_asset.attach_shape(self.name)
         json_asset.attach_meta(self.meta, self.name)
@@ -908,6 +1129,7 @@ class Dae2Geometry(object):
             json_asset.attach_surface(surface.primitives, surface.type, self.name, surface_name)
         for semantic, i in self.inputs.iteritems():
             source = self.sources[i.source]
+            source.values = unpack(source.values)
             if semantic.startswith('TEXCOORD'):
                 mesh = Mesh()
                 mesh.uvs[0] = source.values
@@ -980,17 +1202,19 @@ class Dae2Effect(object):
                 return
             self.type = untag(type_e[0].tag)
 
+            new_params = index_children(profile_e, 'newparam', 'sid')
+
             def _add_texture(param_name, texture_e):
                 texture_name = None
                 sampler_name = texture_e.get('texture')
                 if sampler_name is not None:
-                    sampler_e = find_new_param(profile_e, sampler_name)
+                    sampler_e = new_params.get(sampler_name)
                     if sampler_e is not None:
                         sampler_type_e = sampler_e[0]
                         if sampler_type_e is not None:
                             source_e = sampler_type_e.find(tag('source'))
                             if source_e is not None:
-                                surface_param_e = find_new_param(profile_e, source_e.text)
+                                surface_param_e = new_params.get(source_e.text)
                                 if surface_param_e is not None:
                                     surface_e = surface_param_e.find(tag('surface'))
                                     if surface_e is not None:
@@ -1016,7 +1240,7 @@ class Dae2Effect(object):
                         value_text = value_e.text
                         if value_type == 'param':
                             param_ref = value_e.get('ref')
-                            param_ref_e = find_new_param(profile_e, param_ref)
+                            param_ref_e = new_params.get(param_ref)
                             if param_ref_e is not None:
                                 for ref_value_e in param_ref_e.getchildren():
                                     value_type = untag(ref_value_e.tag)
@@ -1049,7 +1273,7 @@ class Dae2Effect(object):
                             if texture_e is not None:
                                 _add_texture('bump', texture_e)
 
-            tint_color_e = find_new_param(profile_e, '_TintColor')
+            tint_color_e = new_params.get('_TintColor')
             if tint_color_e is not None:
                 value_e = tint_color_e.find(tag('float4'))
                 if value_e is not None:
@@ -1203,6 +1427,7 @@ class Dae2Material(object):
                     break
 
         # Params...
+        set_params = index_children(effect_e, 'setparam', 'ref')
         for param_e in effect_e.findall(tag('setparam')):
             param_name = param_e.get('ref')
             for value_e in param_e.getchildren():
@@ -1211,7 +1436,7 @@ class Dae2Material(object):
                     texture_name = 'null'
                     source_e = value_e.find(tag('source'))
                     if source_e is not None:
-                        surface_param_e = find_set_param(effect_e, source_e.text)
+                        surface_param_e = set_params.get(source_e.text)
                         if surface_param_e is not None:
                             surface_e = surface_param_e.find(tag('surface'))
                             if surface_e is not None:
@@ -1417,19 +1642,15 @@ class Dae2Node(object):
                         array_e = s.find(tag('float_array'))
                         count = int(array_e.get('count', '0'))
                         if 0 < count:
-                            values_text = array_e.text
-                            values = [float(x) for x in values_text.split()]
+                            values = parse_floats(array_e.text, count)
                             self.sources[s.get('id')] = { 'name': param_name, 'values': values }
                     elif param_type == 'float4x4':
                         array_e = s.find(tag('float_array'))
                         count = int(array_e.get('count', '0'))
                         if 0 < count:
-                            values_text = array_e.text
-                            float_values = [float(x) for x in values_text.split()]
                             values = [ ]
-                            for i in range(0, len(float_values), 16):
-                                matrix = vmath.m44transpose(float_values[i:i+16])
-                                values.append(vmath.m43from_m44(matrix))
+                            for matrix in FloatView(parse_floats(array_e.text, count), 16):
+                                values.append(vmath.m43from_m44(vmath.m44transpose(matrix)))
                             self.sources[s.get('id')] = { 'name': param_name, 'values': values }
                     else:
                         LOG.warning('SKIN with unknown param type:%s:ignoring', param_type)
@@ -1540,7 +1761,7 @@ class Dae2Node(object):
                     surface.sources.add(self.indices_input)
                     surface.sources.add(self.weights_input)
 
-        def __init__(self, instance_controller_e, scale, controllers_e, child_name, geometries):
+        def __init__(self, instance_controller_e, scale, collada_index, child_name, geometries):
             self.skeleton = None
             self.skin = None
             self.geometry = None
@@ -1551,7 +1772,7 @@ class Dae2Node(object):
                 self.skeleton_name = tidy_name(skeleton_e.text)
 
             controller_name = tidy_name(instance_controller_e.get('url'))
-            controller_e = find_controller(controller_name, controllers_e)
+            controller_e = find_controller(controller_name, collada_index)
             if controller_e is not None:
                 skin_e = controller_e.find(tag('skin'))
                 if skin_e is not None:
@@ -1646,8 +1867,8 @@ class Dae2Node(object):
         return path
 
 # pylint: disable=R0913,R0914
-    def __init__(self, node_e, global_scale, parent_node, parent_matrix, parent_prefix, controllers_e, collada_e,
-                 name_map, node_names, node_map, geometries):
+    def __init__(self, node_e, global_scale, parent_node, parent_matrix, parent_prefix, collada_index, name_map,
+                 node_names, node_map, geometries):
         self.matrix = None
 
         # !!! Put these in a dictionary??
@@ -1782,25 +2003,24 @@ class Dae2Node(object):
 
         for instance_controller_e in node_e.findall(tag('instance_controller')):
             self.instance_controller.append(Dae2Node.InstanceController(instance_controller_e, global_scale,
-                                                                        controllers_e, None, geometries))
+                                                                        collada_index, None, geometries))
 
         # Instanced nodes, processed like normal children but with custom prefixes
         for instance_node_e in node_e.findall(tag('instance_node')):
             instance_node_url = instance_node_e.get('url')
             if instance_node_url is not None:
                 if instance_node_url[0] == '#':
-                    instanced_node_e = find_node(instance_node_url, collada_e)
+                    instanced_node_e = find_node(instance_node_url, collada_index)
                     if instanced_node_e is not None:
                         self.children.append(Dae2Node(instanced_node_e, global_scale, self, None, node_name,
-                                                      controllers_e, collada_e, name_map, node_names, node_map,
-                                                      geometries))
+                                                      collada_index, name_map, node_names, node_map, geometries))
                 else:
                     self.references.append(instance_node_url)
 
         # Children...
         for children_e in node_e.findall(tag('node')):
-            self.children.append(Dae2Node(children_e, global_scale, self, None, parent_prefix, controllers_e,
-                                          collada_e, name_map, node_names, node_map, geometries))
+            self.children.append(Dae2Node(children_e, global_scale, self, None, parent_prefix, collada_index,
+                                          name_map, node_names, node_map, geometries))
 # pylint: enable=R0913,R0914
 
     def process(self, nodes):
@@ -1870,7 +2090,7 @@ class Dae2PhysicsMaterial(object):
         json_asset.attach_physics_material(self.name, self.params)
 
 class Dae2PhysicsModel(object):
-    def __init__(self, physics_model_e, geometries_nodes_e, rigid_body_map, name_map):
+    def __init__(self, physics_model_e, library_geometries, rigid_body_map, name_map):
         self.rigidbodys = { }
 
         # Name...
@@ -1892,14 +2112,12 @@ class Dae2PhysicsModel(object):
                         geometry_name = tidy_name(instance_geometry_e.get('url'))
                         rigidbody['geometry'] = find_name(name_map, geometry_name)
 
-                        for geometry_e in geometries_nodes_e.findall(tag('geometry')):
-                            geometry_id = geometry_e.get('id')
-                            if geometry_id == geometry_name:
-                                if geometry_e.find(tag('convex_mesh')) is not None:
-                                    rigidbody['shape'] = 'convexhull'
-                                else:
-                                    rigidbody['shape'] = 'mesh'
-                                break
+                        geometry_e = library_geometries.get(geometry_name)
+                        if geometry_e is not None:
+                            if geometry_e.find(tag('convex_mesh')) is not None:
+                                rigidbody['shape'] = 'convexhull'
+                            else:
+                                rigidbody['shape'] = 'mesh'
                     else:
                         shape_type_e = shape_e[0]
                         shape_type_name = untag(shape_type_e.tag)
@@ -2071,6 +2289,10 @@ class Dae2Animation(object):
         self.samplers = { }
         self.channels = [ ]
         self.children = [ ]
+        # The (times, values, interpolation, sorted) sources of each sampler evaluated and the index of the key found
+        # by its last evaluation, clips evaluate each sampler at increasing times.
+        self.sampler_sources = { }
+        self.sampler_cursors = { }
 
         # Name...
         self.id = animation_e.get('id', 'unknown')
@@ -2104,14 +2326,7 @@ class Dae2Animation(object):
                 count = int(array_e.get('count', '0'))
                 stride = int(accessor_e.get('stride', '1'))
                 if 0 < count:
-                    values_text = array_e.text
-                    float_values = [float(x) for x in values_text.split()]
-                    if stride == 1:
-                        values = float_values
-                    else:
-                        values = []
-                        for i in range(0, count, stride):
-                            values.append(float_values[i:i+stride])
+                    values = float_view(parse_floats(array_e.text, count), stride)
                     self.sources[s.get('id')] = { 'name': param_name, 'values': values }
 
         sampler_e = animation_e.findall(tag('sampler'))
@@ -2133,22 +2348,52 @@ class Dae2Animation(object):
         #print self.samplers
         #print self.channels
 
-    def evaluate(self, time, sampler_id):
-        sampler = self.samplers[sampler_id]
-        times = self.sources[sampler['inputs']['INPUT']]['values']
-        values = self.sources[sampler['inputs']['OUTPUT']]['values']
-        interpolation = self.sources[sampler['inputs']['INTERPOLATION']]['values']
+    def __sampler_sources(self, sampler_id):
+        sources = self.sampler_sources.get(sampler_id)
+        if sources is None:
+            sampler = self.samplers[sampler_id]
+            times = self.sources[sampler['inputs']['INPUT']]['values']
+            values = self.sources[sampler['inputs']['OUTPUT']]['values']
+            interpolation = self.sources[sampler['inputs']['INTERPOLATION']]['values']
+
+            if len(times) == 0 or len(values) == 0:
+                LOG.error('Animation evaluation failed due to missing times or values in:%s', self.name)
+            if len(times) != len(values):
+                LOG.error('Animation evaluation failed due to mismatch in count of times and values in:%s', self.name)
+
+            is_sorted = all(t0 <= t1 for t0, t1 in izip(times, times[1:]))
+            if not is_sorted:
+                LOG.warning('Animation sampler:%s:in animation:%s:has unsorted times, searching them linearly',
+                            sampler_id, self.name)
+            sources = (times, values, interpolation, is_sorted)
+            self.sampler_sources[sampler_id] = sources
+        return sources
+
+    def __find_key(self, time, sampler_id, times):
+        """Index of the first key at or after time in sorted times, trying the key found by the last evaluation of the
+        sampler and the one after it before searching."""
+        num_keys = len(times)
+        i = self.sampler_cursors.get(sampler_id, 0)
+        if not (i < num_keys and (i == 0 or times[i - 1] < time) and time <= times[i]):
+            i += 1
+            if not (i < num_keys and times[i - 1] < time and time <= times[i]):
+                i = bisect_left(times, time)
+        self.sampler_cursors[sampler_id] = i
+        return i
 
-        if len(times) == 0 or len(values) == 0:
-            LOG.error('Animation evaluation failed due to missing times or values in:%s', self.name)
-        if len(times) != len(values):
-            LOG.error('Animation evaluation failed due to mismatch in count of times and values in:%s', self.name)
+    def evaluate(self, time, sampler_id):
+        (times, values, interpolation, is_sorted) = self.__sampler_sources(sampler_id)
 
         if time < times[0]:
             return values[0]
         if time > times[len(times)-1]:
             return values[len(values)-1]
-        for i, t in enumerate(times):
+        if is_sorted:
+            keys = (self.__find_key(time, sampler_id, times),)
+        else:
+            keys = xrange(len(times))
+        for i in keys:
+            t = times[i]
             if t == time:
                 return values[i]
             elif t > time:
@@ -2178,18 +2423,58 @@ class Dae2Animation(object):
         LOG.warning('Animation evaluation failed in animation:%s', self.name)
         return values[0]
 
+    def evaluate_batch(self, times, sampler_id):
+        """Evaluate the sampler at each of the times at once, as an array of N values or of N rows of values.
+        Requires numpy, matches evaluate."""
+        (key_times, values, interpolation, is_sorted) = self.__sampler_sources(sampler_id)
+        if not is_sorted:
+            return numpy.array([ self.evaluate(t, sampler_id) for t in times ], dtype=numpy.float64)
+
+        times = numpy.asarray(times, dtype=numpy.float64)
+        key_times = numpy.asarray(key_times, dtype=numpy.float64)
+        if isinstance(values, FloatView):
+            values = numpy.asarray(values.data, dtype=numpy.float64).reshape(-1, values.stride)
+        else:
+            values = numpy.asarray(values, dtype=numpy.float64)
+        last_key = len(key_times) - 1
+
+        # The first key at or after each time, as found by evaluate, the times before the first key and after the
+        # last one take the value of that key.
+        found = numpy.searchsorted(key_times, times, 'left')
+        key = numpy.minimum(found, last_key)
+        end_key = numpy.clip(found, 1, max(1, last_key))
+        start_key = end_key - 1
+        interpolated = (key_times[key] != times) & (key_times[0] < times) & (times < key_times[last_key])
+        if not interpolated.any():
+            return values[key]
+        for i in numpy.unique(start_key[interpolated]):
+            if interpolation[i] != 'LINEAR':
+                LOG.warning('Animation evaluation linear sampling non linear keys of type:%s:in animation:%s',
+                            interpolation[i], self.name)
+                break
+
+        start_time = key_times[start_key]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            delta = (times - start_time) / (key_times[end_key] - start_time)
+        start_val = values[start_key]
+        end_val = values[end_key]
+        if values.ndim > 1:
+            delta = delta[:, numpy.newaxis]
+            interpolated = interpolated[:, numpy.newaxis]
+        return numpy.where(interpolated, start_val + delta * (end_val - start_val), values[key])
+
 
 
 #######################################################################################################################
 
-def _decompose_matrix(matrix, node):
+def _decompose_matrix(matrix, node_name):
     sx = vmath.v3length(vmath.m43right(matrix))
     sy = vmath.v3length(vmath.m43up(matrix))
     sz = vmath.v3length(vmath.m43at(matrix))
     det = vmath.m43determinant(matrix)
     if not vmath.v3equal(vmath.v3create(sx, sy, sz), vmath.v3create(1, 1, 1)) or det < 0:
         if det < 0:
-            LOG.warning('Detected negative scale in node "%s", not currently supported', node.name)
+            LOG.warning('Detected negative scale in node "%s", not currently supported', node_name)
             sx *= -1
         if sx != 0:
             matrix = vmath.m43setright(matrix, vmath.v3muls(vmath.m43right(matrix), 1 / sx))
@@ -2212,14 +2497,19 @@ def _decompose_matrix(matrix, node):
     scale = vmath.v3create(sx, sy, sz)
     return (quat, pos, scale)
 
-def _evaluate_node(node, time, target_data, global_scale):
-    identity_matrix = vmath.M44IDENTITY
-    matrix = identity_matrix
+TRANSFORM_TYPES = ('translate', 'rotate', 'scale', 'matrix')
 
+def _node_params(node, target_data):
+    """The (type, values, channels) of each transform child of the node element, channels being the (target
+    attribute, animation, sampler id) animating it. Unlike the element they can be sent to worker processes."""
     node_e = node.element
     node_id = node_e.get('id')
+    params = [ ]
     for node_param_e in node_e:
-        overloads = []
+        child_type = untag(node_param_e.tag)
+        if child_type not in TRANSFORM_TYPES:
+            continue
+        channels = [ ]
         if target_data:
             if 'sid' in node_param_e.attrib:
                 sid = node_param_e.attrib['sid']
@@ -2229,12 +2519,23 @@ def _evaluate_node(node, time, target_data, global_scale):
                         (target_node_id, _, parameter) = channel['target'].partition('/')
                         (target_sid, _, target_attrib) = parameter.partition('.')
                         if target_node_id == node_id and target_sid == sid:
-                            overloads.append((target_attrib, anim.evaluate(time, channel['sampler'])))
+                            channels.append((target_attrib, anim, channel['sampler']))
+        params.append((child_type, [ float(x) for x in node_param_e.text.split() ], channels))
+    return params
+
+def _evaluate_node(node, time, target_data, global_scale):
+    return _evaluate_params(_node_params(node, target_data), time, global_scale)
+
+def _evaluate_params(params, time, global_scale):
+    identity_matrix = vmath.M44IDENTITY
+    matrix = identity_matrix
+
+    for child_type, values, channels in params:
+        overloads = [ (target_attrib, anim.evaluate(time, sampler)) for target_attrib, anim, sampler in channels ]
 
 # pylint: disable=C0330
-        child_type = untag(node_param_e.tag)
         if child_type == 'translate':
-            offset = [ float(x) for x in node_param_e.text.split() ]
+            offset = list(values)
             for overload_attrib, overload_value in overloads:
                 if overload_attrib == 'X':
                     offset[0] = overload_value
@@ -2252,9 +2553,9 @@ def _evaluate_node(node, time, target_data, global_scale):
             matrix = vmath.m43mulm44(translate_matrix, matrix)
 
         elif child_type == 'rotate':
-            rotate = [ float(x) for x in node_param_e.text.split() ]
+            rotate = list(values)
             for overload_attrib, overload_value in overloads:
-                if isinstance(overload_value, list):
+                if isinstance(overload_value, (list, tuple)):
                     rotate[0] = overload_value[0]
                     rotate[1] = overload_value[1]
                     rotate[2] = overload_value[2]
@@ -2287,7 +2588,7 @@ def _evaluate_node(node, time, target_data, global_scale):
                 matrix = vmath.m33mulm44(rotate_matrix, matrix)
 
         elif child_type == 'scale':
-            scale = [ float(x) for x in node_param_e.text.split() ]
+            scale = list(values)
             for overload_attrib, overload_value in overloads:
                 if overload_attrib == 'X':
                     scale[0] = overload_value
@@ -2309,7 +2610,7 @@ def _evaluate_node(node, time, target_data, global_scale):
                 for overload_attrib, overload_value in overloads:
                     local_matrix = vmath.m44transpose(overload_value)
             else:
-                local_matrix = vmath.m44transpose([ float(x) for x in node_param_e.text.split() ])
+                local_matrix = vmath.m44transpose(values)
             if matrix != identity_matrix:
                 matrix = vmath.m44mul(local_matrix, matrix)
             else:
@@ -2324,10 +2625,153 @@ def _evaluate_node(node, time, target_data, global_scale):
 
     return vmath.m43from_m44(matrix)
 
+# pylint: disable=R0912,R0914
+def _evaluate_params_batch(params, times, global_scale):
+    """Evaluate the local matrix of a node at all the times at once with the vmath batch functions, as an N x 12
+    array of m43 matching _evaluate_params within vmath.PRECISION. Requires numpy."""
+    num_times = len(times)
+    matrix = numpy.array(vmath.M44IDENTITY, dtype=numpy.float64)
+
+    for child_type, values, channels in params:
+        overloads = [ (target_attrib, anim.evaluate_batch(times, sampler))
+                      for target_attrib, anim, sampler in channels ]
+
+        if child_type == 'translate':
+            offset = numpy.tile(values, (num_times, 1))
+            for overload_attrib, overload_value in overloads:
+                if overload_attrib == 'X':
+                    offset[:, 0] = overload_value
+                elif overload_attrib == 'Y':
+                    offset[:, 1] = overload_value
+                elif overload_attrib == 'Z':
+                    offset[:, 2] = overload_value
+                elif overload_attrib == '':
+                    offset[:] = overload_value
+
+            translate_matrix = numpy.zeros((num_times, 12))
+            translate_matrix[:, (0, 4, 8)] = 1.0
+            translate_matrix[:, 9:12] = offset
+            matrix = vmath.m43mulm44_batch(translate_matrix, matrix)
+
+        elif child_type == 'rotate':
+            rotate = numpy.tile(values, (num_times, 1))
+            for overload_attrib, overload_value in overloads:
+                if overload_value.ndim > 1:
+                    rotate[:, 0:4] = overload_value[:, 0:4]
+                else:
+                    rotate[:, 3] = overload_value
+
+            # A rotation of zero degrees builds an identity matrix, leaving the matrix as it is.
+            angle = rotate[:, 3] / 180.0 * math.pi
+            rotate_matrix = vmath.m33from_axis_rotation_batch(rotate[:, 0:3], angle)
+            matrix = vmath.m33mulm44_batch(rotate_matrix, matrix)
+
+        elif child_type == 'scale':
+            scale = numpy.tile(values, (num_times, 1))
+            for overload_attrib, overload_value in overloads:
+                if overload_attrib == 'X':
+                    scale[:, 0] = overload_value
+                elif overload_attrib == 'Y':
+                    scale[:, 1] = overload_value
+                elif overload_attrib == 'Z':
+                    scale[:, 2] = overload_value
+                elif overload_attrib == '':
+                    scale[:] = overload_value
+
+            scale_matrix = numpy.zeros((num_times, 9))
+            scale_matrix[:, (0, 4, 8)] = scale
+            matrix = vmath.m33mulm44_batch(scale_matrix, matrix)
+
+        elif child_type == 'matrix':
+            if len(overloads) > 1:
+                LOG.warning('Found multiple matrices animating a single node')
+            if overloads:
+                local_matrix = vmath.m44transpose_batch(overloads[-1][1])
+            else:
+                local_matrix = vmath.m44transpose_batch(values)
+            matrix = vmath.m44mul_batch(local_matrix, matrix)
+
+    matrix = numpy.array(numpy.broadcast_to(matrix, (num_times, 16)))
+
+    # Hard coded scale
+    if global_scale != 1.0:
+        matrix[:, 12:16] *= global_scale
+
+    matrix[abs(matrix) < vmath.PRECISION] = 0.0 # Remove tiny values
+
+    return matrix[:, (0, 1, 2, 4, 5, 6, 8, 9, 10, 12, 13, 14)]
+# pylint: enable=R0912,R0914
+
+def _decompose_matrix_batch(matrix, node_name):
+    """The rotations, translations and scales of an N x 12 array of m43, as arrays matching _decompose_matrix within
+    vmath.PRECISION. Requires numpy."""
+    matrix = numpy.array(matrix)
+    axes = (vmath.V3XAXIS, vmath.V3YAXIS, vmath.V3ZAXIS)
+    scales = numpy.stack([ vmath.v3length_batch(matrix[:, n * 3:n * 3 + 3]) for n in xrange(3) ], axis=-1)
+    det = vmath.m43determinant_batch(matrix)
+    negative = det < 0
+    scaled = (abs(scales - 1.0) > vmath.PRECISION).any(axis=1) | negative
+    if negative.any():
+        LOG.warning('Detected negative scale in node "%s", not currently supported', node_name)
+        scales[:, 0] = numpy.where(negative, -scales[:, 0], scales[:, 0])
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        for n in xrange(3):
+            axis = matrix[:, n * 3:n * 3 + 3]
+            s = scales[:, n]
+            axis[:] = numpy.where(scaled[:, numpy.newaxis],
+                                  numpy.where((s != 0)[:, numpy.newaxis], axis / s[:, numpy.newaxis], axes[n]),
+                                  axis)
+    scales[~scaled] = 1.0
+
+    return (vmath.quatfrom_m43_batch(matrix), matrix[:, 9:12], scales)
+
+def _evaluate_joint_keys(job):
+    """Evaluate the (rotation, translation, scale) of a joint at each of the times of an (index, node name, params,
+    times, global scale) job. All the times are evaluated at once when numpy is available, with the matrices of each
+    time otherwise. Returns (index, keys)."""
+    (index, node_name, params, times, global_scale) = job
+    if numpy is None:
+        keys = [ _decompose_matrix(_evaluate_params(params, t, global_scale), node_name) for t in times ]
+    else:
+        matrix = _evaluate_params_batch(params, times, global_scale)
+        (rotations, translations, scales) = _decompose_matrix_batch(matrix, node_name)
+        keys = zip([ tuple(q) for q in rotations.tolist() ],
+                   [ tuple(p) for p in translations.tolist() ],
+                   [ tuple(s) for s in scales.tolist() ])
+    return (index, keys)
+
+def _evaluate_joints_keys(jobs, workers):
+    """Evaluate the keys of the joints of the jobs, with a pool of worker processes when there are several of each.
+    Returns the keys of each job in order."""
+    results = [ None ] * len(jobs)
+    workers = standard_workers(workers)
+    if workers > 1 and len(jobs) > 1:
+        LOG.info('Evaluating %i joints with %i workers', len(jobs), workers)
+        pool = Pool(min(workers, len(jobs)), _init_worker, (logging.getLogger().level,))
+        try:
+            for (index, keys) in pool.imap_unordered(_evaluate_joint_keys, jobs):
+                results[index] = keys
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for job in jobs:
+            (index, keys) = _evaluate_joint_keys(job)
+            results[index] = keys
+    return results
+
 class Dae2AnimationClip(object):
     # pylint: disable=R0914
     def __init__(self, animation_clip_e, global_scale, upaxis_rotate, library_animation_clips_e, name_map, animations,
-                 nodes, default_root):
+                 nodes, default_root, key_errors=None, tracks=False, quantize_tracks=False, sample_rate=None,
+                 workers=1):
+        """With key_errors, a (rotation, translation, scale) tuple of error bounds, the keys reproduced by
+        interpolating the keys around them are removed. With tracks the keys of each joint are written as a list of
+        times and a flat list of values per channel, with quantize_tracks the rotations and translations are
+        quantized. With sample_rate every animated joint is evaluated at that many keys per second instead of at the
+        times of the keys of its animations. The joints are evaluated with a pool of worker processes when workers
+        is more than 1."""
         self.name = None
         self.scale = global_scale
         self.source_anims = [ ]
@@ -2367,7 +2811,7 @@ class Dae2AnimationClip(object):
         #     'bounds': [ { 'center': [0,0,0], 'halfExtent': [10,10,10] } ],
         #     'joint_data': [ { 'time': 0, 'rotation': [0,0,0,1], 'translation': [0,0,0] } ]
 
-        global_times = []
+        global_times = set()
 
         def __find_node_in_dict(node_dict, node_name):
 
@@ -2416,7 +2860,7 @@ class Dae2AnimationClip(object):
                         sampler_input = sampler['inputs']['INPUT']
                         if sampler_input in anim.sources:
                             if not target in targets:
-                                targets[target] = { 'anims': [], 'keyframe_times': [] }
+                                targets[target] = { 'anims': [], 'keyframe_times': set() }
                             if anim not in targets[target]['anims']:
                                 targets[target]['anims'].append(anim)
 
@@ -2424,11 +2868,8 @@ class Dae2AnimationClip(object):
                             times = targets[target]['keyframe_times']
                             time_inputs = anim.sources[sampler_input]
                             if time_inputs['name'] == 'TIME':
-                                for t in time_inputs['values']:
-                                    if t not in times:
-                                        times.append(t)
-                                    if t not in global_times:
-                                        global_times.append(t)
+                                times.update(time_inputs['values'])
+                                global_times.update(time_inputs['values'])
 
         if len(targets) == 0:
             return
@@ -2463,33 +2904,53 @@ class Dae2AnimationClip(object):
 
         # Generate some joint data for the animation
         frames = [ ]
-
+        num_keys = 0
+        num_reduced_keys = 0
+        max_key_errors = (0.0, 0.0, 0.0)
+
+        # Resampled clips have a key every frame, the last one at or after the end of the clip
+        if sample_rate:
+            num_frames = int(math.ceil(anim_length * sample_rate - vmath.PRECISION)) + 1
+            frame_times = [ start_time + n / float(sample_rate) for n in xrange(num_frames) ]
+
+        # Evaluate the keys of all the animated joints first, as they may be evaluated in parallel
+        joint_jobs = { }
+        jobs = [ ]
         for j, joint in enumerate(hierarchy):
             orig_index = joint['orig_index']
             if orig_index is not -1:
                 target_name = start_joints[orig_index]
             else:
                 target_name = None
+            if target_name is not None and target_name in targets:
+                target_data = targets[target_name]
+                if sample_rate:
+                    key_times = frame_times
+                else:
+                    key_times = target_data['keyframe_times']
+                    key_times = sorted(key_times)
+                    if key_times[0] > start_time:
+                        key_times.insert(0, start_time)
+                    if key_times[len(key_times) - 1] < end_time:
+                        key_times.append(end_time)
+                node = joint['node']
+                joint_jobs[j] = len(jobs)
+                jobs.append((len(jobs), node.name, _node_params(node, target_data), key_times, global_scale))
+        joint_keys = _evaluate_joints_keys(jobs, workers)
+
+        for j, joint in enumerate(hierarchy):
             node = joint['node']
             node.animated = True
             joint_data = [ ]
-            if target_name is not None and target_name in targets:
-                target_data = targets[target_name]
-                key_times = target_data['keyframe_times']
-                key_times = sorted(key_times)
-                if key_times[0] > start_time:
-                    key_times.insert(0, start_time)
-                if key_times[len(key_times) - 1] < end_time:
-                    key_times.append(end_time)
-                for t in key_times:
-                    node_matrix = _evaluate_node(node, t, target_data, global_scale)
-                    qps = _decompose_matrix(node_matrix, node)
+            if j in joint_jobs:
+                key_times = jobs[joint_jobs[j]][3]
+                for t, qps in izip(key_times, joint_keys[joint_jobs[j]]):
                     frame_time = t - start_time
                     joint_data.append({'time': frame_time, 'rotation': qps[0], 'translation': qps[1], 'scale': qps[2] })
             else:
                 # no targets so we simply add a start key
                 node_matrix = _evaluate_node(node, start_time, None, global_scale)
-                qps = _decompose_matrix(node_matrix, node)
+                qps = _decompose_matrix(node_matrix, node.name)
                 joint_data.append({'time': 0, 'rotation': qps[0], 'translation': qps[1], 'scale': qps[2] })
 
             # TODO: remove translation of [0, 0, 0]
@@ -2536,6 +2997,12 @@ class Dae2AnimationClip(object):
                     channels['scale'] = True
                 joint_data = None
 
+            if joint_data is not None and key_errors is not None:
+                num_keys += len(joint_data)
+                (joint_data, errors) = keyframes.reduce_keyframes(joint_data, *key_errors)
+                num_reduced_keys += len(joint_data)
+                max_key_errors = tuple(max(a, b) for a, b in zip(max_key_errors, errors))
+
             frame_data = { 'channels': channels }
             if joint_data is not None:
                 frame_data['keyframes'] = joint_data
@@ -2543,6 +3010,10 @@ class Dae2AnimationClip(object):
                 frame_data['baseframe'] = base_frame
             frames.append( frame_data )
 
+        if key_errors is not None and num_keys > 0:
+            LOG.info('Keyframes:animation:%s:reduced from %i to %i keys:max error rotation:%g degrees:'
+                     'translation:%g:scale:%g', self.name, num_keys, num_reduced_keys, *max_key_errors)
+
         # Work out what channels of data are included in the animation
         channel_union = set(frames[0]['channels'].keys())
         uniform_channels = True
@@ -2597,6 +3068,21 @@ class Dae2AnimationClip(object):
                       'channels': dict.fromkeys(channel_union, True),
                       'nodeData': frames,
                       'bounds': bounds }
+        if sample_rate:
+            self.anim['frameRate'] = sample_rate
+
+        if tracks or quantize_tracks:
+            joint_tracks = [ ]
+            for f in frames:
+                if 'keyframes' in f:
+                    f['tracks'] = keyframes.pack_tracks(f.pop('keyframes'))
+                    joint_tracks.append(f['tracks'])
+            self.anim['layout'] = 'tracks'
+            if quantize_tracks:
+                (quantization, errors) = keyframes.quantize_tracks(joint_tracks, bounds)
+                self.anim['quantization'] = quantization
+                LOG.info('Tracks:animation:%s:quantized:max error rotation:%g degrees:translation:%g',
+                         self.name, *errors)
     # pylint: enable=R0914
 
     def attach(self, json_asset, name_map):
@@ -2604,6 +3090,173 @@ class Dae2AnimationClip(object):
 
 #######################################################################################################################
 
+# The elements converted as soon as they have been read when streaming, by the tag of the library holding them. The
+# objects built from them keep no references to the elements so each one can be released before the next is parsed.
+STREAMED_ELEMENTS = { tag('library_geometries'): tag('geometry'), tag('library_animations'): tag('animation') }
+
+def iterparse_collada(input_filename, streamed_elements=STREAMED_ELEMENTS):
+    """Incrementally parse a Collada file yielding (collada_e, library_e, element_e) as each element of
+    ``streamed_elements`` directly under its library is completed. Once the caller has converted it the element is
+    cleared and removed from the library, so the converted elements are released while the rest of the file is read
+    and the other elements are kept under collada_e. A final (collada_e, None, None) is yielded once the whole
+    document has been read."""
+    collada_e = None
+    parents = [ ]
+    for event, e in ElementTree.iterparse(input_filename, events=('start', 'end')):
+        if event == 'start':
+            if collada_e is None:
+                collada_e = e
+            parents.append(e)
+        else:
+            parents.pop()
+            if parents and streamed_elements.get(parents[-1].tag) == e.tag:
+                library_e = parents[-1]
+                fix_sid(e, library_e.get('id') or library_e.get('sid'))
+                yield (collada_e, library_e, e)
+                e.clear()
+                library_e.remove(e)
+    if collada_e is not None:
+        for child_e in collada_e:
+            if child_e.tag not in streamed_elements:
+                fix_sid(child_e, None)
+        yield (collada_e, None, None)
+
+class StreamedGeometries(object):
+    """Convert geometries one at a time as they are parsed. A stub of each element is kept for the physics models,
+    with only its ids and convex_mesh marker, and the convex meshes built from another geometry are resolved from
+    the converted geometries once they have all been read as the referenced element may already be released."""
+
+    def __init__(self, name_map, geometry_names, geometries):
+        self.name_map = name_map
+        self.geometry_names = geometry_names
+        self.geometries = geometries
+        self.stubs = { }
+        self.convex_hulls = [ ]
+
+    def add(self, geometry_e, scale):
+        stub_e = ElementTree.Element(geometry_e.tag, dict(geometry_e.attrib))
+        convex_mesh_e = geometry_e.find(tag('convex_mesh'))
+        if convex_mesh_e is not None:
+            ElementTree.SubElement(stub_e, convex_mesh_e.tag, dict(convex_mesh_e.attrib))
+        geometry_id = geometry_e.get('id')
+        if geometry_id is not None and geometry_id not in self.stubs:
+            self.stubs[geometry_id] = stub_e
+
+        if convex_mesh_e is not None and convex_mesh_e.get('convex_hull_of') is not None:
+            self.convex_hulls.append(stub_e)
+        else:
+            _add_geometry(Dae2Geometry(geometry_e, scale, { }, self.name_map, self.geometry_names), self.geometries)
+
+    def finish(self):
+        """Resolve the convex meshes, before the geometries are processed."""
+        for stub_e in self.convex_hulls:
+            reference_name = tidy_name(stub_e.find(tag('convex_mesh')).get('convex_hull_of'))
+            reference = self.geometries.get(reference_name)
+            if reference is None or reference.type != 'mesh':
+                LOG.error('Unknown reference node:%s', reference_name)
+            else:
+                _add_geometry(reference.convex_hull(stub_e, self.name_map, self.geometry_names), self.geometries)
+        self.convex_hulls = [ ]
+
+def _collada_units(collada_e):
+    """Return the world scale and the up axis rotation of the Collada document."""
+    asset_e = collada_e.find(tag('asset'))
+
+    # What is the world scale?
+    scale = 1.0
+    unit_e = asset_e.find(tag('unit'))
+    if unit_e is not None:
+        scale = float(unit_e.get('meter', '1.0'))
+
+# pylint: disable=C0330
+    # What is the up axis?
+    upaxis_rotate = None
+    upaxis_e = asset_e.find(tag('up_axis'))
+    if upaxis_e is not None:
+        if upaxis_e.text == 'X_UP':
+            upaxis_rotate = [ 0.0, 1.0, 0.0, 0.0,
+                             -1.0, 0.0, 0.0, 0.0,
+                              0.0, 0.0, 1.0, 0.0,
+                              0.0, 0.0, 0.0, 1.0 ]
+        elif upaxis_e.text == 'Z_UP':
+            upaxis_rotate = [ 1.0, 0.0,  0.0, 0.0,
+                              0.0, 0.0, -1.0, 0.0,
+                              0.0, 1.0,  0.0, 0.0,
+                              0.0, 0.0,  0.0, 1.0 ]
+        LOG.info('Up axis:%s', upaxis_e.text)
+# pylint: enable=C0330
+
+    return (scale, upaxis_rotate)
+
+def _add_geometry(g, geometries):
+    # For now we only support mesh and convex_mesh
+    if g.type == 'mesh' or g.type == 'convex_mesh':
+        geometries[g.id] = g
+
+def _convert_geometries(geometries_e, scale, name_map, geometry_names, geometries):
+    library_geometries = index_children(geometries_e, 'geometry', 'id')
+    for x in geometries_e.findall(tag('geometry')):
+        _add_geometry(Dae2Geometry(x, scale, library_geometries, name_map, geometry_names), geometries)
+
+def _convert_animation(animation_e, animations_e, name_map, animations):
+    a = Dae2Animation(animation_e, animations_e, name_map, animations)
+    animations[a.id] = a
+
+def _convert_animations(animations_e, name_map, animations):
+    for x in animations_e.findall(tag('animation')):
+        _convert_animation(x, animations_e, name_map, animations)
+
+def _init_worker(level):
+    """Set up the logging of a geometry or animation worker process."""
+    logging.basicConfig(level=level, stream=sys.stdout)
+
+def _process_geometry_mesh(job):
+    (index, geometry, generate_normals, generate_tangents, mat_name) = job[:5]
+    geometry.process_mesh(generate_normals, generate_tangents, mat_name, *job[5:])
+    return (index, geometry)
+
+# pylint: disable=R0913
+def _process_geometries_parallel(geometries, definitions_asset, nodes, materials, effects, workers, mesh_options):
+    """Process the geometries with a pool of worker processes.
+       The requirements are worked out here as they need the nodes and materials, only the geometries are sent to the
+       workers. The results are merged back in a fixed order into the existing objects as the nodes reference them.
+       mesh_options are the arguments of Dae2Geometry.process_mesh after mat_name."""
+    # Without any optimization only the geometries generating normals or tangents need processing.
+    (nvtristrip, _, weld, vertex_cache, overdraw, vertex_fetch, lods) = mesh_options[:7]
+    process_all = nvtristrip is not None or weld is not None or vertex_cache or overdraw is not None or \
+        vertex_fetch or lods > 0
+
+    geometry_ids = sorted(geometries.iterkeys())
+    jobs = [ ]
+    for index, geometry_id in enumerate(geometry_ids):
+        geometry = geometries[geometry_id]
+        (generate_normals, generate_tangents, mat_name) = geometry.requirements(definitions_asset, nodes,
+                                                                                materials, effects)
+        if generate_normals or generate_tangents or process_all:
+            jobs.append((index, geometry, generate_normals, generate_tangents, mat_name) + mesh_options)
+    if not jobs:
+        return
+
+    # Start the largest geometries first so a big one doesn't end up running alone at the end.
+    jobs.sort(key=lambda job: job[1].weight(), reverse=True)
+
+    LOG.info('Processing %i geometries with %i workers', len(jobs), workers)
+    results = [ None ] * len(geometry_ids)
+    pool = Pool(min(workers, len(jobs)), _init_worker, (logging.getLogger().level,))
+    try:
+        for (index, processed) in pool.imap_unordered(_process_geometry_mesh, jobs):
+            results[index] = processed
+    finally:
+        pool.close()
+        pool.join()
+
+    for index, processed in enumerate(results):
+        if processed is not None:
+            geometries[geometry_ids[index]].__dict__.update(processed.__dict__)
+# pylint: enable=R0913
+
+#######################################################################################################################
+
 # pylint: disable=R0914
 def parse(input_filename="default.dae", output_filename="default.json", asset_url="", asset_root=".", infiles=None,
           options=None):
@@ -2633,9 +3286,39 @@ def parse(input_filename="default.dae", output_filename="default.json", asset_ur
 
     url_handler = UrlHandler(asset_root, input_filename)
 
+    streaming = options.stream
+    if options.reduce_keyframes:
+        key_errors = (options.key_rotation_error, options.key_translation_error, options.key_scale_error)
+    else:
+        key_errors = None
+    if options.sample_rate is not None:
+        if options.sample_rate <= 0:
+            LOG.error('--sample-rate must be positive')
+            exit(1)
+        if key_errors is not None:
+            LOG.warning('--reduce-keyframes is ignored when resampling animations at a fixed rate')
+            key_errors = None
+    scale = None
+    upaxis_rotate = None
+
     # DOM stuff from here...
     try:
-        collada_e = ElementTree.parse(input_filename).getroot()
+        if streaming:
+            collada_e = None
+            streamed_geometries = StreamedGeometries(name_map, geometry_names, geometries)
+            for collada_e, library_e, element_e in iterparse_collada(input_filename):
+                if element_e is None:
+                    break
+                if scale is None:
+                    (scale, upaxis_rotate) = _collada_units(collada_e)
+                if element_e.tag == tag('geometry'):
+                    streamed_geometries.add(element_e, scale)
+                else:
+                    _convert_animation(element_e, library_e, name_map, animations)
+                LOG.debug('Streamed:%s:%s', untag(element_e.tag), element_e.get('id'))
+            streamed_geometries.finish()
+        else:
+            collada_e = ElementTree.parse(input_filename).getroot()
     except IOError as e:
         LOG.error('Failed loading: %s', input_filename)
         LOG.error('  >> %s', e)
@@ -2646,34 +3329,16 @@ def parse(input_filename="default.dae", output_filename="default.json", asset_ur
         exit(2)
     else:
         if collada_e is not None:
-            fix_sid(collada_e, None)
+            if not streaming:
+                fix_sid(collada_e, None)
 
-            # Asset...
-            asset_e = collada_e.find(tag('asset'))
+            collada_index = ColladaIndex(collada_e)
+            if streaming:
+                collada_index.geometries.update(streamed_geometries.stubs)
 
-            # What is the world scale?
-            scale = 1.0
-            unit_e = asset_e.find(tag('unit'))
-            if unit_e is not None:
-                scale = float(unit_e.get('meter', '1.0'))
-
-# pylint: disable=C0330
-            # What is the up axis?
-            upaxis_rotate = None
-            upaxis_e = asset_e.find(tag('up_axis'))
-            if upaxis_e is not None:
-                if upaxis_e.text == 'X_UP':
-                    upaxis_rotate = [ 0.0, 1.0, 0.0, 0.0,
-                                     -1.0, 0.0, 0.0, 0.0,
-                                      0.0, 0.0, 1.0, 0.0,
-                                      0.0, 0.0, 0.0, 1.0 ]
-                elif upaxis_e.text == 'Z_UP':
-                    upaxis_rotate = [ 1.0, 0.0,  0.0, 0.0,
-                                      0.0, 0.0, -1.0, 0.0,
-                                      0.0, 1.0,  0.0, 0.0,
-                                      0.0, 0.0,  0.0, 1.0 ]
-                LOG.info('Up axis:%s', upaxis_e.text)
-# pylint: enable=C0330
+            # Asset...
+            if scale is None:
+                (scale, upaxis_rotate) = _collada_units(collada_e)
 
             # Core COLLADA elements are:
             #
@@ -2696,11 +3361,8 @@ def parse(input_filename="default.dae", output_filename="default.json", asset_ur
 
             geometries_e = collada_e.find(tag('library_geometries'))
             if geometries_e is not None:
-                for x in geometries_e.findall(tag('geometry')):
-                    g = Dae2Geometry(x, scale, geometries_e, name_map, geometry_names)
-                    # For now we only support mesh and convex_mesh
-                    if g.type == 'mesh' or g.type == 'convex_mesh':
-                        geometries[g.id] = g
+                if not streaming:
+                    _convert_geometries(geometries_e, scale, name_map, geometry_names, geometries)
             else:
                 LOG.info('Collada file without:library_geometries:%s', input_filename)
 
@@ -2710,7 +3372,6 @@ def parse(input_filename="default.dae", output_filename="default.json", asset_ur
                     l = Dae2Light(x, name_map, light_names)
                     lights[l.id] = l
 
-            controllers_e = collada_e.find(tag('library_controllers'))
             visual_scenes_e = collada_e.find(tag('library_visual_scenes'))
             if visual_scenes_e is not None:
                 visual_scene_e = visual_scenes_e.findall(tag('visual_scene'))
@@ -2719,8 +3380,8 @@ def parse(input_filename="default.dae", output_filename="default.json", asset_ur
                         LOG.warning('Collada file with more than 1:visual_scene:%s', input_filename)
                     node_e = visual_scene_e[0].findall(tag('node'))
                     for n in node_e:
-                        n = Dae2Node(n, scale, None, upaxis_rotate, None, controllers_e, collada_e,
-                                     name_map, node_names, node_map, geometries)
+                        n = Dae2Node(n, scale, None, upaxis_rotate, None, collada_index, name_map, node_names,
+                                     node_map, geometries)
                         nodes[n.id] = n
                     if len(node_e) == 0:
                         LOG.warning('Collada file without:node:%s', input_filename)
@@ -2730,21 +3391,23 @@ def parse(input_filename="default.dae", output_filename="default.json", asset_ur
                 LOG.warning('Collada file without:library_visual_scenes:%s', input_filename)
 
             animations_e = collada_e.find(tag('library_animations'))
-            if animations_e is not None:
-                for x in animations_e.findall(tag('animation')):
-                    a = Dae2Animation(x, animations_e, name_map, animations)
-                    animations[a.id] = a
+            if animations_e is not None and not streaming:
+                _convert_animations(animations_e, name_map, animations)
 
             animation_clips_e = collada_e.find(tag('library_animation_clips'))
             if animation_clips_e is not None:
                 for x in animation_clips_e.findall(tag('animation_clip')):
-                    c = Dae2AnimationClip(x, scale, upaxis_rotate, animation_clips_e, name_map, animations, nodes, None)
+                    c = Dae2AnimationClip(x, scale, upaxis_rotate, animation_clips_e, name_map, animations, nodes,
+                                          None, key_errors, options.animation_tracks, options.quantize_animations,
+                                          options.sample_rate, options.workers)
                     animation_clips[c.id] = c
             else:
                 if animations_e is not None:
                     LOG.info('Exporting default animations from:%s', input_filename)
                     for n in nodes:
-                        c = Dae2AnimationClip(x, scale, upaxis_rotate, None, name_map, animations, nodes, n)
+                        c = Dae2AnimationClip(None, scale, upaxis_rotate, None, name_map, animations, nodes, n,
+                                              key_errors, options.animation_tracks, options.quantize_animations,
+                                              options.sample_rate, options.workers)
                         if c.anim:
                             animation_clips[c.id] = c
 
@@ -2811,7 +3474,7 @@ def parse(input_filename="default.dae", output_filename="default.json", asset_ur
             physics_models_e = collada_e.find(tag('library_physics_models'))
             if physics_models_e is not None:
                 for x in physics_models_e.findall(tag('physics_model')):
-                    m = Dae2PhysicsModel(x, geometries_e, physics_bodies, name_map)
+                    m = Dae2PhysicsModel(x, collada_index.geometries, physics_bodies, name_map)
                     physics_models[m.id] = m
 
             physics_scenes_e = collada_e.find(tag('library_physics_scenes'))
@@ -2826,13 +3489,31 @@ def parse(input_filename="default.dae", output_filename="default.json", asset_ur
 
             # Drop reference to the etree
             collada_e = None
+            collada_index = None
 
     # Process asset...
     for _, node in nodes.iteritems():
         node.process(nodes)
 
-    for _, geometry in geometries.iteritems():
-        geometry.process(definitions_asset, nodes, options.nvtristrip, materials, effects)
+    mesh_class = Mesh
+    if options.array_mesh:
+        if numpy is not None:
+            mesh_class = ArrayMesh
+        else:
+            LOG.warning('--array-mesh requires numpy, falling back to list based meshes')
+
+    weld = None
+    if options.weld_vertexes:
+        weld = options.weld_tolerance
+
+    mesh_options = (options.nvtristrip, mesh_class, weld, options.vertex_cache, options.overdraw,
+                    options.vertex_fetch, options.lods, options.lod_ratio, options.lod_error)
+    workers = standard_workers(options.workers)
+    if workers > 1 and len(geometries) > 1:
+        _process_geometries_parallel(geometries, definitions_asset, nodes, materials, effects, workers, mesh_options)
+    else:
+        for _, geometry in geometries.iteritems():
+            geometry.process(definitions_asset, nodes, options.nvtristrip, materials, effects, *mesh_options[1:])
 
     # Create JSON...
     json_asset = JsonAsset()
@@ -2899,15 +3580,77 @@ def parse(input_filename="default.dae", output_filename="default.json", asset_ur
     return json_asset
 # pylint: enable=R0914
 
-def main():
-    description = "Convert Collada (.dae) files into a Turbulenz JSON asset."
-
+def dae2json_parser(description):
+    """Standard tool options plus the Collada specific ones."""
     parser = standard_parser(description)
     parser.add_option("--nvtristrip", action="store", dest="nvtristrip", default=None,
                       help="path to NvTriStripper, setting this enables "
                       "vertex cache optimizations")
+    parser.add_option("--vertex-cache", action="store_true", dest="vertex_cache", default=False,
+                      help="reorder the triangles of each surface for the post-transform vertex cache without "
+                      "NvTriStripper, reporting the ACMR and ATVR before and after")
+    parser.add_option("--overdraw", action="store", dest="overdraw", type="float", default=None, metavar="THRESHOLD",
+                      help="after the vertex cache optimization sort clusters of triangles to draw the outward facing "
+                      "ones first, letting the ACMR grow by up to THRESHOLD, for example 1.05")
+    parser.add_option("--vertex-fetch", action="store_true", dest="vertex_fetch", default=False,
+                      help="reorder the vertex streams in the order the triangles first use them")
+    parser.add_option("--lods", action="store", dest="lods", type="int", default=0, metavar="COUNT",
+                      help="add COUNT simplified levels of detail of each surface as extra surfaces of the geometry "
+                      "named SURFACE-lodN, sharing its vertexes")
+    parser.add_option("--lod-ratio", action="store", dest="lod_ratio", type="float",
+                      default=simplify.DEFAULT_LOD_RATIO, metavar="RATIO",
+                      help="ratio of the triangles kept by each level of detail, defaults to %.2f"
+                      % simplify.DEFAULT_LOD_RATIO)
+    parser.add_option("--lod-error", action="store", dest="lod_error", type="float",
+                      default=simplify.DEFAULT_MAX_ERROR, metavar="ERROR",
+                      help="largest error of the levels of detail relative to the size of each surface, defaults "
+                      "to %.2f" % simplify.DEFAULT_MAX_ERROR)
+    parser.add_option("--reduce-keyframes", action="store_true", dest="reduce_keyframes", default=False,
+                      help="remove the animation keys reproduced by interpolating the keys around them within the "
+                      "key error bounds, reporting the key counts before and after and the largest errors")
+    parser.add_option("--key-rotation-error", action="store", dest="key_rotation_error", type="float",
+                      default=keyframes.DEFAULT_ROTATION_ERROR, metavar="DEGREES",
+                      help="largest rotation error of the removed keys, defaults to %g degrees"
+                      % keyframes.DEFAULT_ROTATION_ERROR)
+    parser.add_option("--key-translation-error", action="store", dest="key_translation_error", type="float",
+                      default=keyframes.DEFAULT_TRANSLATION_ERROR, metavar="DISTANCE",
+                      help="largest translation error of the removed keys, defaults to %g"
+                      % keyframes.DEFAULT_TRANSLATION_ERROR)
+    parser.add_option("--key-scale-error", action="store", dest="key_scale_error", type="float",
+                      default=keyframes.DEFAULT_SCALE_ERROR, metavar="ERROR",
+                      help="largest scale error of the removed keys, defaults to %g" % keyframes.DEFAULT_SCALE_ERROR)
+    parser.add_option("--animation-tracks", action="store_true", dest="animation_tracks", default=False,
+                      help="write the keys of each joint as tracks, a list of times and a flat list of values per "
+                      "channel, instead of a dictionary per key")
+    parser.add_option("--quantize-animations", action="store_true", dest="quantize_animations", default=False,
+                      help="write animation tracks with each rotation quantized to one 32 bit integer by the smallest "
+                      "three encoding and the translations to 16 bits relative to the range of the clip")
+    parser.add_option("--sample-rate", action="store", dest="sample_rate", type="float", default=None,
+                      metavar="RATE", help="resample the animations at RATE keys per second, writing the rate as "
+                      "the frameRate of each animation, instead of keeping the times of their keys")
+    parser.add_option("--stream", action="store_true", dest="stream", default=False,
+                      help="incrementally parse the input, converting and releasing the geometry and animation "
+                      "libraries as they are read to bound peak memory use on large files")
+    parser.add_option("--array-mesh", action="store_true", dest="array_mesh", default=False,
+                      help="hold the vertex streams in NumPy arrays while generating normals and tangents, "
+                      "requires numpy")
+    parser.add_option("--workers", action="store", dest="workers", type="int", default=1, metavar="COUNT",
+                      help="number of processes generating normals and tangents for the geometries and "
+                      "evaluating the joints of the animations, defaults to 1")
+    parser.add_option("--weld-vertexes", action="store_true", dest="weld_vertexes", default=False,
+                      help="weld the vertex streams of each geometry into a single index buffer instead of indexing "
+                      "each stream separately")
+    parser.add_option("--weld-tolerance", action="store", dest="weld_tolerance", type="float", default=0.0,
+                      metavar="TOLERANCE", help="weld each vertex to the first one kept with all its values within "
+                      "TOLERANCE of its own, defaults to 0 which only welds identical vertexes")
+
+    return parser
+
+def main():
+    description = "Convert Collada (.dae) files into a Turbulenz JSON asset."
 
-    standard_main(parse, __version__, description, __dependencies__, parser)
+    parser = dae2json_parser(description)
+    return standard_main(parse, __version__, description, __dependencies__, parser)
 
 if __name__ == "__main__":
     exit(main())
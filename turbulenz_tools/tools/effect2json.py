@@ -51,9 +51,9 @@ def parse(input_filename="default.effect", output_filename="default.json", asset
 
 if __name__ == "__main__":
     try:
-        standard_main(parse, __version__,
-                      "Convert Effect Yaml (.effect) files into a Turbulenz JSON asset.",
-                      __dependencies__)
+        exit(standard_main(parse, __version__,
+                           "Convert Effect Yaml (.effect) files into a Turbulenz JSON asset.",
+                           __dependencies__))
     # pylint: disable=W0703
     except Exception as err:
         LOG.critical('Unexpected exception: %s', err)
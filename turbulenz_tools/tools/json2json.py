@@ -10,12 +10,12 @@ LOG = logging.getLogger('asset')
 
 # pylint: disable=W0403
 from stdtool import simple_options
-from turbulenz_tools.utils.json_utils import float_to_string, log_metrics, merge_dictionaries
+from turbulenz_tools.utils.json_utils import dump_asset, log_metrics, merge_dictionaries
 # pylint: enable=W0403
 
-from simplejson import load as json_load, dump as json_dump, encoder as json_encoder
+from simplejson import load as json_load
 
-__version__ = '1.0.0'
+__version__ = '1.1.0'
 __dependencies__ = [ ]
 
 #######################################################################################################################
@@ -39,8 +39,7 @@ def merge(source_files, output_filename="default.json", output_metrics=True):
     try:
         with open(output_filename, 'w') as target:
             LOG.info("Writing:%s", output_filename)
-            json_encoder.FLOAT_REPR = float_to_string
-            json_dump(merged, target, sort_keys=True, separators=(',', ':'))
+            dump_asset(merged, target, sort_keys=True)
     except IOError as e:
         LOG.error('Failed processing: %s', output_filename)
         LOG.error('  >> %s', e)
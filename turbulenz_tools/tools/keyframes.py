@@ -0,0 +1,219 @@
+# Copyright (c) 2014 Turbulenz Limited
+"""
+Reduction of the keyframes of sampled joint animations.
+
+A key is removed when interpolating the keys kept either side of it reproduces its rotation, translation and scale
+within the error bounds: rotations are slerped and compared by the angle between them, translations and scales are
+lerped and compared by distance and by the largest component difference. Every removed key is checked against the
+segment finally replacing it, so the bounds hold for all the original keys and not just between neighbours.
+
+The keys of a joint can also be packed into tracks, a list of times and a flat list of values per channel, with the
+rotations optionally quantized to a single 32 bit unsigned integer per key by the smallest three encoding and the
+translations to 16 bits relative to a range covering the whole clip.
+"""
+
+import math
+
+import turbulenz_tools.tools.vmath as vmath
+from turbulenz_tools.tools.quantize import quantize_linear
+
+__version__ = '1.2.0'
+__dependencies__ = ['vmath', 'quantize']
+
+#######################################################################################################################
+
+DEFAULT_ROTATION_ERROR = 0.1
+DEFAULT_TRANSLATION_ERROR = 0.001
+DEFAULT_SCALE_ERROR = 0.001
+
+# The 2 bits of the index of the largest component and 3 components of 10 bits fit in the 32 bit integers the runtime
+# decodes rotations from.
+DEFAULT_ROTATION_BITS = 10
+MAX_ROTATION_BITS = 10
+DEFAULT_TRANSLATION_BITS = 16
+
+CHANNELS = ('rotation', 'translation', 'scale')
+
+def _rotation_error(q, r):
+    """Angle in degrees between the rotations of two unit quaternions, from the lengths of their difference and sum
+    as acos of their dot product is badly conditioned for the small angles compared."""
+    if q[0] * r[0] + q[1] * r[1] + q[2] * r[2] + q[3] * r[3] < 0.0:
+        r = (-r[0], -r[1], -r[2], -r[3])
+    difference = math.sqrt((q[0] - r[0]) ** 2 + (q[1] - r[1]) ** 2 + (q[2] - r[2]) ** 2 + (q[3] - r[3]) ** 2)
+    total = math.sqrt((q[0] + r[0]) ** 2 + (q[1] + r[1]) ** 2 + (q[2] + r[2]) ** 2 + (q[3] + r[3]) ** 2)
+    return math.degrees(4.0 * math.atan2(difference, total))
+
+def _translation_error(a, b):
+    return math.sqrt((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2)
+
+def _scale_error(a, b):
+    return max(abs(a[0] - b[0]), abs(a[1] - b[1]), abs(a[2] - b[2]))
+
+def _segment_errors(keyframes, start, end, channels, bounds):
+    """Largest error of each channel of the keys between start and end interpolated from them, or None as soon as
+    one of the errors is over its bound."""
+    first = keyframes[start]
+    last = keyframes[end]
+    start_time = first['time']
+    duration = last['time'] - start_time
+    errors = [ 0.0 ] * len(channels)
+    for key in keyframes[start + 1:end]:
+        t = (key['time'] - start_time) / duration if duration > 0.0 else 0.0
+        for n, channel in enumerate(channels):
+            a = first[channel]
+            b = last[channel]
+            if channel == 'rotation':
+                error = _rotation_error(vmath.quatnormalize(vmath.quatslerp(a, b, t)), key[channel])
+            elif channel == 'translation':
+                error = _translation_error(vmath.v3lerp(a, b, t), key[channel])
+            else:
+                error = _scale_error(vmath.v3lerp(a, b, t), key[channel])
+            if error > bounds[n]:
+                return None
+            if error > errors[n]:
+                errors[n] = error
+    return errors
+
+# pylint: disable=R0914
+def reduce_keyframes(keyframes, rotation_error=DEFAULT_ROTATION_ERROR, translation_error=DEFAULT_TRANSLATION_ERROR,
+                     scale_error=DEFAULT_SCALE_ERROR):
+    """Remove the keys of a joint that interpolating the keys kept around them reproduces within the errors, in
+    degrees for the rotations. keyframes is the time ordered list of { 'time', 'rotation', 'translation', 'scale' }
+    dicts of the joint, channels missing from the first key are ignored. The first and last keys are always kept.
+    Returns (keyframes, errors), errors being the largest rotation, translation and scale error of the removed keys."""
+    num_keys = len(keyframes)
+    max_errors = { 'rotation': 0.0, 'translation': 0.0, 'scale': 0.0 }
+    if num_keys < 3:
+        return (list(keyframes), (0.0, 0.0, 0.0))
+
+    channels = [ channel for channel in CHANNELS if channel in keyframes[0] ]
+    bounds_by_channel = { 'rotation': rotation_error, 'translation': translation_error, 'scale': scale_error }
+    bounds = [ bounds_by_channel[channel] for channel in channels ]
+
+    reduced = [ keyframes[0] ]
+    start = 0
+    last = num_keys - 1
+    while start < last:
+        # Grow the segment exponentially then bisect between the longest one within the bounds and the shortest one
+        # found over them, every segment kept is checked so the bounds hold even though the errors are not monotonic.
+        good = start + 1
+        good_errors = None
+        bad = None
+        span = 2
+        while start + span <= last:
+            errors = _segment_errors(keyframes, start, start + span, channels, bounds)
+            if errors is None:
+                bad = start + span
+                break
+            good = start + span
+            good_errors = errors
+            span *= 2
+        if bad is None and good < last:
+            errors = _segment_errors(keyframes, start, last, channels, bounds)
+            if errors is None:
+                bad = last
+            else:
+                good = last
+                good_errors = errors
+        if bad is not None:
+            while bad - good > 1:
+                middle = (good + bad) // 2
+                errors = _segment_errors(keyframes, start, middle, channels, bounds)
+                if errors is None:
+                    bad = middle
+                else:
+                    good = middle
+                    good_errors = errors
+        if good_errors is not None:
+            for channel, error in zip(channels, good_errors):
+                max_errors[channel] = max(max_errors[channel], error)
+        reduced.append(keyframes[good])
+        start = good
+    return (reduced, (max_errors['rotation'], max_errors['translation'], max_errors['scale']))
+# pylint: enable=R0914
+
+#######################################################################################################################
+
+def pack_tracks(keyframes):
+    """Rearrange the time ordered keys of a joint into { 'times': [ t0, t1, ... ], 'rotation': [ x0, y0, z0, w0,
+    x1, ... ], ... } with a flat list of the values of each channel of the keys."""
+    tracks = { 'times': [ key['time'] for key in keyframes ] }
+    for channel in CHANNELS:
+        if channel in keyframes[0]:
+            values = [ ]
+            for key in keyframes:
+                values.extend(key[channel])
+            tracks[channel] = values
+    return tracks
+
+def quantize_rotations(rotations, bits=DEFAULT_ROTATION_BITS):
+    """Quantize a flat list of unit quaternions to one integer each by the smallest three encoding: the quaternion is
+    negated if needed to make its largest component positive, the index of that component is stored above the other
+    three components, each mapped from [-1/sqrt(2), 1/sqrt(2)] to bits unsigned bits, and the largest component is
+    recovered as sqrt(1 - a * a - b * b - c * c). Returns (quantized, error), error in degrees."""
+    if bits > MAX_ROTATION_BITS:
+        raise ValueError('Rotations quantized to %i bits per component do not fit in 32 bits, the most is %i' %
+                         (bits, MAX_ROTATION_BITS))
+    levels = (1 << bits) - 1
+    limit = math.sqrt(0.5)
+    scale = levels / (2.0 * limit)
+    inverse = 1.0 / scale
+    quantized = [ ]
+    error = 0.0
+    for n in xrange(0, len(rotations), 4):
+        q = rotations[n:n + 4]
+        largest = max(xrange(4), key=lambda i: abs(q[i]))
+        if q[largest] < 0.0:
+            q = [ -c for c in q ]
+        value = largest
+        decoded = [ ]
+        for i in xrange(4):
+            if i != largest:
+                c = max(0, min(levels, int(math.floor((q[i] + limit) * scale + 0.5))))
+                value = (value << bits) | c
+                decoded.append(c * inverse - limit)
+        decoded.insert(largest, math.sqrt(max(0.0, 1.0 - sum(c * c for c in decoded))))
+        quantized.append(value)
+        error = max(error, _rotation_error(decoded, q))
+    return (quantized, error)
+
+def translation_range(tracks, bounds):
+    """Range of the translations of the tracks of a clip and of its bounds, as (minimum, maximum)."""
+    minimum = [ ]
+    maximum = [ ]
+    for n in xrange(3):
+        values = [ ]
+        for bound in bounds:
+            values.append(bound['center'][n] - bound['halfExtent'][n])
+            values.append(bound['center'][n] + bound['halfExtent'][n])
+        for track in tracks:
+            values.extend(track.get('translation', [ ])[n::3])
+        minimum.append(min(values))
+        maximum.append(max(values))
+    return (minimum, maximum)
+
+def quantize_tracks(tracks, bounds, rotation_bits=DEFAULT_ROTATION_BITS, translation_bits=DEFAULT_TRANSLATION_BITS):
+    """Quantize the rotations and translations of the tracks of all the joints of a clip in place, the translations
+    relative to a single range covering the bounds of the clip and every translation.
+    Returns (quantization, errors), quantization describing the encodings for the runtime and errors the largest
+    rotation error in degrees and translation error. The fields of the rotation integers are listed from the most
+    significant as [ name, bits ]: the index of the largest component then the other three components in order."""
+    (minimum, maximum) = translation_range(tracks, bounds)
+    levels = (1 << translation_bits) - 1
+    offset = [ float(lo) for lo in minimum ]
+    scale = [ (hi - lo) / float(levels) for lo, hi in zip(minimum, maximum) ]
+    rotation_error = 0.0
+    translation_error = 0.0
+    for track in tracks:
+        if 'rotation' in track:
+            (track['rotation'], error) = quantize_rotations(track['rotation'], rotation_bits)
+            rotation_error = max(rotation_error, error)
+        if 'translation' in track:
+            (track['translation'], _, _, error) = quantize_linear(track['translation'], 3, translation_bits,
+                                                                  minimum, maximum)
+            translation_error = max(translation_error, error)
+    quantization = { 'rotation': { 'encoding': 'smallest-three', 'bits': rotation_bits, 'type': 'uint32',
+                                   'fields': [ [ 'largest', 2 ], [ 'a', rotation_bits ], [ 'b', rotation_bits ],
+                                               [ 'c', rotation_bits ] ] },
+                     'translation': { 'bits': translation_bits, 'offset': offset, 'scale': scale } }
+    return (quantization, (rotation_error, translation_error))
@@ -72,9 +72,9 @@ def parse(input_filename="default.material", output_filename="default.json", ass
 
 if __name__ == "__main__":
     try:
-        standard_main(parse, __version__,
-                      "Convert Material Yaml (.material) files into a Turbulenz JSON asset.",
-                      __dependencies__)
+        exit(standard_main(parse, __version__,
+                           "Convert Material Yaml (.material) files into a Turbulenz JSON asset.",
+                           __dependencies__))
     # pylint: disable=W0703
     except Exception as err:
         LOG.critical('Unexpected exception: %s', err)
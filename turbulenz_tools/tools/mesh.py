@@ -12,10 +12,18 @@ LOG = logging.getLogger('asset')
 # pylint: disable=W0403
 import turbulenz_tools.tools.vmath as vmath
 import turbulenz_tools.tools.pointmap as pointmap
+import turbulenz_tools.tools.vertexcache as vertexcache
+import turbulenz_tools.tools.simplify as simplify
 # pylint: enable=W0403
 
-__version__ = '1.1.0'
-__dependencies__ = ['pointmap', 'vmath']
+# NumPy is optional, it is only required by ArrayMesh.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__version__ = '1.4.1'
+__dependencies__ = ['pointmap', 'vmath', 'vertexcache', 'simplify']
 
 #######################################################################################################################
 
@@ -42,6 +50,11 @@ def similar_positions(major, positions, pos_tol=DEFAULT_POSITION_TOLERANCE):
         if vmath.v3equal(major, p):
             yield i
 
+def _weld_streams_order(semantics):
+    """Order the streams welded with a tolerance with the one spatially hashed first, the positions if welded."""
+    first = semantics.index('POSITION') if 'POSITION' in semantics else 0
+    return [ first ] + [ stream_index for stream_index in xrange(len(semantics)) if stream_index != first ]
+
 #######################################################################################################################
 
 # pylint: disable=R0902
@@ -289,34 +302,47 @@ class Mesh(object):
                 LOG.warning("%s: Found vertex[%i] with normal < normalizable tolerance[%g]:%s",
                             "generate_normals", i, dont_norm_tol, n)
 
+    def _similar_positions_indexes(self, include_uv_tol, root_node, pos_tol, uv_tol):
+        """Return a function listing the indexes of the vertexes close to a vertex, optionally with similar uvs.
+
+        A kd-tree root_node, either given or set as the mesh kdtree, is queried for each vertex. Otherwise the vertexes
+        close to each other are all grouped in a single pass with a spatial hash."""
+        positions = self.positions
+        uvs = self.uvs[0]
+        root_node = root_node or self.kdtree
+
+        if root_node:
+            def kdtree_indexes(i):
+                """Query the kd-tree for the vertex."""
+                if include_uv_tol:
+                    return root_node.points_within_uv_distance(positions, positions[i], pos_tol, uvs, uvs[i], uv_tol)
+                return root_node.points_within_distance(positions, positions[i], pos_tol)
+            return kdtree_indexes
+
+        groups = pointmap.build_neighbour_groups(positions, pos_tol)
+        if include_uv_tol:
+            def group_indexes(i):
+                """Filter the neighbour group of the vertex by uv."""
+                uv = uvs[i]
+                return [ j for j in groups[i] if vmath.v2equal(uvs[j], uv, uv_tol) ]
+            return group_indexes
+        return groups.__getitem__
+
     def smooth_normals(self, include_uv_tol=False,
                        root_node=None,
                        pos_tol=DEFAULT_POSITION_TOLERANCE,
                        nor_smooth_tol=DEFAULT_NORMAL_SMOOTH_TOLERANCE,
                        uv_tol=DEFAULT_UV_TOLERANCE):
         """Smooth normals within a certain position range and normal divergence limit."""
+        similar_positions_indexes = self._similar_positions_indexes(include_uv_tol, root_node, pos_tol, uv_tol)
 
-        if not root_node:
-            if not self.kdtree:
-                # Create a kd-tree to optimize the smoothing performance
-                self.kdtree = pointmap.build_kdtree(self.positions)
-            root_node = self.kdtree
-
-        uvs = self.uvs[0]
-        for i, p in enumerate(self.positions):
+        for i in xrange(len(self.positions)):
             original_normal = self.normals[i]
             accumulate_normal = (0, 0, 0)
             accumulated_indexes = [ ]
 
             # Generate a list of indexes for the positions close to the evaluation vertex.
-            if include_uv_tol:
-                uv = uvs[i]
-                similiar_positions_indexes = root_node.points_within_uv_distance(self.positions, p, pos_tol,
-                                                                                 uvs, uv, uv_tol)
-            else:
-                similiar_positions_indexes = root_node.points_within_distance(self.positions, p, pos_tol)
-
-            for i in similiar_positions_indexes:
+            for i in similar_positions_indexes(i):
                 this_normal = self.normals[i]
                 if vmath.v3is_similar(this_normal, original_normal, nor_smooth_tol):
                     accumulate_normal = vmath.v3add(accumulate_normal, this_normal)
@@ -493,14 +519,9 @@ class Mesh(object):
             binormal_similar = vmath.v3is_similar(b1, b2, nor_smooth_tol)
             return tangent_similar and binormal_similar
 
-        if not root_node:
-            if not self.kdtree:
-                # Create a kd-tree to optimize the smoothing performance
-                self.kdtree = pointmap.build_kdtree(self.positions)
-            root_node = self.kdtree
+        similar_positions_indexes = self._similar_positions_indexes(include_uv_tol, root_node, pos_tol, uv_tol)
 
-        uvs = self.uvs[0]
-        for i, p in enumerate(self.positions):
+        for i in xrange(len(self.positions)):
             original_tangent = self.tangents[i]
             original_binormal = self.binormals[i]
             accumulate_tangent = (0, 0, 0)
@@ -508,14 +529,7 @@ class Mesh(object):
             accumulated_indexes = [ ]
 
             # Generate a list of indexes for the positions close to the evaluation vertex.
-            if include_uv_tol:
-                uv = uvs[i]
-                similiar_positions_indexes = root_node.points_within_uv_distance(self.positions, p, pos_tol,
-                                                                                 uvs, uv, uv_tol)
-            else:
-                similiar_positions_indexes = root_node.points_within_distance(self.positions, p, pos_tol)
-
-            for i in similiar_positions_indexes:
+            for i in similar_positions_indexes(i):
                 this_tangent = self.tangents[i]
                 this_binormal = self.binormals[i]
                 if tangents_are_similar(this_tangent, original_tangent,
@@ -640,6 +654,85 @@ class Mesh(object):
             new_positions[to] = self.positions[i]
         self.positions = new_positions
 
+    def weld_vertexes(self, semantics, tolerance=0.0):
+        """Merge the vertexes with the same values in all the streams of the semantics and remap the primitives, giving
+           a single index per vertex. With a tolerance each vertex is merged with the first kept vertex whose values are
+           all within tolerance of its own, looked up in a spatial hash of the positions. The first vertex of each
+           group is kept."""
+        streams = [ self.get_values(semantic) for semantic in semantics ]
+        num_vertexes = len(streams[0]) if streams else 0
+        if tolerance > 0.0 and num_vertexes > 0:
+            streams_order = _weld_streams_order(semantics)
+            vertexes = [ tuple(c for value in vertex for c in value)
+                         for vertex in zip(*[ streams[stream_index] for stream_index in streams_order ]) ]
+            hashed_components = min(3, len(streams[streams_order[0]][0]))
+            (mapping, used) = pointmap.build_weld_mapping(vertexes, tolerance, hashed_components)
+        else:
+            vertex_map = { }
+            mapping = [ ]
+            used = [ ]
+            for i, key in enumerate(zip(*streams)):
+                index = vertex_map.get(key)
+                if index is None:
+                    index = len(used)
+                    vertex_map[key] = index
+                    used.append(i)
+                mapping.append(index)
+
+        for semantic, values in zip(semantics, streams):
+            self.set_values([ values[i] for i in used ], semantic)
+        self.primitives = [ (mapping[i1], mapping[i2], mapping[i3]) for (i1, i2, i3) in self.primitives ]
+        LOG.info("Welded %i vertexes to %i", num_vertexes, len(used))
+
+    def optimize_vertex_cache(self, first=0, count=None, cache_size=vertexcache.DEFAULT_CACHE_SIZE):
+        """Reorder count primitives from first, all by default, for the post-transform vertex cache.
+           Returns the (acmr, atvr) cache metrics before and after."""
+        if count is None:
+            count = len(self.primitives) - first
+        primitives = self.primitives
+        indexes = [ i for primitive in primitives[first:first + count] for i in primitive ]
+        before = vertexcache.cache_metrics(indexes, cache_size)
+        indexes = vertexcache.optimize_triangles(indexes, cache_size)
+        after = vertexcache.cache_metrics(indexes, cache_size)
+        primitives[first:first + count] = [ (indexes[n], indexes[n + 1], indexes[n + 2])
+                                            for n in xrange(0, len(indexes), 3) ]
+        self.primitives = primitives
+        LOG.info("Vertex cache:ACMR %.3f to %.3f:ATVR %.3f to %.3f", before[0], after[0], before[1], after[1])
+        return (before, after)
+
+    def optimize_overdraw(self, first=0, count=None, threshold=vertexcache.DEFAULT_OVERDRAW_THRESHOLD,
+                          cache_size=vertexcache.DEFAULT_CACHE_SIZE):
+        """Reorder the clusters of count vertex cache optimized primitives from first, all by default, to draw the
+           outward facing ones first. Returns the (acmr, atvr) cache metrics after."""
+        if count is None:
+            count = len(self.primitives) - first
+        primitives = self.primitives
+        indexes = [ i for primitive in primitives[first:first + count] for i in primitive ]
+        indexes = vertexcache.optimize_overdraw(indexes, self.positions, threshold, cache_size)
+        after = vertexcache.cache_metrics(indexes, cache_size)
+        primitives[first:first + count] = [ (indexes[n], indexes[n + 1], indexes[n + 2])
+                                            for n in xrange(0, len(indexes), 3) ]
+        self.primitives = primitives
+        LOG.info("Overdraw:ACMR %.3f:ATVR %.3f", after[0], after[1])
+        return after
+
+    def optimize_vertex_fetch(self):
+        """Reorder the vertex streams in the order the primitives first use them, for the vertex fetch cache.
+           This is best done once the primitives are in their final order, unused vertexes are removed."""
+        self.remove_redundant_vertexes()
+
+    def generate_lod(self, target_count, first=0, count=None, max_error=simplify.DEFAULT_MAX_ERROR):
+        """Simplify count primitives from first, all by default, down to target_count primitives by collapsing edges,
+           keeping UV seams and hard normals. The mesh is not modified, the primitives only reference its vertexes.
+           Returns the new primitives and the error relative to the size of the primitives."""
+        if count is None:
+            count = len(self.primitives) - first
+        indexes = [ i for primitive in self.primitives[first:first + count] for i in primitive ]
+        normals = self.normals if len(self.normals) == len(self.positions) else None
+        (indexes, error) = simplify.simplify_triangles(indexes, self.positions, target_count, max_error, normals)
+        LOG.info("LOD:%i to %i primitives:error %.5f", count, len(indexes) // 3, error)
+        return ([ (indexes[n], indexes[n + 1], indexes[n + 2]) for n in xrange(0, len(indexes), 3) ], error)
+
     ###################################################################################################################
 
     def is_convex(self, positions=None, primitives=None):
@@ -1149,6 +1242,406 @@ class Mesh(object):
 
 #######################################################################################################################
 
+def _array_to_list(values):
+    """Convert a 2D array into a list of tuples of Python scalars."""
+    return [ tuple(v) for v in values.tolist() ]
+
+def _list_to_array(values, dtype, width):
+    """Convert a list of tuples into a 2D array."""
+    if len(values) == 0:
+        return numpy.zeros((0, width or 0), dtype=dtype)
+    return numpy.array(values, dtype=dtype)
+
+class _ListView(object):
+    """Descriptor exposing an ArrayMesh stream as a list of tuples."""
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, mesh, owner):
+        if mesh is None:
+            return self
+        values = mesh.__dict__[self.slot]
+        if isinstance(values, numpy.ndarray):
+            # The list becomes the stored stream so in-place modifications are kept.
+            values = _array_to_list(values)
+            mesh.__dict__[self.slot] = values
+        return values
+
+    def __set__(self, mesh, values):
+        mesh.__dict__[self.slot] = values
+
+class _ArrayView(object):
+    """Descriptor exposing an ArrayMesh stream as a 2D array."""
+    def __init__(self, slot, width=None, dtype=None):
+        self.slot = slot
+        self.width = width
+        self.dtype = dtype
+
+    def __get__(self, mesh, owner):
+        if mesh is None:
+            return self
+        values = mesh.__dict__[self.slot]
+        if not isinstance(values, numpy.ndarray):
+            values = _list_to_array(values, self.dtype or mesh.stream_dtype(self.slot), self.width)
+            mesh.__dict__[self.slot] = values
+        return values
+
+    def __set__(self, mesh, values):
+        mesh.__dict__[self.slot] = values
+
+class _UVListView(object):
+    """Descriptor exposing the ArrayMesh uv sets as a list of lists of tuples."""
+    def __get__(self, mesh, owner):
+        if mesh is None:
+            return self
+        uvs = mesh.__dict__['_uvs']
+        for i, values in enumerate(uvs):
+            if isinstance(values, numpy.ndarray):
+                uvs[i] = _array_to_list(values)
+        return uvs
+
+    def __set__(self, mesh, uvs):
+        mesh.__dict__['_uvs'] = uvs
+
+class _UVArrayView(object):
+    """Descriptor exposing the ArrayMesh uv sets as a list of 2D arrays."""
+    def __get__(self, mesh, owner):
+        if mesh is None:
+            return self
+        uvs = mesh.__dict__['_uvs']
+        for i, values in enumerate(uvs):
+            if not isinstance(values, numpy.ndarray):
+                uvs[i] = _list_to_array(values, mesh.dtype, 2)
+        return uvs
+
+    def __set__(self, mesh, uvs):
+        mesh.__dict__['_uvs'] = uvs
+
+# pylint: disable=R0902
+# pylint: disable=R0904
+class ArrayMesh(Mesh):
+    """Mesh storing the vertex streams as contiguous NumPy arrays.
+
+    The stream attributes of Mesh (``positions``, ``uvs``, ``primitives``...) remain available as lists of tuples,
+    while the ``*_array`` attributes expose the same streams as N x width arrays. Each stream is converted on access
+    to the representation requested, so the methods without a vectorized implementation keep working unchanged."""
+
+    STREAM_SLOTS = [ '_positions', '_normals', '_tangents', '_binormals', '_colors',
+                     '_skin_indices', '_skin_weights', '_primitives' ]
+
+    positions = _ListView('_positions')
+    normals = _ListView('_normals')
+    tangents = _ListView('_tangents')
+    binormals = _ListView('_binormals')
+    colors = _ListView('_colors')
+    skin_indices = _ListView('_skin_indices')
+    skin_weights = _ListView('_skin_weights')
+    primitives = _ListView('_primitives')
+    uvs = _UVListView()
+
+    position_array = _ArrayView('_positions', 3)
+    normal_array = _ArrayView('_normals', 3)
+    tangent_array = _ArrayView('_tangents', 3)
+    binormal_array = _ArrayView('_binormals', 3)
+    color_array = _ArrayView('_colors')
+    skin_index_array = _ArrayView('_skin_indices')
+    skin_weight_array = _ArrayView('_skin_weights')
+    primitive_array = _ArrayView('_primitives', 3, 'intp')
+    uv_arrays = _UVArrayView()
+
+    def __init__(self, mesh=None, dtype='float64'):
+        if numpy is None:
+            raise ImportError('ArrayMesh requires numpy')
+        self.dtype = numpy.dtype(dtype)
+        if isinstance(mesh, ArrayMesh):
+            Mesh.__init__(self)
+            for slot in self.STREAM_SLOTS:
+                values = mesh.__dict__[slot]
+                self.__dict__[slot] = values.copy() if isinstance(values, numpy.ndarray) else values[:]
+            self.uv_arrays = [ uvs.copy() for uvs in mesh.uv_arrays ]
+            self.bbox = mesh.bbox.copy()
+        else:
+            Mesh.__init__(self, mesh)
+
+    SEMANTIC_ARRAYS = { 'POSITION': 'position_array',
+                        'NORMAL': 'normal_array',
+                        'NORMAL0': 'normal_array',
+                        'TANGENT': 'tangent_array',
+                        'BINORMAL': 'binormal_array',
+                        'COLOR': 'color_array',
+                        'COLOR0': 'color_array',
+                        'BLENDINDICES': 'skin_index_array',
+                        'BLENDWEIGHT': 'skin_weight_array' }
+
+    def get_array(self, semantic):
+        """Retrieve the mesh values for a specified semantic as an array."""
+        if semantic.startswith('TEXCOORD'):
+            if semantic == 'TEXCOORD' or semantic == 'TEXCOORD0':
+                index = 0
+            else:
+                index = int(semantic[8:])
+            uv_arrays = self.uv_arrays
+            if index >= len(uv_arrays):
+                return numpy.zeros((0, 2), dtype=self.dtype)
+            return uv_arrays[index]
+        attribute = self.SEMANTIC_ARRAYS.get(semantic)
+        if attribute is None:
+            LOG.warning('Unknown semantic:%s', semantic)
+            return None
+        return getattr(self, attribute)
+
+    def stream_dtype(self, slot):
+        """The array type used for a stream converted from a list."""
+        if slot in ('_positions', '_normals', '_tangents', '_binormals'):
+            return self.dtype
+        # Let NumPy choose so integer streams are not turned into floats.
+        return None
+
+    ###################################################################################################################
+
+    def transform(self, transform):
+        """Transform the vertexes."""
+        self.position_array = vmath.m43transformp_batch(transform, self.position_array)
+        self.normal_array = vmath.m43transformn_batch(transform, self.normal_array)
+        self.tangent_array = vmath.m43transformn_batch(transform, self.tangent_array)
+        self.binormal_array = vmath.m43transformn_batch(transform, self.binormal_array)
+
+    def rotate(self, transform):
+        """Rotate the vertexes."""
+        self.position_array = vmath.v3mulm33_batch(self.position_array, transform)
+        self.normal_array = vmath.v3mulm33_batch(self.normal_array, transform)
+        self.tangent_array = vmath.v3mulm33_batch(self.tangent_array, transform)
+        self.binormal_array = vmath.v3mulm33_batch(self.binormal_array, transform)
+
+    def invert_v_texture_map(self, uvs=None):
+        """Invert the v texture mapping."""
+        uv_arrays = self.uv_arrays
+        if uvs is None or len(uvs) == 0:
+            uvs = uv_arrays[0]
+        uvs = numpy.asarray(uvs)
+        if len(uvs) > 0 and uvs.shape[1] in (2, 3):
+            v = uvs[:, 1]
+            midV = 2 * ((math.ceil(v.max()) + math.floor(v.min())) * 0.5)
+            elements = uvs.copy()
+            elements[:, 1] = midV - v
+            uv_arrays[0] = elements
+
+    def generate_primitives(self, indexes):
+        """Generate a list of primitives from a list of indexes."""
+        indexes = numpy.array(indexes, dtype='intp')
+        count = len(indexes) // 3
+        self.primitive_array = indexes[:count * 3].reshape(count, 3)
+
+    def generate_bbox(self):
+        """Generate a bounding box for the mesh."""
+        positions = self.position_array
+        if len(positions) > 0:
+            self.bbox['min'] = tuple(positions.min(axis=0).tolist())
+            self.bbox['max'] = tuple(positions.max(axis=0).tolist())
+        else:
+            self.bbox['min'] = (float('inf'), float('inf'), float('inf'))
+            self.bbox['max'] = (float('-inf'), float('-inf'), float('-inf'))
+
+    def remove_degenerate_primitives(self, remove_zero_length_edges=True,
+                                     edge_length_tol=DEFAULT_POSITION_TOLERANCE):
+        """Remove degenerate triangles with duplicated indices and optionally
+           zero length edges."""
+        primitives = self.primitive_array
+        (i1, i2, i3) = (primitives[:, 0], primitives[:, 1], primitives[:, 2])
+        degenerate = (i1 == i2) | (i1 == i3) | (i2 == i3)
+        if remove_zero_length_edges and len(primitives) > 0:
+            positions = self.position_array
+            (v1, v2, v3) = (positions[i1], positions[i2], positions[i3])
+            tol_sq = edge_length_tol * edge_length_tol
+            degenerate |= ((vmath.v3lengthsq_batch(v2 - v1) < tol_sq) |
+                           (vmath.v3lengthsq_batch(v3 - v1) < tol_sq) |
+                           (vmath.v3lengthsq_batch(v3 - v2) < tol_sq))
+        self.primitive_array = primitives[~degenerate]
+
+    ###################################################################################################################
+
+    def generate_normals(self, pos_tol=DEFAULT_POSITION_TOLERANCE,
+                         dont_norm_tol=DEFAULT_DONT_NORMALIZE_TOLERANCE):
+        """Generate a normal per vertex as an average of face normals the primitive is part of."""
+        positions = self.position_array
+        primitives = self.primitive_array
+        num_vertices = len(positions)
+        normals = numpy.zeros((num_vertices, 3), dtype=positions.dtype)
+        if len(primitives) > 0:
+            (i1, i2, i3) = (primitives[:, 0], primitives[:, 1], primitives[:, 2])
+            e1 = positions[i2] - positions[i1]
+            e2 = positions[i3] - positions[i1]
+            e_other = positions[i3] - positions[i2]
+            tol_sq = pos_tol * pos_tol
+            degenerate = ((vmath.v3lengthsq_batch(e1) < tol_sq) |
+                          (vmath.v3lengthsq_batch(e2) < tol_sq) |
+                          (vmath.v3lengthsq_batch(e_other) < tol_sq))
+            for p in numpy.flatnonzero(degenerate):
+                LOG.warning("%s: Found degenerate primitive:%s with edge length < position tolerance[%g]:[%s,%s,%s]",
+                            "generate_normals", tuple(primitives[p].tolist()), pos_tol,
+                            tuple(e1[p].tolist()), tuple(e2[p].tolist()), tuple(e_other[p].tolist()))
+            face_normals = vmath.v3normalize_batch(vmath.v3cross_batch(e1, e2))
+            face_normals[degenerate] = 0.0
+            # Accumulate the face normals in primitive order, bincount sums in the order the indexes are given.
+            indexes = primitives.reshape(-1)
+            face_normals = numpy.repeat(face_normals, 3, axis=0)
+            for axis in xrange(3):
+                normals[:, axis] = numpy.bincount(indexes, face_normals[:, axis], num_vertices)
+        lsq = vmath.v3lengthsq_batch(normals)
+        valid = lsq > dont_norm_tol # Ensure normal isn't tiny before normalizing it.
+        for i in numpy.flatnonzero(~valid):
+            LOG.warning("%s: Found vertex[%i] with normal < normalizable tolerance[%g]:%s",
+                        "generate_normals", i, dont_norm_tol, tuple(normals[i].tolist()))
+        normals[valid] *= (1.0 / numpy.sqrt(lsq[valid]))[:, numpy.newaxis]
+        normals[~valid] = 0.0
+        self.normal_array = normals
+
+    def normalize_tangents(self, dont_norm_tol=DEFAULT_DONT_NORMALIZE_TOLERANCE):
+        """Normalize and clamp the new tangents and binormals."""
+        def _normalize_and_clamp(values, name):
+            """Normalize the vectors long enough, clamped to the unit cube, and zero the others."""
+            lsq = vmath.v3lengthsq_batch(values)
+            valid = lsq > dont_norm_tol
+            for i in numpy.flatnonzero(~valid):
+                LOG.warning("%s: Found vertex[%i] with %s < normalizable tolerance[%g]:%s",
+                            "normalize_tangents", i, name, dont_norm_tol, tuple(values[i].tolist()))
+            result = numpy.zeros_like(values)
+            result[valid] = vmath.v3unitcube_clamp_batch(vmath.v3normalize_batch(values[valid]))
+            return result
+
+        self.tangent_array = _normalize_and_clamp(self.tangent_array, 'tangent')
+        self.binormal_array = _normalize_and_clamp(self.binormal_array, 'binormal')
+
+    def generate_normals_from_tangents(self, zero_tol=DEFAULT_ZERO_TOLERANCE,
+                                       dont_norm_tol=DEFAULT_DONT_NORMALIZE_TOLERANCE):
+        """Create a new normal from the tangent and binormals."""
+        tangents = self.tangent_array
+        binormals = self.binormal_array
+        if not len(tangents) or not len(binormals): # We can't generate normals without nbts
+            LOG.debug("Can't generate normals from nbts without tangets:%i and binormals:%i",
+                      len(tangents), len(binormals))
+            return
+        normals = self.normal_array
+        num_vertices = len(normals)
+        assert num_vertices == len(tangents)
+        assert num_vertices == len(binormals)
+        cp = vmath.v3cross_batch(tangents, binormals)
+        # Keep vertex normal if the tangent and the binormal are paralel
+        valid = vmath.v3lengthsq_batch(cp) > dont_norm_tol
+        cp = vmath.v3normalize_batch(cp)
+        # Keep vertex normal if new normal is *somehow* in the primitive plane
+        cosangle = vmath.v3dot_batch(cp, normals)
+        valid &= numpy.abs(cosangle) >= zero_tol
+        normals = normals.copy()
+        normals[valid] = numpy.where((cosangle[valid] < 0)[:, numpy.newaxis], -cp[valid], cp[valid])
+        self.normal_array = normals
+
+    def flip_primitives(self):
+        """Change winding order"""
+        self.primitive_array = self.primitive_array[:, [0, 2, 1]]
+
+    def mirror_in(self, axis="x", flip=True):
+        """Flip geometry in axis."""
+        column = { 'x': 0, 'y': 1, 'z': 2 }.get(axis)
+        if column is not None:
+            positions = self.position_array.copy()
+            positions[:, column] = -positions[:, column]
+            self.position_array = positions
+            normals = self.normal_array.copy()
+            normals[:, column] = -normals[:, column]
+            self.normal_array = normals
+        if flip:
+            self.flip_primitives()
+
+    ###################################################################################################################
+
+    def remove_redundant_vertexes(self):
+        """Remove redundant vertex indexes from the element streams if unused by the primitives."""
+        primitives = self.primitive_array
+        # Number the vertexes in the order they are first used by the primitives.
+        (used, first_use) = numpy.unique(primitives.reshape(-1), return_index=True)
+        used = used[numpy.argsort(first_use, kind='mergesort')]
+        new_index = len(used)
+        mapping = numpy.zeros(used.max() + 1 if new_index else 0, dtype='intp')
+        mapping[used] = numpy.arange(new_index)
+        old_index = len(self.position_array)
+        if old_index != new_index:
+            LOG.info("Remapping:remapping vertexes from %i to %i", old_index, new_index)
+
+        for slot in self.STREAM_SLOTS[:-1]:
+            values = self.__dict__[slot]
+            if len(values) > 0:
+                if not isinstance(values, numpy.ndarray):
+                    values = _list_to_array(values, self.stream_dtype(slot), None)
+                self.__dict__[slot] = values[used]
+        uv_arrays = self.uv_arrays
+        for i, uvs in enumerate(uv_arrays):
+            if len(uvs) > 0:
+                uv_arrays[i] = uvs[used]
+
+        self.primitive_array = mapping[primitives]
+
+    def weld_vertexes(self, semantics, tolerance=0.0):
+        """Merge the vertexes with the same values in all the streams of the semantics and remap the primitives, giving
+           a single index per vertex. With a tolerance each vertex is merged with the first kept vertex whose values are
+           all within tolerance of its own, looked up in a spatial hash of the positions. The first vertex of each
+           group is kept."""
+        streams = [ self.get_array(semantic) for semantic in semantics ]
+        num_vertexes = len(streams[0]) if streams else 0
+        if num_vertexes == 0:
+            return
+        if tolerance > 0.0:
+            streams_order = _weld_streams_order(semantics)
+            columns = [ numpy.asarray(streams[stream_index], dtype='float64').reshape(num_vertexes, -1)
+                        for stream_index in streams_order ]
+            hashed_components = min(3, columns[0].shape[1])
+            vertexes = [ tuple(vertex) for vertex in numpy.hstack(columns).tolist() ]
+            (mapping, used) = pointmap.build_weld_mapping(vertexes, tolerance, hashed_components)
+            mapping = numpy.array(mapping, dtype='intp')
+            used = numpy.array(used, dtype='intp')
+        else:
+            # Adding 0.0 turns -0.0 into 0.0 so they compare equal as they do in tuples.
+            keys = numpy.hstack([ numpy.asarray(values, dtype='float64').reshape(num_vertexes, -1)
+                                  for values in streams ]) + 0.0
+            (_, first_use, inverse) = numpy.unique(keys, return_index=True, return_inverse=True, axis=0)
+            # Number the welded vertexes in the order they are first used.
+            order = numpy.argsort(first_use, kind='mergesort')
+            rank = numpy.empty(len(order), dtype='intp')
+            rank[order] = numpy.arange(len(order))
+            used = first_use[order]
+            mapping = rank[inverse.reshape(-1)]
+
+        for semantic, values in zip(semantics, streams):
+            self.set_values(values[used], semantic)
+        self.primitive_array = mapping[self.primitive_array]
+        LOG.info("Welded %i vertexes to %i", num_vertexes, len(used))
+
+    ###################################################################################################################
+
+    def stitch_vertices(self):
+        """Combine equal vertices together, adjusting indices of primitives where appropriate
+           Any other vertex data like normals, tangents, colors are ignored"""
+        positions = self.position_array
+        if len(positions) == 0:
+            return
+        # Sort the positions lexicographically as the tuples are sorted by Mesh.stitch_vertices.
+        order = numpy.lexsort((positions[:, 2], positions[:, 1], positions[:, 0]))
+        sorted_positions = positions[order]
+        new_vertex = numpy.ones(len(order), dtype=bool)
+        new_vertex[1:] = numpy.any(sorted_positions[1:] != sorted_positions[:-1], axis=1)
+        mapping = numpy.empty(len(order), dtype='intp')
+        mapping[order] = numpy.cumsum(new_vertex) - 1
+
+        self.primitive_array = mapping[self.primitive_array]
+        new_positions = numpy.empty((mapping.max() + 1, 3), dtype=positions.dtype)
+        new_positions[mapping] = positions
+        self.position_array = new_positions
+
+# pylint: enable=R0902
+# pylint: enable=R0904
+
+#######################################################################################################################
+
 # pylint: disable=C0111
 def __generate_test_square(json_asset):
 
@@ -6,23 +6,133 @@ Convert LightWave (.obj) OBJ2 files into a Turbulenz JSON asset.
 Supports generating NBTs.
 """
 
+import re
+import mmap
 import logging
 LOG = logging.getLogger('asset')
 
+from array import array
+from itertools import chain, imap, islice, repeat
+from operator import add, lshift, rshift, sub
+from multiprocessing import Pool
+
 # pylint: disable=W0403
-from stdtool import standard_main, standard_json_out, standard_include
+from stdtool import standard_parser, standard_main, standard_json_out, standard_include, standard_workers
 from asset2json import JsonAsset
-from mesh import Mesh
+from mesh import Mesh, numpy
+from simplify import lod_targets, DEFAULT_LOD_RATIO, DEFAULT_MAX_ERROR
 from node import NodeName
-from os.path import basename
+from os.path import basename, getsize
 # pylint: enable=W0403
 
-__version__ = '1.2.2'
-__dependencies__ = ['asset2json', 'mesh', 'node', 'vmath']
+__version__ = '1.7.2'
+__dependencies__ = ['asset2json', 'mesh', 'node', 'vmath', 'vertexcache', 'simplify']
 
 
 DEFAULT_EFFECT_NAME = 'lambert'
 
+# Size of the chunks of whole lines read from the file.
+CHUNK_SIZE = 1 << 22
+# Largest chunk of the file parsed by each job of the parallel parser.
+MAX_PARALLEL_CHUNK_SIZE = 1 << 26
+
+# Bases of the positions, uvs and normals the workers of the parallel parser resolve relative indices against, far above
+# any absolute index so they can be told apart and rebased once the number of vertexes before each chunk is known.
+RELATIVE_INDEX_SHIFT = 40
+RELATIVE_INDEX_BASES = (1 << RELATIVE_INDEX_SHIFT, 2 << RELATIVE_INDEX_SHIFT, 3 << RELATIVE_INDEX_SHIFT)
+RELATIVE_INDEX_THRESHOLD = 1 << (RELATIVE_INDEX_SHIFT - 1)
+
+# Runs of consecutive vertex or face lines, parsed together.
+LINE_RUN_RE = re.compile(r'(v|vt|vn|f) [^\n]*\n(?:\1 [^\n]*\n)*')
+
+# Lines of exactly 2 or 3 values separated by single spaces, other lines in a block fall back to the line parser.
+VALUES_2_RE = re.compile(r'^\S+ \S+ ?\r?$', re.M)
+VALUES_3_RE = re.compile(r'^\S+ \S+ \S+ ?\r?$', re.M)
+
+def _parse_floats(text, count):
+    """Parse the whitespace separated floats of the text, NumPy is used when available.
+    Returns None if there aren't count of them."""
+    if numpy is not None:
+        values = numpy.fromstring(text, dtype=numpy.float64, sep=' ')
+        if len(values) == count:
+            return values.tolist()
+    values = map(float, text.split())
+    if len(values) == count:
+        return values
+    return None
+
+def _parse_indices(text, count):
+    """Parse the whitespace separated 1 based indices of the text, NumPy is used when available.
+    Returns them counting from 0, or None if there aren't count of them."""
+    if numpy is not None:
+        values = numpy.fromstring(text, dtype=numpy.int64, sep=' ')
+        if len(values) == count:
+            return (values - 1).tolist()
+    values = map(int, text.split())
+    if len(values) == count:
+        return map((-1).__add__, values)
+    return None
+
+def _pack_tuples(values, typecode):
+    """Flatten a list of tuples of the same size into an array string, cheaper to send between processes.
+    Returns (size, string), or (0, values) if the sizes differ."""
+    if values and len(set(map(len, values))) == 1:
+        return (len(values[0]), array(typecode, chain.from_iterable(values)).tostring())
+    return (0, values)
+
+def _unpack_tuples(packed, typecode):
+    """Rebuild the list of tuples packed by _pack_tuples."""
+    (size, data) = packed
+    if size == 0:
+        return data
+    values = array(typecode)
+    values.fromstring(data)
+    values = iter(values)
+    return zip(*([ values ] * size))
+
+def _split_relative_indices(indices):
+    """Remove the RELATIVE_INDEX_BASES from the indices of a face record parsed by a worker.
+    Returns the packed indices and a mask of the kind of base, 1 to 3, removed from each flat index or 0 for the
+    absolute ones, or None if there are no relative indices."""
+    flat = list(chain.from_iterable(indices))
+    if not flat or max(flat) < RELATIVE_INDEX_THRESHOLD:
+        return (_pack_tuples(indices, 'l'), None)
+    tags = array('b', imap(rshift, imap(add, flat, repeat(RELATIVE_INDEX_THRESHOLD)), repeat(RELATIVE_INDEX_SHIFT)))
+    values = imap(sub, flat, imap(lshift, tags, repeat(RELATIVE_INDEX_SHIFT)))
+    if len(set(map(len, indices))) == 1:
+        return ((len(indices[0]), array('l', values).tostring()), tags.tostring())
+    return ((0, [ tuple(islice(values, len(vertex))) for vertex in indices ]), tags.tostring())
+
+def _rebase_relative_indices(packed, relative, vertex_bases):
+    """Add the number of positions, uvs or normals before the chunk to the relative indices of a face record
+    returned by _split_relative_indices. Returns the list of indices."""
+    if relative is None:
+        return _unpack_tuples(packed, 'l')
+    (size, data) = packed
+    tags = array('b')
+    tags.fromstring(relative)
+    bases = (0, ) + tuple(vertex_bases)
+    if size == 0:
+        values = imap(add, chain.from_iterable(data), imap(bases.__getitem__, tags))
+        return [ tuple(islice(values, len(vertex))) for vertex in data ]
+    flat = array('l')
+    flat.fromstring(data)
+    values = imap(add, flat, imap(bases.__getitem__, tags))
+    return zip(*([ values ] * size))
+
+def _parse_obj_chunk(job):
+    """Parse the lines of a chunk of an OBJ file in a worker process, see Obj2json.parse_records."""
+    (filename, start, end, vertex_bases) = job
+    with open(filename, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            text = mapped[start:end]
+        finally:
+            mapped.close()
+    if not text.endswith('\n'):
+        text += '\n'
+    return Obj2json(None).parse_records(text, vertex_bases)
+
 # Note:
 # * Does not have support for .mtl files yet, but expects any relevant materials
 #   to be declared in a .material file and included as a dependancy in deps.yaml
@@ -80,6 +190,8 @@ class Surface(object):
         self.first = first
         self.count = 0
         self.material_name = material
+        # Surfaces of the primitives of each level of detail
+        self.lods = [ ]
     def is_empty(self):
         return self.count == 0
 
@@ -127,6 +239,11 @@ class Obj2json(Mesh):
         self.curr_surf = Surface(0, self.default_material_name)
         # Dictionary of names -> shapes. Initialise to a default shape with a default surface
         self.shapes = { self.default_shape_name : Shape({ self.default_surface_name : self.curr_surf }) }
+        # Number of positions, uvs and normals in the file before the lines being parsed, for the relative indices
+        self.vertex_bases = (0, 0, 0)
+        self.has_relative_indices = False
+        # The faces and other lines of a chunk of the file recorded by parse_records
+        self.records = None
         Mesh.__init__(self)
 
     def __read_object_name(self, data):
@@ -201,14 +318,22 @@ class Obj2json(Mesh):
             # Subtract 1 to count indices from 0, not from 1.
             s = si.split('/')
             if len(s) == 1:
-                return [int(s[0]) - 1]
-            if len(s) == 2:
-                return (int(s[0]) - 1, int(s[1]) - 1)
+                values = [int(s[0]) - 1]
+                kinds = (0,)
+            elif len(s) == 2:
+                values = [int(s[0]) - 1, int(s[1]) - 1]
+                kinds = (0, 1)
+            elif len(s[1]) == 0:
+                values = [int(s[0]) - 1, int(s[2]) - 1]
+                kinds = (0, 2)
             else:
-                if len(s[1]) == 0:
-                    return (int(s[0]) - 1, int(s[2]) - 1)
-                else:
-                    return (int(s[0]) - 1, int(s[1]) - 1, int(s[2]) - 1)
+                values = [int(s[0]) - 1, int(s[1]) - 1, int(s[2]) - 1]
+                kinds = (0, 1, 2)
+            if min(values) < 0:
+                self.__resolve_relative_indices(values, kinds)
+            if len(values) == 1:
+                return values
+            return tuple(values)
 
         # Split string into list of vertices
         si = data.split()
@@ -230,34 +355,284 @@ class Obj2json(Mesh):
     def __ignore_comments(self, data):
         """Ignore comments."""
 
+    def __resolve_relative_indices(self, values, kinds):
+        """Replace the negative indices, counting back from the last position, uv or normal parsed, by the absolute
+            ones. values is a flat list of indices of the position, uv or normal kinds (0, 1 or 2) in turn."""
+        counts = (self.vertex_bases[0] + len(self.positions),
+                  self.vertex_bases[1] + len(self.uvs[0]),
+                  self.vertex_bases[2] + len(self.normals))
+        counts = [ counts[kind] for kind in kinds ]
+        num_kinds = len(kinds)
+        for n, value in enumerate(values):
+            if value < 0:
+                values[n] = counts[n % num_kinds] + value + 1
+        self.has_relative_indices = True
+
+    def __read_vertex_block(self, command, block):
+        """Parse a block of 'v', 'vt' or 'vn' line data at once. Blocks with lines of other sizes than the usual 3
+            values, or 2 for 'vt', are parsed a line at a time."""
+        text = '\n'.join(block)
+        num_lines = len(block)
+        values = None
+        num_components = 0
+        if command == 'vt' and len(VALUES_2_RE.findall(text)) == num_lines:
+            num_components = 2
+        elif len(VALUES_3_RE.findall(text)) == num_lines:
+            num_components = 3
+        if num_components:
+            values = _parse_floats(text, num_components * num_lines)
+
+        if values is not None and num_components == 2:
+            floats = iter(values)
+            self.uvs[0].extend(zip(floats, floats))
+        elif values is not None:
+            floats = iter(values)
+            if command == 'v':
+                self.positions.extend(zip(floats, floats, floats))
+            elif command == 'vt':
+                self.uvs[0].extend(zip(floats, floats, floats))
+            else:
+                self.normals.extend([ (x, y, -z) for (x, y, z) in zip(floats, floats, floats) ])
+        else:
+            read_line = { 'v': self.__read_vertex_position,
+                          'vt': self.__read_vertex_uvs,
+                          'vn': self.__read_vertex_normal }[command]
+            for data in block:
+                data = data.lstrip(' ')
+                if len(data) > 0:
+                    read_line(data)
+
+    def __read_face_block(self, block):
+        """Parse a block of 'f' line data at once. All the vertexes of the block must use the same one of the 'v',
+            'v/vt', 'v//vn' or 'v/vt/vn' formats, otherwise the block is parsed a line at a time."""
+        text = ' '.join(block)
+        sizes = map(len, map(str.split, block))
+        num_vertexes = sum(sizes)
+        num_slashes = text.count('/')
+        num_double_slashes = text.count('//')
+        kinds = ()
+        if num_slashes == 0:
+            kinds = (0,)
+        elif num_slashes == num_vertexes and num_double_slashes == 0:
+            kinds = (0, 1)
+        elif num_slashes == 2 * num_vertexes and num_double_slashes == num_vertexes:
+            kinds = (0, 2)
+            text = text.replace('//', ' ')
+        elif num_slashes == 2 * num_vertexes and num_double_slashes == 0:
+            kinds = (0, 1, 2)
+        num_components = len(kinds)
+
+        values = None
+        if num_components and min(sizes) >= 3:
+            values = _parse_indices(text.replace('/', ' '), num_components * num_vertexes)
+        if values is None:
+            for data in block:
+                data = data.lstrip(' ')
+                if len(data) > 0:
+                    self.__read_face(data)
+            return
+
+        if min(values) < 0:
+            self.__resolve_relative_indices(values, kinds)
+        values = iter(values)
+        vertexes = zip(*([ values ] * num_components))
+        indices = self.indices
+        max_size = max(sizes)
+        if max_size == 3:
+            indices.extend(vertexes)
+        elif max_size == 4 and min(sizes) == 4:
+            # Split each quad into the tri-fan (0, 1, 2), (0, 2, 3)
+            v0 = vertexes[0::4]
+            v2 = vertexes[2::4]
+            for triangles in zip(v0, vertexes[1::4], v2, v0, v2, vertexes[3::4]):
+                indices.extend(triangles)
+        else:
+            n = 0
+            for size in sizes:
+                # Construct a tri-fan of all the vertices supplied
+                i0 = vertexes[n]
+                for i in xrange(n + 2, n + size):
+                    indices.append(i0)
+                    indices.append(vertexes[i - 1])
+                    indices.append(vertexes[i])
+                n += size
+        num_triangles = num_vertexes - 2 * len(sizes)
+        self.next_polygon_index += num_triangles
+        self.curr_surf.count += num_triangles
+
 #######################################################################################################################
 
+    def __parse_line(self, line, line_number, prefix, chunks_with_data):
+        """Parse a single line."""
+        # The middle of the tuple is just whitespace
+        (command, _, data) = line.partition(' ')
+        if len(data) > 0:
+            if data[-1] == '\n':
+                data = data[:-1]
+            data = data.lstrip(' ')
+            if len(data) > 0:
+                # After stripping away excess whitespace
+                if command in chunks_with_data:
+                    LOG.debug("(%d) %s%s", line_number, prefix, command)
+                    # Parse data depending on its type
+                    chunks_with_data[command](self, data)
+                else:
+                    LOG.warning("(%d) %s%s *unsupported*", line_number, prefix, command)
+
+    def __record_faces(self, read_faces, *args):
+        """Read faces, recording the range of indices and the number of triangles added when recording."""
+        if self.records is None:
+            read_faces(*args)
+        else:
+            first = len(self.indices)
+            num_triangles = self.next_polygon_index
+            read_faces(*args)
+            self.records.append((first, len(self.indices), self.next_polygon_index - num_triangles))
+
+    def __parse_chunk(self, text, line_number, prefix, chunks_with_data):
+        """Parse a chunk of whole lines, the runs of vertex or face lines are parsed together.
+            Returns the line number following the chunk."""
+        pos = 0
+        size = len(text)
+        match = LINE_RUN_RE.match
+        while pos < size:
+            run = match(text, pos)
+            if run is not None:
+                command = run.group(1)
+                # Strip the commands and the last newline to leave the data of each line
+                block = text[pos + len(command) + 1:run.end() - 1].split('\n' + command + ' ')
+                if command == 'f':
+                    self.__record_faces(self.__read_face_block, block)
+                else:
+                    self.__read_vertex_block(command, block)
+                line_number += len(block)
+                pos = run.end()
+            else:
+                end = text.index('\n', pos) + 1
+                line = text[pos:end]
+                if self.records is None:
+                    self.__parse_line(line, line_number, prefix, chunks_with_data)
+                else:
+                    command = line.split(None, 1)[:1]
+                    if command == ['f']:
+                        self.__record_faces(self.__parse_line, line, line_number, prefix, chunks_with_data)
+                    elif command in (['v'], ['vt'], ['vn']):
+                        self.__parse_line(line, line_number, prefix, chunks_with_data)
+                    else:
+                        self.records.append((line_number, line))
+                line_number += 1
+                pos = end
+        return line_number
+
+    @staticmethod
+    def __line_parsers():
+        """The parser of each type of line."""
+        return { 'v': Obj2json.__read_vertex_position,
+                 'vt': Obj2json.__read_vertex_uvs,
+                 'vn': Obj2json.__read_vertex_normal,
+                 'f': Obj2json.__read_face,
+                 'o': Obj2json.__read_object_name,
+                 'g': Obj2json.__read_group_name,
+                 'usemtl': Obj2json.__read_material,
+                 '#': Obj2json.__ignore_comments}
+
     def parse(self, f, prefix = ""):
         """Parse an OBJ file stream."""
-        chunks_with_data = { 'v': Obj2json.__read_vertex_position,
-                             'vt': Obj2json.__read_vertex_uvs,
-                             'vn': Obj2json.__read_vertex_normal,
-                             'f': Obj2json.__read_face,
-                             'o': Obj2json.__read_object_name,
-                             'g': Obj2json.__read_group_name,
-                             'usemtl': Obj2json.__read_material,
-                             '#': Obj2json.__ignore_comments}
-        for lineNumber, line in enumerate(f):
-            # The middle of the tuple is just whitespace
-            (command, _, data) = line.partition(' ')
-            if len(data) > 0:
-                data = data[:-1]
-                while len(data) > 0 and data[0] == ' ':
-                    data = data[1:]
-                if len(data) > 0:
-                    # After stripping away excess whitespace
-                    address_string = "(%d) %s%s" % (lineNumber, prefix, command)
-                    if command in chunks_with_data:
-                        LOG.debug(address_string)
-                        # Parse data depending on its type
-                        chunks_with_data[command](self, data)
+        chunks_with_data = self.__line_parsers()
+        if LOG.isEnabledFor(logging.DEBUG):
+            # Log every line
+            for line_number, line in enumerate(f):
+                self.__parse_line(line, line_number, prefix, chunks_with_data)
+            return
+
+        # Read large chunks of whole lines, the runs of vertex or face lines within them are parsed in bulk.
+        line_number = 0
+        remainder = ''
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            chunk = remainder + chunk
+            end = chunk.rfind('\n') + 1
+            remainder = chunk[end:]
+            line_number = self.__parse_chunk(chunk[:end], line_number, prefix, chunks_with_data)
+        if remainder:
+            self.__parse_chunk(remainder + '\n', line_number, prefix, chunks_with_data)
+
+    def parse_records(self, text, vertex_bases):
+        """Parse a chunk of whole lines of a file, taken from after vertex_bases positions, uvs and normals, leaving
+            the lines other than vertexes and faces to be parsed in order with the rest of the file.
+            Returns the positions, uvs, normals, the faces and other lines as records and the number of lines.
+            With RELATIVE_INDEX_BASES the faces records also hold the positions of their relative indices, see
+            _split_relative_indices."""
+        self.vertex_bases = vertex_bases
+        self.records = [ ]
+        num_lines = self.__parse_chunk(text, 0, '', self.__line_parsers())
+        records = [ ]
+        for record in self.records:
+            if isinstance(record[1], basestring):
+                records.append(record)
+            else:
+                (first, last, num_triangles) = record
+                if vertex_bases == RELATIVE_INDEX_BASES and self.has_relative_indices:
+                    (packed, relative) = _split_relative_indices(self.indices[first:last])
+                else:
+                    (packed, relative) = (_pack_tuples(self.indices[first:last], 'l'), None)
+                records.append((packed, num_triangles, relative))
+        return { 'positions': _pack_tuples(self.positions, 'd'),
+                 'uvs': _pack_tuples(self.uvs[0], 'd'),
+                 'normals': _pack_tuples(self.normals, 'd'),
+                 'records': records,
+                 'lines': num_lines }
+
+    def parse_parallel(self, filename, workers, prefix = ""):
+        """Parse an OBJ file with a pool of worker processes. The memory mapped file is split into chunks of whole
+            lines and the vertexes and faces of each chunk are parsed by the workers, the results are then stitched
+            together in order with the other lines parsed here, keeping the shapes and surfaces the same.
+            The workers return which indices are relative, the number of vertexes before their chunk is added to them
+            here."""
+        size = getsize(filename)
+        if size == 0:
+            return
+        num_chunks = max(workers * 4, (size + MAX_PARALLEL_CHUNK_SIZE - 1) // MAX_PARALLEL_CHUNK_SIZE)
+        chunk_size = max(1, size // num_chunks)
+        bounds = [ 0 ]
+        with open(filename, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                while bounds[-1] + chunk_size < size:
+                    end = mapped.find('\n', bounds[-1] + chunk_size)
+                    if end < 0 or end + 1 >= size:
+                        break
+                    bounds.append(end + 1)
+            finally:
+                mapped.close()
+        bounds.append(size)
+        jobs = [ (filename, chunk_start, chunk_end, RELATIVE_INDEX_BASES)
+                 for (chunk_start, chunk_end) in zip(bounds[:-1], bounds[1:]) ]
+        LOG.info('Parsing %i chunks with %i workers', len(jobs), workers)
+
+        chunks_with_data = self.__line_parsers()
+        line_number = 0
+        pool = Pool(min(workers, len(jobs)))
+        try:
+            for result in pool.imap(_parse_obj_chunk, jobs):
+                vertex_bases = (len(self.positions), len(self.uvs[0]), len(self.normals))
+                self.positions.extend(_unpack_tuples(result['positions'], 'd'))
+                self.uvs[0].extend(_unpack_tuples(result['uvs'], 'd'))
+                self.normals.extend(_unpack_tuples(result['normals'], 'd'))
+                for record in result['records']:
+                    if isinstance(record[1], basestring):
+                        self.__parse_line(record[1], line_number + record[0], prefix, chunks_with_data)
                     else:
-                        LOG.warning(address_string + " *unsupported*")
+                        (packed, num_triangles, relative) = record
+                        self.indices.extend(_rebase_relative_indices(packed, relative, vertex_bases))
+                        self.next_polygon_index += num_triangles
+                        self.curr_surf.count += num_triangles
+                line_number += result['lines']
+        finally:
+            pool.close()
+            pool.join()
 
     def unpack_vertices(self):
         """Unpack the vertices."""
@@ -380,7 +755,11 @@ def parse(input_filename="default.obj", output_filename="default.json", asset_ur
     definitions_asset = standard_include(infiles)
     with open(input_filename, 'r') as source:
         asset = Obj2json(basename(input_filename))
-        asset.parse(source)
+        workers = standard_workers(options.workers) if options is not None else 1
+        if workers > 1:
+            asset.parse_parallel(input_filename, workers)
+        else:
+            asset.parse(source)
         # Remove any and all unused (e.g. default) shapes and surfaces
         purge_empty(asset.shapes, recurseOnce = True)
         # Generate primitives
@@ -408,6 +787,36 @@ def parse(input_filename="default.obj", output_filename="default.json", asset_ur
         elif generate_normals:
             asset.generate_normals()
             asset.smooth_normals()
+        # Simplify each surface into levels of detail, each one from the previous, sharing the vertexes
+        if options is not None and options.lods > 0:
+            for shape_name in asset.shapes.iterkeys():
+                for surface_name, surface in asset.shapes[shape_name].surfaces.iteritems():
+                    previous = surface
+                    for level, target in enumerate(lod_targets(surface.count, options.lods, options.lod_ratio), 1):
+                        LOG.info('LOD:shape:%s:surface:%s:level:%i', shape_name, surface_name, level)
+                        (primitives, _) = asset.generate_lod(target, previous.first, previous.count,
+                                                             options.lod_error)
+                        if len(primitives) == previous.count:
+                            LOG.warning('LOD:shape:%s:surface:%s:nothing left to collapse within the error bound, '
+                                        'stopped at level %i',
+                                        shape_name, surface_name, level - 1)
+                            break
+                        lod = Surface(len(asset.primitives), surface.material_name)
+                        lod.count = len(primitives)
+                        asset.primitives.extend(primitives)
+                        surface.lods.append(lod)
+                        previous = lod
+        # Reorder the triangles of each surface for the vertex cache and overdraw, then the vertexes for fetching
+        if options is not None and (options.vertex_cache or options.overdraw is not None):
+            for shape_name in asset.shapes.iterkeys():
+                for surface_name, surface in asset.shapes[shape_name].surfaces.iteritems():
+                    LOG.info('Vertex cache:shape:%s:surface:%s', shape_name, surface_name)
+                    for part in [ surface ] + surface.lods:
+                        asset.optimize_vertex_cache(part.first, part.count)
+                        if options.overdraw is not None:
+                            asset.optimize_overdraw(part.first, part.count, options.overdraw)
+        if options is not None and options.vertex_fetch:
+            asset.optimize_vertex_fetch()
         json_asset = JsonAsset()
         for shape_name in asset.shapes.iterkeys():
             json_asset.attach_shape(shape_name)
@@ -449,11 +858,42 @@ def parse(input_filename="default.obj", output_filename="default.json", asset_ur
                                           shape_name, name=surface_name)
                 json_asset.attach_node_shape_instance(node_name, instance_name, shape_name,
                                                       material_name, surface=surface_name)
+                # The levels of detail are extra surfaces of the shape, without instances
+                for level, lod in enumerate(surface.lods, 1):
+                    json_asset.attach_surface(asset.primitives[lod.first:lod.first + lod.count],
+                                              JsonAsset.SurfaceTriangles, shape_name,
+                                              name='%s-lod%i' % (surface_name, level))
         json_asset.attach_bbox(asset.bbox)
         standard_json_out(json_asset, output_filename, options)
         return json_asset
 
+def obj2json_parser(description):
+    """Standard tool options plus the OBJ specific ones."""
+    parser = standard_parser(description)
+    parser.add_option("--vertex-cache", action="store_true", dest="vertex_cache", default=False,
+                      help="reorder the triangles of each surface for the post-transform vertex cache, reporting the "
+                      "ACMR and ATVR before and after")
+    parser.add_option("--overdraw", action="store", dest="overdraw", type="float", default=None, metavar="THRESHOLD",
+                      help="after the vertex cache optimization sort clusters of triangles to draw the outward facing "
+                      "ones first, letting the ACMR grow by up to THRESHOLD, for example 1.05")
+    parser.add_option("--vertex-fetch", action="store_true", dest="vertex_fetch", default=False,
+                      help="reorder the vertexes in the order the triangles first use them")
+    parser.add_option("--workers", action="store", dest="workers", type="int", default=1, metavar="COUNT",
+                      help="number of processes parsing chunks of the memory mapped file, defaults to 1")
+    parser.add_option("--lods", action="store", dest="lods", type="int", default=0, metavar="COUNT",
+                      help="add COUNT simplified levels of detail of each surface as extra surfaces of the shape "
+                      "named SURFACE-lodN, sharing its vertexes")
+    parser.add_option("--lod-ratio", action="store", dest="lod_ratio", type="float", default=DEFAULT_LOD_RATIO,
+                      metavar="RATIO", help="ratio of the triangles kept by each level of detail, defaults to %.2f"
+                      % DEFAULT_LOD_RATIO)
+    parser.add_option("--lod-error", action="store", dest="lod_error", type="float", default=DEFAULT_MAX_ERROR,
+                      metavar="ERROR", help="largest error of the levels of detail relative to the size of each "
+                      "surface, defaults to %.2f" % DEFAULT_MAX_ERROR)
+    return parser
+
+def main(description="Convert LightWave (.obj) OBJ2 files into a Turbulenz JSON asset. Supports generating NBTs."):
+    parser = obj2json_parser(description)
+    return standard_main(parse, __version__, description, __dependencies__, parser)
+
 if __name__ == "__main__":
-    standard_main(parse, __version__,
-                  "Convert LightWave (.obj) OBJ2 files into a Turbulenz JSON asset. Supports generating NBTs.",
-                  __dependencies__)
+    exit(main())
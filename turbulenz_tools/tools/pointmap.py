@@ -2,13 +2,20 @@
 """
 Point map structure similar to a kd-tree but with points on each internal node which allows for fast neighbours lookup.
 It takes (N*log N) to build and (N*log N) to query.
+
+A uniform grid spatial hash is also provided for the small tolerances used to find coincident vertexes, it takes (N)
+to build and (1) to query.
 """
 
+import math
+
+from itertools import izip, product
+
 # pylint: disable=W0403
 import vmath
 # pylint: enable=W0403
 
-__version__ = '1.0.0'
+__version__ = '1.2.0'
 __dependencies__ = ['vmath']
 
 #######################################################################################################################
@@ -108,6 +115,132 @@ def build_kdtree_nodes(vertexes, indexes, depth=0):
 
 #######################################################################################################################
 
+class Grid(object):
+    """Uniform grid spatial hash.
+
+    Points within the distance the grid was built for are at most one cell apart, so a query only tests the points
+    of the 27 cells around it. Use the kd-tree for distances large compared to the spacing of the points."""
+
+    def __init__(self, vertexes, distance):
+        self.distance = distance
+        # Twice the distance so rounding of the cell coordinates can't push close points two cells apart.
+        self.cell_size = 2.0 * distance
+        self.cells = { }
+        cells = self.cells
+        for vertex_index, vertex in enumerate(vertexes):
+            cell = self.cell(vertex)
+            if cell in cells:
+                cells[cell].append(vertex_index)
+            else:
+                cells[cell] = [vertex_index]
+
+    def cell(self, point):
+        """Return the coordinates of the cell containing the point."""
+        cell_size = self.cell_size
+        (x, y, z) = point
+        return (int(math.floor(x / cell_size)), int(math.floor(y / cell_size)), int(math.floor(z / cell_size)))
+
+    def candidates(self, point):
+        """Build a list of the indexes in the cells around the point."""
+        (cx, cy, cz) = self.cell(point)
+        cells = self.cells
+        results = [ ]
+        for x in (cx - 1, cx, cx + 1):
+            for y in (cy - 1, cy, cy + 1):
+                for z in (cz - 1, cz, cz + 1):
+                    cell = cells.get((x, y, z))
+                    if cell:
+                        results.extend(cell)
+        return results
+
+    def points_within_uv_distance(self, positions, position, position_tolerance, uvs, uv, uv_tolerance):
+        """Build a list of indexes which are within distance of the point and vertex."""
+        assert position_tolerance <= self.distance
+        return [ i for i in self.candidates(position)
+                 if vmath.v3equal(positions[i], position, position_tolerance) and
+                    vmath.v2equal(uvs[i], uv, uv_tolerance) ]
+
+    def points_within_distance(self, vertexes, point, distance):
+        """Build a list of indexes which are within distance of the point and vertex."""
+        assert distance <= self.distance
+        return [ i for i in self.candidates(point) if vmath.v3equal(point, vertexes[i], distance) ]
+
+def build_grid(vertexes, distance):
+    """Build a grid for the vertexes suitable for queries up to distance."""
+    return Grid(vertexes, distance)
+
+def build_neighbour_groups(vertexes, distance):
+    """Build for each vertex the sorted list of indexes of the vertexes within distance, including itself.
+
+    Vertexes at the same position are grouped first and share the same list, so each cluster of welded vertexes costs
+    a single grid query."""
+    coincident = { }
+    for vertex_index, vertex in enumerate(vertexes):
+        if vertex in coincident:
+            coincident[vertex].append(vertex_index)
+        else:
+            coincident[vertex] = [vertex_index]
+
+    unique = coincident.keys()
+    grid = None
+    if distance > 0:
+        grid = Grid(unique, distance)
+
+    groups = [ None ] * len(vertexes)
+    for vertex in unique:
+        if grid:
+            group = [ ]
+            for i in grid.points_within_distance(unique, vertex, distance):
+                group.extend(coincident[unique[i]])
+            group.sort()
+        else:
+            group = coincident[vertex]
+        for vertex_index in coincident[vertex]:
+            groups[vertex_index] = group
+    return groups
+
+def build_weld_mapping(vertexes, distance, hashed_components=3):
+    """Weld each vertex to the first kept vertex with all its components within distance of its own, keeping it when
+    there is none. Returns the index in the kept vertexes each vertex is welded to and the indexes of the kept ones.
+
+    The first hashed_components of the kept vertexes are hashed into cells twice the distance wide, so the vertexes
+    within distance of a vertex are in its cell or, along each axis, the neighbour closest to it and only those are
+    tested. A vertex equal to a kept one is welded to it without any test, as no vertex kept before that one was
+    within distance of it."""
+    scale = 0.5 / distance
+    floor = math.floor
+    cells = { }
+    exact = { }
+    kept = [ ]
+    used = [ ]
+    mapping = [ ]
+    for vertex_index, vertex in enumerate(vertexes):
+        welded = exact.get(vertex)
+        if welded is None:
+            scaled = [ c * scale for c in vertex[:hashed_components] ]
+            cell = tuple([ int(floor(c)) for c in scaled ])
+            axes = [ (c, c - 1 if f - c < 0.5 else c + 1) for (c, f) in izip(cell, scaled) ]
+            for neighbour in product(*axes):
+                for k in cells.get(neighbour, ()):
+                    if welded is not None and k > welded:
+                        break
+                    if all(abs(a - b) <= distance for (a, b) in izip(vertex, kept[k])):
+                        welded = k
+                        break
+            if welded is None:
+                welded = len(kept)
+                kept.append(vertex)
+                used.append(vertex_index)
+                exact[vertex] = welded
+                if cell in cells:
+                    cells[cell].append(welded)
+                else:
+                    cells[cell] = [welded]
+        mapping.append(welded)
+    return (mapping, used)
+
+#######################################################################################################################
+
 if __name__ == "__main__":
     import random
     NUM = 1000
@@ -123,3 +256,9 @@ if __name__ == "__main__":
     for i, x in enumerate(VERTEXES):
         if vmath.v3equal(x, POINT, DISTANCE):
             print "Result: %i %s is close to %s." % (i, x, POINT)
+    print "=" * 80
+    GRID = build_grid(VERTEXES, DISTANCE)
+    RESULTS = GRID.points_within_distance(VERTEXES, POINT, DISTANCE)
+    RESULTS.sort()
+    for r in RESULTS:
+        print "Result: %i %s is close to %s." % (r, VERTEXES[r], POINT)
@@ -0,0 +1,103 @@
+# Copyright (c) 2014 Turbulenz Limited
+"""
+Quantization of vertex attribute streams into small integers.
+
+Positions and texture coordinates are stored relative to their bounding box, normals and tangents as octahedral
+projections onto two signed components, and skin weights as fractions of 255 adding up exactly. Each function returns
+the integer stream and the largest error against the original floats, the parameters needed to dequantize are
+returned as well: value = offset + quantized * scale per component for the linear encodings.
+"""
+
+import math
+
+__version__ = '1.0.0'
+__dependencies__ = [ ]
+
+#######################################################################################################################
+
+DEFAULT_POSITION_BITS = 16
+DEFAULT_NORMAL_BITS = 8
+DEFAULT_UV_BITS = 16
+DEFAULT_WEIGHT_BITS = 8
+
+def type_name(bits, signed=False):
+    """Name of the smallest integer type holding the bits, as used by the asset buffers."""
+    size = 8 if bits <= 8 else (16 if bits <= 16 else 32)
+    if signed:
+        return 'int%i' % size
+    return 'uint%i' % size
+
+def quantize_linear(data, stride, bits, minimum=None, maximum=None):
+    """Quantize each component of a flat stream to unsigned bits relative to the range of that component.
+    Returns (quantized, offset, scale, error), error being the largest absolute difference of any component."""
+    if minimum is None or maximum is None:
+        minimum = [ min(data[n::stride]) for n in xrange(stride) ]
+        maximum = [ max(data[n::stride]) for n in xrange(stride) ]
+    levels = (1 << bits) - 1
+    scale = [ (hi - lo) / float(levels) for lo, hi in zip(minimum, maximum) ]
+    inverse = [ 1.0 / s if s > 0.0 else 0.0 for s in scale ]
+    offset = [ float(lo) for lo in minimum ]
+    quantized = [ ]
+    error = 0.0
+    for n, value in enumerate(data):
+        c = n % stride
+        q = int(math.floor((value - offset[c]) * inverse[c] + 0.5))
+        q = max(0, min(levels, q))
+        quantized.append(q)
+        error = max(error, abs(offset[c] + q * scale[c] - value))
+    return (quantized, offset, scale, error)
+
+def _octahedral_decode(qx, qy, levels):
+    x = qx / float(levels)
+    y = qy / float(levels)
+    z = 1.0 - abs(x) - abs(y)
+    if z < 0.0:
+        (x, y) = ((1.0 - abs(y)) * (1.0 if x >= 0.0 else -1.0), (1.0 - abs(x)) * (1.0 if y >= 0.0 else -1.0))
+    length = math.sqrt(x * x + y * y + z * z)
+    return (x / length, y / length, z / length)
+
+def quantize_octahedral(data, bits):
+    """Quantize a flat stream of 3 component directions to 2 signed components of bits each, by projecting them onto
+    an octahedron and unfolding its lower half. Returns (quantized, error), error being the largest angle in degrees
+    between a direction and its decoded value. Zero length directions are stored as (0, 0)."""
+    levels = (1 << (bits - 1)) - 1
+    quantized = [ ]
+    max_cos = 1.0
+    floor = math.floor
+    for n in xrange(0, len(data), 3):
+        (x, y, z) = data[n:n + 3]
+        length = abs(x) + abs(y) + abs(z)
+        if length <= 0.0:
+            quantized.append(0)
+            quantized.append(0)
+            continue
+        (px, py) = (x / length, y / length)
+        if z < 0.0:
+            (px, py) = ((1.0 - abs(py)) * (1.0 if px >= 0.0 else -1.0), (1.0 - abs(px)) * (1.0 if py >= 0.0 else -1.0))
+        qx = max(-levels, min(levels, int(floor(px * levels + 0.5))))
+        qy = max(-levels, min(levels, int(floor(py * levels + 0.5))))
+        quantized.append(qx)
+        quantized.append(qy)
+        (dx, dy, dz) = _octahedral_decode(qx, qy, levels)
+        norm = math.sqrt(x * x + y * y + z * z)
+        max_cos = min(max_cos, (x * dx + y * dy + z * dz) / norm)
+    return (quantized, math.degrees(math.acos(max(-1.0, min(1.0, max_cos)))))
+
+def quantize_weights(data, stride, bits):
+    """Quantize a flat stream of skin weights to unsigned bits, adjusting the largest weight of each vertex so the
+    quantized weights add up to the same total as the originals. Returns (quantized, scale, error)."""
+    levels = (1 << bits) - 1
+    scale = 1.0 / levels
+    quantized = [ ]
+    error = 0.0
+    floor = math.floor
+    for n in xrange(0, len(data), stride):
+        weights = data[n:n + stride]
+        vertex = [ max(0, min(levels, int(floor(w * levels + 0.5)))) for w in weights ]
+        target = max(0, min(levels, int(floor(sum(weights) * levels + 0.5))))
+        largest = max(xrange(stride), key=vertex.__getitem__)
+        vertex[largest] = max(0, min(levels, vertex[largest] + target - sum(vertex)))
+        for q, w in zip(vertex, weights):
+            error = max(error, abs(q * scale - w))
+        quantized.extend(vertex)
+    return (quantized, scale, error)
@@ -0,0 +1,338 @@
+# Copyright (c) 2014 Turbulenz Limited
+"""
+Simplification of indexed triangle lists by quadric error edge collapses, used to generate levels of detail.
+
+Each vertex accumulates the area weighted quadrics of the planes of its triangles, following Garland and Heckbert's
+"Surface Simplification Using Quadric Error Metrics", and the cheapest edges are collapsed first. Vertexes only move
+onto one of their neighbours so no new vertex values are created and the levels of detail can share the streams of
+the original mesh.
+
+Vertexes sharing a position but with different attributes (UV seams, hard normals) are kept together: a seam vertex
+only collapses along its seam, moving each of its attribute sets onto the matching one of the other end, and borders
+only collapse along themselves. The attribute sets of a collapsed vertex must match a single one of the other end so
+normals and UVs are not smeared across discontinuities.
+"""
+
+import math
+import heapq
+
+__version__ = '1.0.0'
+__dependencies__ = [ ]
+
+#######################################################################################################################
+
+DEFAULT_LOD_RATIO = 0.5
+DEFAULT_MAX_ERROR = 0.01
+
+# Weight of the planes perpendicular to borders and seams, relative to the planes of the triangles.
+BORDER_WEIGHT = 10.0
+# Weight of the squared difference of the normals moved onto each other, relative to the squared edge length.
+NORMAL_WEIGHT = 0.5
+# Collapses bending a triangle's normal more than this are rejected, cos 60 degrees.
+FLIP_TOLERANCE = 0.5
+
+VERTEX_MANIFOLD = 0
+VERTEX_BORDER = 1
+VERTEX_SEAM = 2
+VERTEX_LOCKED = 3
+
+def _plane_quadric(nx, ny, nz, px, py, pz, weight):
+    """Quadric of the distance to the plane with unit normal n through p, as the upper triangle of the 4x4 matrix."""
+    d = -(nx * px + ny * py + nz * pz)
+    return [ weight * nx * nx, weight * nx * ny, weight * nx * nz, weight * nx * d,
+             weight * ny * ny, weight * ny * nz, weight * ny * d,
+             weight * nz * nz, weight * nz * d,
+             weight * d * d ]
+
+def _add_quadric(q, r):
+    for n in xrange(10):
+        q[n] += r[n]
+
+def _quadric_error(q, x, y, z):
+    return (q[0] * x * x + 2.0 * (q[1] * x * y + q[2] * x * z + q[3] * x) +
+            q[4] * y * y + 2.0 * (q[5] * y * z + q[6] * y) +
+            q[7] * z * z + 2.0 * q[8] * z +
+            q[9])
+
+def _cross(a, b, c):
+    (ux, uy, uz) = (b[0] - a[0], b[1] - a[1], b[2] - a[2])
+    (vx, vy, vz) = (c[0] - a[0], c[1] - a[1], c[2] - a[2])
+    return (uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx)
+
+#######################################################################################################################
+
+# pylint: disable=R0902
+class _Simplifier(object):
+    """State of the simplification of a single triangle list."""
+
+    # pylint: disable=R0914
+    def __init__(self, indexes, positions, normals):
+        self.normals = normals
+        self.triangles = [ [ indexes[n], indexes[n + 1], indexes[n + 2] ] for n in xrange(0, len(indexes), 3) ]
+        self.alive = [ True ] * len(self.triangles)
+        self.num_alive = len(self.triangles)
+
+        # Vertexes at the same position are wedges of a single point, the errors are relative to the extent.
+        point_map = { }
+        self.point = { }
+        points = [ ]
+        for v in set(indexes):
+            key = tuple(positions[v][:3])
+            p = point_map.get(key)
+            if p is None:
+                p = len(points)
+                point_map[key] = p
+                points.append(key)
+            self.point[v] = p
+        if points:
+            extent = max(max(p[axis] for p in points) - min(p[axis] for p in points) for axis in xrange(3))
+        else:
+            extent = 0.0
+        self.scale = extent if extent > 0.0 else 1.0
+        inv_scale = 1.0 / self.scale
+        self.points = [ (x * inv_scale, y * inv_scale, z * inv_scale) for (x, y, z) in points ]
+
+        self.point_triangles = [ set() for _ in points ]
+        self.point_wedges = [ set() for _ in points ]
+        for t, triangle in enumerate(self.triangles):
+            for v in triangle:
+                self.point_triangles[self.point[v]].add(t)
+                self.point_wedges[self.point[v]].add(v)
+        self.dead = [ False ] * len(points)
+        self.stamp = [ 0 ] * len(points)
+
+        self.quadrics = [ [ 0.0 ] * 10 for _ in points ]
+        for triangle in self.triangles:
+            (a, b, c) = [ self.points[self.point[v]] for v in triangle ]
+            (nx, ny, nz) = _cross(a, b, c)
+            length = math.sqrt(nx * nx + ny * ny + nz * nz)
+            if length > 0.0:
+                q = _plane_quadric(nx / length, ny / length, nz / length, a[0], a[1], a[2], length * 0.5)
+                for v in triangle:
+                    _add_quadric(self.quadrics[self.point[v]], q)
+
+        self.kinds = [ VERTEX_MANIFOLD ] * len(points)
+        self._classify()
+    # pylint: enable=R0914
+
+    def _edge_triangles(self, p, q):
+        return self.point_triangles[p] & self.point_triangles[q]
+
+    def _is_seam_edge(self, p, q, edge_triangles):
+        """A shared edge whose triangles use different wedges at either end."""
+        wedges = set()
+        for t in edge_triangles:
+            wedges.add(tuple(sorted([ v for v in self.triangles[t] if self.point[v] == p or self.point[v] == q ])))
+        return len(wedges) > 1
+
+    def _neighbours(self, p):
+        neighbours = set()
+        point = self.point
+        for t in self.point_triangles[p]:
+            for v in self.triangles[t]:
+                neighbours.add(point[v])
+        neighbours.discard(p)
+        return neighbours
+
+    # pylint: disable=R0914
+    def _classify(self):
+        """Classify the points from their edges and add the quadrics keeping the borders and seams in place."""
+        points = self.points
+        borders = [ 0 ] * len(points)
+        seams = [ 0 ] * len(points)
+        for p in xrange(len(points)):
+            for q in self._neighbours(p):
+                edge_triangles = self._edge_triangles(p, q)
+                if len(edge_triangles) > 2:
+                    self.kinds[p] = VERTEX_LOCKED
+                    continue
+                if len(edge_triangles) == 1:
+                    borders[p] += 1
+                elif self._is_seam_edge(p, q, edge_triangles):
+                    seams[p] += 1
+                else:
+                    continue
+                if p < q:
+                    # A plane through the edge perpendicular to its triangle, for both ends.
+                    t = iter(edge_triangles).next()
+                    (a, b, c) = [ points[self.point[v]] for v in self.triangles[t] ]
+                    (nx, ny, nz) = _cross(a, b, c)
+                    (ex, ey, ez) = (points[q][0] - points[p][0], points[q][1] - points[p][1],
+                                    points[q][2] - points[p][2])
+                    (px, py, pz) = (ey * nz - ez * ny, ez * nx - ex * nz, ex * ny - ey * nx)
+                    length = math.sqrt(px * px + py * py + pz * pz)
+                    if length > 0.0:
+                        weight = BORDER_WEIGHT * (ex * ex + ey * ey + ez * ez)
+                        r = _plane_quadric(px / length, py / length, pz / length,
+                                           points[p][0], points[p][1], points[p][2], weight)
+                        _add_quadric(self.quadrics[p], r)
+                        _add_quadric(self.quadrics[q], r)
+
+        for p in xrange(len(points)):
+            if self.kinds[p] == VERTEX_LOCKED:
+                continue
+            num_wedges = len(self.point_wedges[p])
+            if num_wedges == 1:
+                if borders[p] == 0:
+                    self.kinds[p] = VERTEX_MANIFOLD
+                elif borders[p] == 2:
+                    self.kinds[p] = VERTEX_BORDER
+                else:
+                    self.kinds[p] = VERTEX_LOCKED
+            elif num_wedges == 2 and borders[p] == 0 and seams[p] == 2:
+                self.kinds[p] = VERTEX_SEAM
+            else:
+                self.kinds[p] = VERTEX_LOCKED
+    # pylint: enable=R0914
+
+    def _cost(self, p, q):
+        """Error of moving p onto q, or None if the kinds of the points don't allow it."""
+        kind = self.kinds[p]
+        if kind == VERTEX_LOCKED:
+            return None
+        if kind != VERTEX_MANIFOLD:
+            edge_triangles = self._edge_triangles(p, q)
+            if kind == VERTEX_BORDER:
+                if len(edge_triangles) != 1:
+                    return None
+            elif len(edge_triangles) != 2 or not self._is_seam_edge(p, q, edge_triangles):
+                return None
+        (x, y, z) = self.points[q]
+        error = _quadric_error(self.quadrics[p], x, y, z)
+        if self.normals is not None:
+            partners = self._partners(p, q)
+            if partners is None:
+                return None
+            normals = self.normals
+            (px, py, pz) = self.points[p]
+            length_sq = (x - px) * (x - px) + (y - py) * (y - py) + (z - pz) * (z - pz)
+            deviation = 0.0
+            for w, partner in partners.iteritems():
+                a = normals[w]
+                b = normals[partner]
+                deviation = max(deviation, (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2)
+            error += NORMAL_WEIGHT * deviation * length_sq
+        return max(error, 0.0)
+
+    def _partners(self, p, q):
+        """The wedge of q each wedge of p moves onto, or None if one is ambiguous or seams would be merged."""
+        partners = { }
+        point = self.point
+        for t in self._edge_triangles(p, q):
+            triangle = self.triangles[t]
+            w = [ v for v in triangle if point[v] == p ][0]
+            x = [ v for v in triangle if point[v] == q ][0]
+            if partners.setdefault(w, x) != x:
+                return None
+        if len(partners) != len(self.point_wedges[p]):
+            return None
+        if len(set(partners.itervalues())) != len(partners):
+            return None
+        return partners
+
+    # pylint: disable=R0914
+    def _collapse(self, p, q):
+        """Move p onto q if the topology allows it. Returns True if the collapse was done."""
+        partners = self._partners(p, q)
+        if partners is None:
+            return False
+
+        # The points around both ends, other than the triangles of the edge, would be joined twice.
+        edge_triangles = self._edge_triangles(p, q)
+        if len(self._neighbours(p) & self._neighbours(q)) != len(edge_triangles):
+            return False
+
+        # Reject the collapses flipping or folding the remaining triangles.
+        points = self.points
+        point = self.point
+        target = points[q]
+        for t in self.point_triangles[p]:
+            if t in edge_triangles:
+                continue
+            corners = [ points[point[v]] for v in self.triangles[t] ]
+            (ax, ay, az) = _cross(*corners)
+            corners = [ target if point[v] == p else points[point[v]] for v in self.triangles[t] ]
+            (bx, by, bz) = _cross(*corners)
+            dot = ax * bx + ay * by + az * bz
+            if dot <= FLIP_TOLERANCE * math.sqrt((ax * ax + ay * ay + az * az) * (bx * bx + by * by + bz * bz)):
+                return False
+
+        for t in edge_triangles:
+            self.alive[t] = False
+            self.num_alive -= 1
+            for v in self.triangles[t]:
+                self.point_triangles[point[v]].discard(t)
+        for t in self.point_triangles[p]:
+            triangle = self.triangles[t]
+            for n, v in enumerate(triangle):
+                if point[v] == p:
+                    triangle[n] = partners[v]
+            self.point_triangles[q].add(t)
+        self.point_triangles[p] = set()
+        self.point_wedges[p] = set()
+        self.dead[p] = True
+        _add_quadric(self.quadrics[q], self.quadrics[p])
+        self.stamp[q] += 1
+        return True
+    # pylint: enable=R0914
+
+    def _push(self, heap, p, q):
+        cost = self._cost(p, q)
+        if cost is not None:
+            heapq.heappush(heap, (cost, p, q, self.stamp[p], self.stamp[q]))
+
+    def run(self, target_count, max_error):
+        """Collapse edges until there are at most target_count triangles left or the next collapse would cost more
+           than max_error, relative to the extent of the mesh. Returns the largest error of the collapses done."""
+        max_cost = max_error * max_error
+        error = 0.0
+        progress = True
+        while progress and self.num_alive > target_count:
+            # The candidates are rebuilt whenever they run out, some may have been rejected because of the topology
+            # around them at the time.
+            progress = False
+            heap = [ ]
+            for p in xrange(len(self.points)):
+                if not self.dead[p]:
+                    for q in self._neighbours(p):
+                        self._push(heap, p, q)
+            while heap and self.num_alive > target_count:
+                (cost, p, q, p_stamp, q_stamp) = heapq.heappop(heap)
+                if cost > max_cost:
+                    break
+                if self.dead[p] or self.dead[q] or self.stamp[p] != p_stamp or self.stamp[q] != q_stamp:
+                    continue
+                if self._collapse(p, q):
+                    progress = True
+                    error = max(error, cost)
+                    for n in self._neighbours(q):
+                        self._push(heap, q, n)
+                        self._push(heap, n, q)
+        return math.sqrt(error)
+
+    def indexes(self):
+        """Flat list of the indexes of the remaining triangles, in their original order."""
+        return [ v for t, triangle in enumerate(self.triangles) if self.alive[t] for v in triangle ]
+# pylint: enable=R0902
+
+#######################################################################################################################
+
+def simplify_triangles(indexes, positions, target_count, max_error=DEFAULT_MAX_ERROR, normals=None):
+    """Simplify a flat list of triangle indexes down to target_count triangles, stopping early rather than moving the
+    surface more than max_error, relative to the largest dimension of its bounding box.
+    positions, and normals if given, are indexed by the indexes. The remaining triangles keep their order and only
+    reference existing vertexes. Returns the new list of indexes and the error, relative to the largest dimension."""
+    if len(indexes) // 3 <= target_count:
+        return (list(indexes), 0.0)
+    simplifier = _Simplifier(indexes, positions, normals)
+    error = simplifier.run(target_count, max_error)
+    return (simplifier.indexes(), error)
+
+def lod_targets(num_triangles, count, ratio=DEFAULT_LOD_RATIO):
+    """Target triangle counts of count levels of detail, each ratio times the previous one."""
+    targets = [ ]
+    target = float(num_triangles)
+    for _ in xrange(count):
+        target *= ratio
+        targets.append(int(target))
+    return targets
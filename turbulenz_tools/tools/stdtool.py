@@ -3,16 +3,27 @@
 Utilities to simplify building a standard translater.
 """
 
+import os
 import sys
+import stat
+import socket
 import logging
 LOG = logging.getLogger('asset')
 
-from os.path import basename as path_basename, exists as path_exists
+from copy import deepcopy
+from shlex import split as shlex_split
+from hashlib import sha1
+from shutil import copyfile
+from tempfile import mkstemp
+from multiprocessing import current_process
+from os.path import basename as path_basename, exists as path_exists, join as path_join
+from os.path import abspath as path_abspath, dirname as path_dirname, splitext as path_splitext
 from simplejson import load as json_load
 from optparse import OptionParser, OptionGroup, TitledHelpFormatter
 
 # pylint: disable=W0403
 from turbulenz_tools.tools.asset2json import JsonAsset
+from turbulenz_tools.tools.quantize import DEFAULT_NORMAL_BITS
 from turbulenz_tools.utils.json_utils import merge_dictionaries
 # pylint: enable=W0403
 
@@ -21,42 +32,48 @@ from turbulenz_tools.utils.json_utils import merge_dictionaries
 
 #######################################################################################################################
 
-def standard_output_version(version, dependencies, output_file=None):
-    main_module_name = path_basename(sys.argv[0])
-    version_string = None
-    if dependencies:
-        deps = { }
-
-        def get_dependencies_set(this_module_name, deps_list):
-            for module_name in deps_list:
-                if module_name not in deps:
-                    m = None
+def _dependency_modules(main_module_name, dependencies):
+    """Import the dependencies of a tool and all of theirs, returning the modules with a version by name."""
+    deps = { }
+
+    def get_dependencies_set(this_module_name, deps_list):
+        for module_name in deps_list:
+            if module_name not in deps:
+                m = None
+                try:
+                    m = __import__(module_name, globals(), locals(),
+                                   ['__version__', '__dependencies__'])
+                except ImportError:
+                    print "Failed to import %s, listed in dependencies " \
+                        "for %s" % (module_name, this_module_name)
+                    exit(1)
+                else:
+                    # Test is the module actually has a version attribute
                     try:
-                        m = __import__(module_name, globals(), locals(),
-                                       ['__version__', '__dependencies__'])
-                    except ImportError:
-                        print "Failed to import %s, listed in dependencies " \
-                            "for %s" % (module_name, this_module_name)
-                        exit(1)
+                        version_ = m.__version__
+                    except AttributeError as e:
+                        print 'No __version__ attribute for tool %s' \
+                            % m.__name__
+                        print ' >> %s' % str(e)
                     else:
-                        # Test is the module actually has a version attribute
-                        try:
-                            version_ = m.__version__
-                        except AttributeError as e:
-                            print 'No __version__ attribute for tool %s' \
-                                % m.__name__
-                            print ' >> %s' % str(e)
-                        else:
-                            deps[module_name] = m
+                        deps[module_name] = m
 
-                    if m is not None:
-                        try:
-                            get_dependencies_set(module_name,
-                                                 m.__dependencies__)
-                        except AttributeError:
-                            pass
+                if m is not None:
+                    try:
+                        get_dependencies_set(module_name,
+                                             m.__dependencies__)
+                    except AttributeError:
+                        pass
+
+    get_dependencies_set(main_module_name, dependencies)
+    return deps
 
-        get_dependencies_set(main_module_name, dependencies)
+def standard_version_string(version, dependencies):
+    """Build the version string of the tool, including the versions of all its dependencies."""
+    main_module_name = path_basename(sys.argv[0])
+    version_string = None
+    if dependencies:
+        deps = _dependency_modules(main_module_name, dependencies)
 
         module_names = deps.keys()
         module_names.sort()
@@ -65,6 +82,10 @@ def standard_output_version(version, dependencies, output_file=None):
         version_string = '%s %s (%s)' % (main_module_name, version, module_list)
     else:
         version_string = '%s %s' % (main_module_name, version)
+    return version_string
+
+def standard_output_version(version, dependencies, output_file=None):
+    version_string = standard_version_string(version, dependencies)
 
     # If we are given an output file, write the versions info there if
     # either:
@@ -82,6 +103,164 @@ def standard_output_version(version, dependencies, output_file=None):
         with open(output_file, "wb") as f:
             f.write(version_string)
 
+#######################################################################################################################
+
+class ConversionCache(object):
+    """On disk cache of converted assets.
+
+    Entries are keyed by a hash of the input and definitions files, the tool name, the tool and dependencies versions
+    and the options affecting the output. Once the cache grows over max_size bytes the entries with the oldest
+    modification time are removed, storing or fetching an entry updates it.
+
+    The size of the cache is scanned on the first store and then kept up to date with the entries stored and removed
+    by this process, the directory is only scanned again when that size goes over max_size. Entries stored by other
+    processes sharing the directory are accounted for by that scan."""
+
+    # Options which don't change the converted output, the input and definitions files are hashed by content.
+    IGNORED_OPTIONS = frozenset(['output_version', 'verbose', 'silent', 'metrics', 'output_log',
+                                 'input', 'output', 'definitions', 'cache_dir', 'cache_size', 'release_sections',
+                                 'batch', 'server', 'workers', 'stream'])
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.size = None
+        if not path_exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def key(self, tool_name, version, dependencies, options):
+        """Build the key for converting options.input with the options."""
+        hasher = sha1()
+        # Not the version string, which names the running script and so would differ under convertassets.
+        hasher.update('%s %s' % (tool_name, version))
+        if dependencies:
+            deps = _dependency_modules(tool_name, dependencies)
+            for module_name in sorted(deps.iterkeys()):
+                hasher.update('\0%s %s' % (module_name, deps[module_name].__version__))
+        hasher.update(repr(sorted([ (k, v) for k, v in vars(options).iteritems() if k not in self.IGNORED_OPTIONS ])))
+        for filename in [options.input] + (getattr(options, 'definitions', None) or [ ]):
+            # The name is included as some tools derive asset names from it.
+            hasher.update('\0%s\0' % filename)
+            if path_exists(filename):
+                with open(filename, 'rb') as source:
+                    for data in iter(lambda: source.read(65536), ''):
+                        hasher.update(data)
+        return hasher.hexdigest()
+
+    def entry(self, key):
+        """Path of the entry for key."""
+        return path_join(self.cache_dir, key + '.json')
+
+    def fetch(self, key, output_filename):
+        """Copy the cached output to output_filename, returns False if there is no entry for key."""
+        entry = self.entry(key)
+        try:
+            copyfile(entry, output_filename)
+            # Mark the entry as recently used.
+            os.utime(entry, None)
+        except (IOError, OSError):
+            return False
+        return True
+
+    def store(self, key, output_filename):
+        """Add the converted output_filename to the cache."""
+        entry = self.entry(key)
+        try:
+            replaced_size = os.path.getsize(entry)
+        except OSError:
+            replaced_size = 0
+        (handle, temp_filename) = mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(handle)
+        try:
+            copyfile(output_filename, temp_filename)
+            # mkstemp creates the file readable only by its owner.
+            os.chmod(temp_filename, 0o644)
+            stored_size = os.path.getsize(temp_filename)
+            # Rename so concurrent conversions never read a partial entry.
+            os.rename(temp_filename, entry)
+        except (IOError, OSError) as e:
+            LOG.warning('Failed to store %s in the cache: %s', output_filename, e)
+            if path_exists(temp_filename):
+                os.remove(temp_filename)
+            return
+        if self.size is None:
+            self.evict()
+        else:
+            self.size += stored_size - replaced_size
+            if self.size > self.max_size:
+                self.evict()
+
+    def evict(self):
+        """Scan the cache and remove the entries with the oldest modification time until it is smaller than
+           max_size."""
+        entries = [ ]
+        total_size = 0
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith('.json'):
+                entry = path_join(self.cache_dir, filename)
+                try:
+                    stat = os.stat(entry)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry))
+                total_size += stat.st_size
+
+        if total_size > self.max_size:
+            entries.sort()
+            for (_, size, entry) in entries:
+                try:
+                    os.remove(entry)
+                except OSError:
+                    pass
+                total_size -= size
+                if total_size <= self.max_size:
+                    break
+        self.size = total_size
+
+# The caches used by this process, so the jobs of a batch or server keep the size of the cache up to date.
+_CONVERSION_CACHES = { }
+
+def _conversion_cache(cache_dir, max_size):
+    """Return the ConversionCache of this process for cache_dir and max_size."""
+    cache = _CONVERSION_CACHES.get((cache_dir, max_size))
+    if cache is None:
+        cache = ConversionCache(cache_dir, max_size)
+        _CONVERSION_CACHES[(cache_dir, max_size)] = cache
+    return cache
+
+def standard_cache_options(parser):
+    """Add the conversion cache options to the parser."""
+    group = OptionGroup(parser, "Cache Options")
+    group.add_option("--cache", action="store", dest="cache_dir", default=None, metavar="PATH",
+                     help="cache converted assets in PATH and copy them from there when the input, definitions, "
+                     "tool versions and options are unchanged")
+    group.add_option("--cache-size", action="store", dest="cache_size", type="int", default=1024, metavar="MB",
+                     help="maximum size of the cache, the least recently stored or used assets are removed above it, "
+                     "defaults to 1024")
+    parser.add_option_group(group)
+
+def standard_cached_convert(convert, tool_name, version, dependencies, options):
+    """Call ``convert`` unless the conversion cache already holds its output.
+       Returns the result of ``convert``, or None when the output was copied from the cache."""
+    if not getattr(options, 'cache_dir', None):
+        return convert()
+    if getattr(options, 'binary_buffers', False):
+        LOG.info('cache: not used with --binary-buffers')
+        return convert()
+
+    cache = _conversion_cache(options.cache_dir, options.cache_size * 1024 * 1024)
+    key = cache.key(tool_name, version, dependencies, options)
+    if cache.fetch(key, options.output):
+        LOG.info("cache: %s", key)
+        return None
+
+    result = convert()
+    if result is not None and path_exists(options.output):
+        cache.store(key, options.output)
+    return result
+
+#######################################################################################################################
+
 def standard_include(infiles):
     """Load and merge all the ``infiles``."""
     if infiles:
@@ -98,6 +277,15 @@ def standard_include(infiles):
         return JsonAsset()
     return None
 
+def standard_workers(workers):
+    """Return the number of processes a tool can run ``workers`` jobs with. The workers of a pool are daemonic and
+       are not allowed to start pools of their own, so in those, e.g. when converted by convertassets, the jobs are
+       run in process."""
+    if workers > 1 and current_process().daemon:
+        LOG.info("workers: running in process from a daemonic process")
+        return 1
+    return workers
+
 def standard_parser(description, epilog=None, per_file_options=True):
     """Standard set of parser options."""
     parser = OptionParser(description=description, epilog=epilog,
@@ -122,11 +310,26 @@ def standard_parser(description, epilog=None, per_file_options=True):
                      help="json output pretty printing indent size, defaults "
                      "to 0")
 
+    group.add_option("-6", "--base64-encoding", action="store_true", dest="b64_encoding", default=False,
+                     help="pack the geometry vertex data and indices into a binary buffer embedded in base64, "
+                     "defaults to disabled")
+    group.add_option("--binary-buffers", action="store_true", dest="binary_buffers", default=False,
+                     help="pack the geometry vertex data and indices into a binary .bin file written next to the "
+                     "output, defaults to disabled")
+    group.add_option("--quantize", action="store_true", dest="quantize", default=False,
+                     help="quantize the geometry sources to 16 bit positions and UVs, octahedral normals and tangents "
+                     "and 8 bit skin weights, recording how to dequantize them in the geometry meta, defaults to "
+                     "disabled")
+    group.add_option("--quantize-normal-bits", action="store", dest="quantize_normal_bits", type="int",
+                     default=DEFAULT_NORMAL_BITS, metavar="BITS",
+                     help="bits of each of the 2 octahedral components of the quantized normals and tangents, "
+                     "defaults to %i" % DEFAULT_NORMAL_BITS)
+    group.add_option("--release-sections", action="store_true", dest="release_sections", default=False,
+                     help="release each section of the asset once it has been written to lower the peak memory use "
+                     "on large assets, defaults to disabled")
+
     # TODO - Asset Generation Options currently disabled
     #
-    #group.add_option("-6", "--base64-encoding", action="store_true", dest="b64_encoding", default=False,
-    #                 help=("encode long float and int attributes in base64, defaults to disabled %s" %
-    #                        "- [ currently unsupported ]"))
     #group.add_option("-c", "--force-collision", action="store_true", dest="force_collision", default=False,
     #                 help="force collision generation - [ currently unsupported ]")
     #group.add_option("-r", "--force-render", action="store_true", dest="force_render", default=False,
@@ -161,8 +364,17 @@ def standard_parser(description, epilog=None, per_file_options=True):
                          help="source FILE to process")
         group.add_option("-o", "--output", action="store", dest="output", default="default.json", metavar="FILE",
                          help="output FILE to write to")
+        group.add_option("--batch", action="store", dest="batch", default=None, metavar="FILE",
+                         help="convert each job listed in the manifest FILE, or stdin for '-', in a single process. "
+                         "Each line holds the options of a job, the other command line options are their defaults")
+        group.add_option("--server", action="store", dest="server", default=None, metavar="SOCKET",
+                         help="keep running and convert the jobs sent, one manifest line at a time, to the Unix "
+                         "SOCKET. Its directory is created if needed and must only be accessible by the user. Each "
+                         "job is answered with 'ok' or 'error' and a line of 'quit' stops the server")
         parser.add_option_group(group)
 
+        standard_cache_options(parser)
+
     # TODO - Database Options are currently disabled
     #
     #group = OptionGroup(parser, "Database Options")
@@ -180,28 +392,8 @@ def standard_parser(description, epilog=None, per_file_options=True):
 
     return parser
 
-def standard_main(parse, version, description, dependencies, parser = None):
-    """Provide a consistent wrapper for standalone translation.
-       When parser is not supplied, standard_parser(description) is used."""
-
-    parser = parser or standard_parser(description)
-    (options, args_) = parser.parse_args()
-
-    if options.output_version:
-        standard_output_version(version, dependencies, options.output)
-        return
-
-    if options.input is None:
-        parser.print_help()
-        return
-
-    if options.silent:
-        logging.basicConfig(level=logging.CRITICAL, stream=sys.stdout)
-    elif options.verbose or options.metrics:
-        logging.basicConfig(level=logging.INFO, stream=sys.stdout)
-    else:
-        logging.basicConfig(level=logging.WARNING, stream=sys.stdout)
-
+def _standard_convert(parse, version, dependencies, options):
+    """Convert the input of the options."""
     LOG.info("input: %s", options.input)
     LOG.info("output: %s", options.output)
 
@@ -220,9 +412,13 @@ def standard_main(parse, version, description, dependencies, parser = None):
     #if options.put_post:
     #    LOG.info("## authority: %s" % (options.authority))
 
-    json_asset_ = parse(options.input, options.output,
-                        options.asset_url, options.asset_root, options.definitions,
-                        options)
+    def _parse():
+        return parse(options.input, options.output,
+                     options.asset_url, options.asset_root, options.definitions,
+                     options)
+
+    tool_name = path_splitext(path_basename(parse.func_code.co_filename))[0]
+    json_asset_ = standard_cached_convert(_parse, tool_name, version, dependencies, options)
 
     # TODO - Database Options are currently disabled
     #
@@ -246,6 +442,144 @@ def standard_main(parse, version, description, dependencies, parser = None):
     #        else:
     #            database[options.document] = json_asset.asset
 
+def standard_converter(parse, version, dependencies):
+    """Build the function converting the input of a standard tool options, for batch jobs."""
+    def _convert(options):
+        return _standard_convert(parse, version, dependencies, options)
+    return _convert
+
+def standard_batch_job(convert, parser, options, line):
+    """Call ``convert`` with the options of a manifest line, using ``options`` as the defaults.
+       Returns None on success or the error message."""
+    try:
+        (job_options, args_) = parser.parse_args(shlex_split(line), deepcopy(options))
+        if job_options.input is None:
+            return 'no input file'
+        if not path_exists(job_options.input):
+            LOG.error('Missing file: %s', job_options.input)
+            return 'missing input file %s' % job_options.input
+        convert(job_options)
+    # Keep going with the other jobs whatever happens to this one, tools exit on some fatal errors.
+    # pylint: disable=W0703
+    except (Exception, SystemExit) as e:
+        LOG.error('Failed job: %s', line)
+        LOG.error('  >> %s', e)
+        return '%s %s' % (e.__class__.__name__, e)
+    # pylint: enable=W0703
+    return None
+
+def _is_job(line):
+    """Manifest lines which are not blank or comments."""
+    return line and not line.startswith('#')
+
+def standard_batch(convert, parser, options, manifest):
+    """Convert every job of the manifest lines. Returns the number of failed jobs."""
+    converted = 0
+    failed = 0
+    for line in manifest:
+        line = line.strip()
+        if _is_job(line):
+            if standard_batch_job(convert, parser, options, line) is None:
+                converted += 1
+            else:
+                failed += 1
+    LOG.info("batch: %i converted, %i failed", converted, failed)
+    return failed
+
+def _private_directory(directory):
+    """Create the directory only accessible by the user if it doesn't exist.
+       Returns False if the directory is owned or accessible by other users."""
+    if not path_exists(directory):
+        os.makedirs(directory, 0700)
+    info = os.stat(directory)
+    return info.st_uid == os.getuid() and (info.st_mode & 077) == 0
+
+def standard_server(convert, parser, options, socket_path):
+    """Convert the jobs sent to the Unix socket until a 'quit' line is received. The socket is created in a
+       directory only accessible by the user, so other users can't send jobs. Returns 1 if the server can't start."""
+    if not hasattr(socket, 'AF_UNIX'):
+        LOG.error('server: Unix sockets are not supported on this platform')
+        return 1
+    socket_path = path_abspath(socket_path)
+    directory = path_dirname(socket_path)
+    if not _private_directory(directory):
+        LOG.error('server: %s must only be accessible by its owner', directory)
+        return 1
+    # Remove the socket left by a server which didn't stop cleanly.
+    if path_exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(5)
+    LOG.info("server: listening on %s", socket_path)
+    try:
+        while True:
+            (connection, _) = server.accept()
+            stream = connection.makefile('rwb')
+            try:
+                for line in stream:
+                    line = line.strip()
+                    if line == 'quit':
+                        return 0
+                    if _is_job(line):
+                        error = standard_batch_job(convert, parser, options, line)
+                        if error is None:
+                            stream.write('ok\n')
+                        else:
+                            stream.write('error %s\n' % error.replace('\n', ' '))
+                        stream.flush()
+            except socket.error as e:
+                LOG.warning('server: connection error: %s', e)
+            finally:
+                stream.close()
+                connection.close()
+    finally:
+        server.close()
+        os.remove(socket_path)
+
+def standard_batch_main(convert, parser, options):
+    """Run the --server or --batch mode of the options.
+       Returns 0, or 1 if a batch job failed or the server couldn't start."""
+    if options.server is not None:
+        return standard_server(convert, parser, options, options.server)
+
+    if options.batch == '-':
+        failed = standard_batch(convert, parser, options, sys.stdin)
+    else:
+        with open(options.batch, 'r') as manifest:
+            failed = standard_batch(convert, parser, options, manifest)
+    if failed:
+        return 1
+    return 0
+
+def standard_main(parse, version, description, dependencies, parser = None):
+    """Provide a consistent wrapper for standalone translation.
+       When parser is not supplied, standard_parser(description) is used.
+       Returns 1 if a batch job failed."""
+
+    parser = parser or standard_parser(description)
+    (options, args_) = parser.parse_args()
+
+    if options.output_version:
+        standard_output_version(version, dependencies, options.output)
+        return
+
+    if options.input is None and options.batch is None and options.server is None:
+        parser.print_help()
+        return
+
+    if options.silent:
+        logging.basicConfig(level=logging.CRITICAL, stream=sys.stdout)
+    elif options.verbose or options.metrics:
+        logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    else:
+        logging.basicConfig(level=logging.WARNING, stream=sys.stdout)
+
+    if options.server is not None or options.batch is not None:
+        return standard_batch_main(standard_converter(parse, version, dependencies), parser, options)
+
+    _standard_convert(parse, version, dependencies, options)
+
 def standard_json_out(json_asset, output_filename, options=None):
     """Provide a consistent output of the JSON assets."""
 
@@ -258,11 +592,26 @@ def standard_json_out(json_asset, output_filename, options=None):
         metrics = options.metrics
 
     json_asset.clean()
+    if getattr(options, 'quantize', False):
+        json_asset.quantize_sources(normal_bits=options.quantize_normal_bits)
     if metrics:
         json_asset.log_metrics()
 
+    if getattr(options, 'binary_buffers', False):
+        buffer_filename = os.path.splitext(output_filename)[0] + '.bin'
+        packed = json_asset.pack_buffers(path_basename(buffer_filename))
+        if packed is not None:
+            with open(buffer_filename, 'wb') as target:
+                target.write(packed)
+    elif getattr(options, 'b64_encoding', False):
+        json_asset.pack_buffers()
+
+    release = False
+    if options is not None:
+        release = getattr(options, 'release_sections', False)
+
     with open(output_filename, 'w') as target:
-        json_asset.json_to_file(target, True, indent)
+        json_asset.json_to_file(target, True, indent, release)
         target.write('\n')
 
 #######################################################################################################################
@@ -0,0 +1,277 @@
+# Copyright (c) 2014 Turbulenz Limited
+"""
+Post-transform vertex cache optimization of indexed triangle lists.
+
+The triangles are reordered with Tom Forsyth's linear-speed vertex cache optimization, which needs no knowledge of
+the exact cache size or replacement policy of the target hardware and works on any number of vertexes.
+A FIFO cache simulator reports the average cache miss ratio (ACMR, misses per triangle) and the average transform to
+vertex ratio (ATVR, misses per vertex, 1.0 being ideal).
+
+The clusters of an optimized list can then be sorted to draw the outward facing ones first, reducing overdraw for most
+view points, following Sander, Nehab and Barczak's "Fast Triangle Reordering for Vertex Locality and Reduced Overdraw".
+"""
+
+import math
+from collections import deque
+
+__version__ = '1.0.0'
+__dependencies__ = [ ]
+
+#######################################################################################################################
+
+DEFAULT_CACHE_SIZE = 32
+DEFAULT_OVERDRAW_THRESHOLD = 1.05
+DEFAULT_FETCH_LINE_SIZE = 64
+DEFAULT_FETCH_CACHE_LINES = 64
+
+CACHE_DECAY_POWER = 1.5
+LAST_TRIANGLE_SCORE = 0.75
+VALENCE_BOOST_SCALE = 2.0
+VALENCE_BOOST_POWER = 0.5
+
+def _cache_scores(cache_size):
+    """Score of a vertex for each position in the cache, the vertexes of the last triangle get a fixed score."""
+    scores = [ LAST_TRIANGLE_SCORE ] * min(3, cache_size)
+    scale = 1.0 / (cache_size - 3) if cache_size > 3 else 0.0
+    for position in xrange(3, cache_size):
+        scores.append((1.0 - (position - 3) * scale) ** CACHE_DECAY_POWER)
+    return scores
+
+def _valence_scores(max_valence):
+    """Score of a vertex for each number of triangles still using it, boosting the vertexes with few left."""
+    scores = [ -1.0 ]
+    for valence in xrange(1, max_valence + 1):
+        scores.append(VALENCE_BOOST_SCALE * (valence ** -VALENCE_BOOST_POWER))
+    return scores
+
+# pylint: disable=R0914
+def optimize_triangles(indexes, cache_size=DEFAULT_CACHE_SIZE):
+    """Reorder the triangles of a flat list of indexes to make good use of a post-transform vertex cache.
+    Returns the new list of indexes, the winding of each triangle is kept."""
+    num_triangles = len(indexes) // 3
+    if num_triangles < 2:
+        return list(indexes)
+
+    num_vertexes = max(indexes) + 1
+    vertex_triangles = [ [ ] for _ in xrange(num_vertexes) ]
+    for t in xrange(num_triangles):
+        n = t * 3
+        vertex_triangles[indexes[n]].append(t)
+        vertex_triangles[indexes[n + 1]].append(t)
+        vertex_triangles[indexes[n + 2]].append(t)
+
+    cache_scores = _cache_scores(cache_size)
+    valence_scores = _valence_scores(max(len(triangles) for triangles in vertex_triangles))
+
+    vertex_score = [ valence_scores[len(triangles)] for triangles in vertex_triangles ]
+    triangle_score = [ vertex_score[indexes[first]] + vertex_score[indexes[first + 1]] +
+                       vertex_score[indexes[first + 2]] for first in xrange(0, num_triangles * 3, 3) ]
+    emitted = [ False ] * num_triangles
+
+    best_triangle = max(xrange(num_triangles), key=triangle_score.__getitem__)
+    next_triangle = 0
+    cache = [ ]
+    optimized = [ ]
+    for _ in xrange(num_triangles):
+        if best_triangle < 0:
+            # Nothing left around the cache, carry on with the next triangle in the original order.
+            while emitted[next_triangle]:
+                next_triangle += 1
+            best_triangle = next_triangle
+
+        n = best_triangle * 3
+        a = indexes[n]
+        b = indexes[n + 1]
+        c = indexes[n + 2]
+        optimized.append(a)
+        optimized.append(b)
+        optimized.append(c)
+        emitted[best_triangle] = True
+        vertex_triangles[a].remove(best_triangle)
+        vertex_triangles[b].remove(best_triangle)
+        vertex_triangles[c].remove(best_triangle)
+
+        # The triangle's vertexes move to the front of the cache, pushing the others back.
+        new_cache = [ a, b, c ]
+        new_cache.extend([ v for v in cache if v != a and v != b and v != c ])
+        for position, v in enumerate(new_cache):
+            valence = len(vertex_triangles[v])
+            if position < cache_size:
+                vertex_score[v] = cache_scores[position] + valence_scores[valence] if valence else -1.0
+            else:
+                vertex_score[v] = valence_scores[valence]
+        cache = new_cache[:cache_size]
+
+        # Rescore the triangles around the cache, including the vertexes just evicted.
+        best_triangle = -1
+        best_score = -1.0
+        for v in new_cache:
+            for t in vertex_triangles[v]:
+                n = t * 3
+                score = vertex_score[indexes[n]] + vertex_score[indexes[n + 1]] + vertex_score[indexes[n + 2]]
+                triangle_score[t] = score
+                if score > best_score:
+                    best_score = score
+                    best_triangle = t
+
+    return optimized
+# pylint: enable=R0914
+
+def cache_metrics(indexes, cache_size=DEFAULT_CACHE_SIZE):
+    """Simulate a FIFO post-transform vertex cache over a flat list of triangle indexes.
+    Returns (acmr, atvr), the cache misses per triangle and per vertex used."""
+    num_triangles = len(indexes) // 3
+    if num_triangles == 0:
+        return (0.0, 0.0)
+    fifo = deque()
+    cached = set()
+    misses = 0
+    for i in indexes:
+        if i not in cached:
+            misses += 1
+            fifo.append(i)
+            cached.add(i)
+            if len(fifo) > cache_size:
+                cached.discard(fifo.popleft())
+    return (float(misses) / num_triangles, float(misses) / len(set(indexes)))
+
+def fetch_metrics(indexes, vertex_size, line_size=DEFAULT_FETCH_LINE_SIZE, cache_lines=DEFAULT_FETCH_CACHE_LINES):
+    """Simulate a FIFO cache of memory lines fetching vertex_size bytes per vertex over a flat list of indexes.
+    Returns the overfetch, the bytes read divided by the size of the vertexes used, 1.0 being ideal."""
+    if not indexes or vertex_size <= 0:
+        return 0.0
+    fifo = deque()
+    cached = set()
+    fetched = 0
+    for i in indexes:
+        start = i * vertex_size
+        for line in xrange(start // line_size, (start + vertex_size - 1) // line_size + 1):
+            if line not in cached:
+                fetched += line_size
+                fifo.append(line)
+                cached.add(line)
+                if len(fifo) > cache_lines:
+                    cached.discard(fifo.popleft())
+    return float(fetched) / (len(set(indexes)) * vertex_size)
+
+#######################################################################################################################
+
+def _triangle_misses(indexes, cache_size):
+    """Cache misses of each triangle."""
+    fifo = deque()
+    cached = set()
+    misses = [ ]
+    for t in xrange(len(indexes) // 3):
+        triangle_misses = 0
+        for i in indexes[t * 3:t * 3 + 3]:
+            if i not in cached:
+                triangle_misses += 1
+                fifo.append(i)
+                cached.add(i)
+                if len(fifo) > cache_size:
+                    cached.discard(fifo.popleft())
+        misses.append(triangle_misses)
+    return misses
+
+def _clusters(indexes, threshold, cache_size):
+    """Split the triangles where the cache restarts, then within those wherever the ACMR of the cluster so far is
+    within threshold of the ACMR of the whole."""
+    num_triangles = len(indexes) // 3
+    misses = _triangle_misses(indexes, cache_size)
+    hard = [ t for t in xrange(num_triangles) if t == 0 or misses[t] == 3 ]
+    hard.append(num_triangles)
+
+    clusters = [ ]
+    for start, end in zip(hard[:-1], hard[1:]):
+        limit = threshold * sum(misses[start:end]) / float(end - start)
+        cluster_start = start
+        fifo = deque()
+        cached = set()
+        total = 0
+        for t in xrange(start, end):
+            for i in indexes[t * 3:t * 3 + 3]:
+                if i not in cached:
+                    total += 1
+                    fifo.append(i)
+                    cached.add(i)
+                    if len(fifo) > cache_size:
+                        cached.discard(fifo.popleft())
+            if t + 1 < end and total <= limit * (t + 1 - cluster_start):
+                # The next cluster starts with an empty cache.
+                clusters.append((cluster_start, t + 1))
+                cluster_start = t + 1
+                fifo.clear()
+                cached.clear()
+                total = 0
+        clusters.append((cluster_start, end))
+    return clusters
+
+# pylint: disable=R0914
+def optimize_overdraw(indexes, positions, threshold=DEFAULT_OVERDRAW_THRESHOLD, cache_size=DEFAULT_CACHE_SIZE):
+    """Reorder the clusters of a vertex cache optimized list of triangle indexes so the ones facing away from the
+    centre of the mesh are drawn first, occluding the others from most view points. The triangles keep their order
+    within each cluster and a threshold of 1.05 allows the ACMR to grow by up to 5%.
+    positions is indexed by the indexes. Returns the new list of indexes."""
+    num_triangles = len(indexes) // 3
+    if num_triangles < 2:
+        return list(indexes)
+
+    clusters = _clusters(indexes, threshold, cache_size)
+
+    # Area weighted centroid and normal of each cluster, the length of the cross product is twice the area.
+    cluster_centroids = [ ]
+    cluster_normals = [ ]
+    mesh_centroid = [ 0.0, 0.0, 0.0 ]
+    mesh_area = 0.0
+    for start, end in clusters:
+        cx = cy = cz = 0.0
+        nx = ny = nz = 0.0
+        area = 0.0
+        for n in xrange(start * 3, end * 3, 3):
+            (x0, y0, z0) = positions[indexes[n]][:3]
+            (x1, y1, z1) = positions[indexes[n + 1]][:3]
+            (x2, y2, z2) = positions[indexes[n + 2]][:3]
+            (ux, uy, uz) = (x1 - x0, y1 - y0, z1 - z0)
+            (vx, vy, vz) = (x2 - x0, y2 - y0, z2 - z0)
+            (px, py, pz) = (uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx)
+            a = math.sqrt(px * px + py * py + pz * pz)
+            cx += a * (x0 + x1 + x2)
+            cy += a * (y0 + y1 + y2)
+            cz += a * (z0 + z1 + z2)
+            nx += px
+            ny += py
+            nz += pz
+            area += a
+        mesh_centroid[0] += cx
+        mesh_centroid[1] += cy
+        mesh_centroid[2] += cz
+        mesh_area += area
+        if area > 0.0:
+            scale = 1.0 / (3.0 * area)
+            cluster_centroids.append((cx * scale, cy * scale, cz * scale))
+        else:
+            cluster_centroids.append(None)
+        length = math.sqrt(nx * nx + ny * ny + nz * nz)
+        if length > 0.0:
+            cluster_normals.append((nx / length, ny / length, nz / length))
+        else:
+            cluster_normals.append((0.0, 0.0, 0.0))
+    if mesh_area > 0.0:
+        scale = 1.0 / (3.0 * mesh_area)
+        mesh_centroid = [ c * scale for c in mesh_centroid ]
+
+    def _sort_key(cluster):
+        centroid = cluster_centroids[cluster]
+        if centroid is None:
+            return 0.0
+        normal = cluster_normals[cluster]
+        return -((centroid[0] - mesh_centroid[0]) * normal[0] +
+                 (centroid[1] - mesh_centroid[1]) * normal[1] +
+                 (centroid[2] - mesh_centroid[2]) * normal[2])
+
+    optimized = [ ]
+    for cluster in sorted(xrange(len(clusters)), key=_sort_key):
+        (start, end) = clusters[cluster]
+        optimized.extend(indexes[start * 3:end * 3])
+    return optimized
+# pylint: enable=R0914
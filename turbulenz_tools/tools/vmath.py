@@ -6,7 +6,13 @@ Collection of math functions.
 
 import math
 
-__version__ = '1.0.0'
+# NumPy is optional, it is only required by the batch functions.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__version__ = '1.2.0'
 
 # pylint: disable=C0302,C0111,R0914,R0913
 # C0111 - Missing docstring
@@ -306,7 +312,7 @@ def v3unitcube_clamp(a):
     if a2 > 1.0:
         a2 = 1.0
     elif a2 < -1.0:
-        a2 = -.10
+        a2 = -1.0
     return a0, a1, a2
 
 #######################################################################################################################
@@ -1478,3 +1484,357 @@ def quat_from_qx_qy_qz(qx, qy, qz):
     return (qx, qy, qz, qw)
 
 #######################################################################################################################
+# Batch versions of the functions above.
+#
+# Each operand is an array of N vectors, matrices or quaternions (shape N x width) or a single one which is applied
+# to every element. Scalar operands can likewise be a single value or an array of N values. The results are NumPy
+# arrays evaluated in the same order as the scalar functions so they match them within PRECISION.
+#######################################################################################################################
+
+def _batch(a):
+    if numpy is None:
+        raise ImportError('vmath batch functions require numpy')
+    return numpy.asarray(a)
+
+def _columns(a, width):
+    a = _batch(a)
+    return [ a[..., i] for i in range(width) ]
+
+def _stack(*columns):
+    return numpy.stack(numpy.broadcast_arrays(*columns), axis=-1)
+
+def _scalars(s):
+    # Scalar operands are applied along the last axis.
+    s = _batch(s)
+    if s.ndim > 0:
+        return s[..., numpy.newaxis]
+    return s
+
+#######################################################################################################################
+
+def v3neg_batch(a):
+    return -_batch(a)
+
+def v3add_batch(a, b):
+    return _batch(a) + _batch(b)
+
+def v3add3_batch(a, b, c):
+    return _batch(a) + _batch(b) + _batch(c)
+
+def v3sub_batch(a, b):
+    return _batch(a) - _batch(b)
+
+def v3mul_batch(a, b):
+    return _batch(a) * _batch(b)
+
+def v3madd_batch(a, b, c):
+    return (_batch(a) * _batch(b)) + _batch(c)
+
+def v3muls_batch(a, b):
+    b = _scalars(b)
+    return numpy.where(b == 0, 0.0, _batch(a) * b)
+
+def v3dot_batch(a, b):
+    (a0, a1, a2) = _columns(a, 3)
+    (b0, b1, b2) = _columns(b, 3)
+    return (a0 * b0) + (a1 * b1) + (a2 * b2)
+
+def v3cross_batch(a, b):
+    (a0, a1, a2) = _columns(a, 3)
+    (b0, b1, b2) = _columns(b, 3)
+    return _stack((a1 * b2) - (a2 * b1), (a2 * b0) - (a0 * b2), (a0 * b1) - (a1 * b0))
+
+def v3lengthsq_batch(a):
+    (a0, a1, a2) = _columns(a, 3)
+    return (a0 * a0) + (a1 * a1) + (a2 * a2)
+
+def v3length_batch(a):
+    return numpy.sqrt(v3lengthsq_batch(a))
+
+def v3distancesq_batch(a, b):
+    return v3lengthsq_batch(v3sub_batch(a, b))
+
+def v3normalize_batch(a):
+    a = _batch(a)
+    lsq = v3lengthsq_batch(a)
+    valid = lsq > 0.0
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        normalized = a * (1.0 / numpy.sqrt(lsq))[..., numpy.newaxis]
+    return numpy.where(valid[..., numpy.newaxis], normalized, 0.0)
+
+def v3max_batch(a, b):
+    return numpy.maximum(_batch(a), _batch(b))
+
+def v3min_batch(a, b):
+    return numpy.minimum(_batch(a), _batch(b))
+
+def v3lerp_batch(a, b, t):
+    a = _batch(a)
+    return a + (_batch(b) - a) * _scalars(t)
+
+def v3unitcube_clamp_batch(a):
+    return numpy.clip(_batch(a), -1.0, 1.0)
+
+def v3is_zero_batch(a, tolerance=PRECISION):
+    return abs(v3lengthsq_batch(a)) < (tolerance * tolerance)
+
+def v3is_similar_batch(a, b, tolerance=PRECISION):
+    return v3dot_batch(a, b) > tolerance
+
+def v3mulm33_batch(a, m):
+    (a0, a1, a2) = _columns(a, 3)
+    (m0, m1, m2, m3, m4, m5, m6, m7, m8) = _columns(m, 9)
+    return _stack((m0 * a0 + m3 * a1 + m6 * a2),
+                  (m1 * a0 + m4 * a1 + m7 * a2),
+                  (m2 * a0 + m5 * a1 + m8 * a2))
+
+#######################################################################################################################
+
+def v4add_batch(a, b):
+    return _batch(a) + _batch(b)
+
+def v4sub_batch(a, b):
+    return _batch(a) - _batch(b)
+
+def v4muls_batch(a, b):
+    b = _scalars(b)
+    return numpy.where(b == 0, 0.0, _batch(a) * b)
+
+def v4dot_batch(a, b):
+    (a0, a1, a2, a3) = _columns(a, 4)
+    (b0, b1, b2, b3) = _columns(b, 4)
+    return (a0 * b0) + (a1 * b1) + (a2 * b2) + (a3 * b3)
+
+def v4lengthsq_batch(a):
+    (a0, a1, a2, a3) = _columns(a, 4)
+    return (a0 * a0) + (a1 * a1) + (a2 * a2) + (a3 * a3)
+
+def v4lerp_batch(a, b, t):
+    a = _batch(a)
+    return a + (_batch(b) - a) * _scalars(t)
+
+#######################################################################################################################
+
+def m43transformn_batch(m, v):
+    (v0, v1, v2) = _columns(v, 3)
+    (m0, m1, m2, m3, m4, m5, m6, m7, m8) = _columns(m, 9)
+    return _stack((m0 * v0 + m3 * v1 + m6 * v2),
+                  (m1 * v0 + m4 * v1 + m7 * v2),
+                  (m2 * v0 + m5 * v1 + m8 * v2))
+
+def m43transformp_batch(m, v):
+    (v0, v1, v2) = _columns(v, 3)
+    (m0, m1, m2, m3, m4, m5, m6, m7, m8, m9, m10, m11) = _columns(m, 12)
+    return _stack((m0 * v0 + m3 * v1 + m6 * v2 + m9),
+                  (m1 * v0 + m4 * v1 + m7 * v2 + m10),
+                  (m2 * v0 + m5 * v1 + m8 * v2 + m11))
+
+def m43mul_batch(a, b):
+    (a0, a1, a2, a3, a4, a5, a6, a7, a8, a9, a10, a11) = _columns(a, 12)
+    (b0, b1, b2, b3, b4, b5, b6, b7, b8, b9, b10, b11) = _columns(b, 12)
+    return _stack((b0 * a0 + b3 * a1 + b6 * a2),
+                  (b1 * a0 + b4 * a1 + b7 * a2),
+                  (b2 * a0 + b5 * a1 + b8 * a2),
+                  (b0 * a3 + b3 * a4 + b6 * a5),
+                  (b1 * a3 + b4 * a4 + b7 * a5),
+                  (b2 * a3 + b5 * a4 + b8 * a5),
+                  (b0 * a6 + b3 * a7 + b6 * a8),
+                  (b1 * a6 + b4 * a7 + b7 * a8),
+                  (b2 * a6 + b5 * a7 + b8 * a8),
+                  (b0 * a9 + b3 * a10 + b6 * a11 + b9),
+                  (b1 * a9 + b4 * a10 + b7 * a11 + b10),
+                  (b2 * a9 + b5 * a10 + b8 * a11 + b11))
+
+def m43determinant_batch(m):
+    (m0, m1, m2, m3, m4, m5, m6, m7, m8) = _columns(m, 9)
+    return (m0 * (m4 * m8 - m5 * m7) +
+            m1 * (m5 * m6 - m3 * m8) +
+            m2 * (m3 * m7 - m4 * m6))
+
+def m33from_axis_rotation_batch(axis, angle):
+    angle = _batch(angle)
+    s = numpy.sin(angle)
+    c = numpy.cos(angle)
+    t = 1.0 - c
+    (axisX, axisY, axisZ) = _columns(axis, 3)
+    tx = t * axisX
+    ty = t * axisY
+    tz = t * axisZ
+    sx = s * axisX
+    sy = s * axisY
+    sz = s * axisZ
+
+    return _stack(tx * axisX + c, tx * axisY + sz, tx * axisZ - sy,
+                  ty * axisX - sz, ty * axisY + c, ty * axisZ + sx,
+                  tz * axisX + sy, tz * axisY - sx, tz * axisZ + c)
+
+def m33mulm44_batch(a, b):
+    (a0, a1, a2, a3, a4, a5, a6, a7, a8) = _columns(a, 9)
+    (b0, b1, b2, b3, b4, b5, b6, b7, b8, b9, b10, b11, b12, b13, b14, b15) = _columns(b, 16)
+    return _stack((b0 * a0 + b4 * a1 + b8  * a2),
+                  (b1 * a0 + b5 * a1 + b9  * a2),
+                  (b2 * a0 + b6 * a1 + b10 * a2),
+                  (b3 * a0 + b7 * a1 + b11 * a2),
+
+                  (b0 * a3 + b4 * a4 + b8  * a5),
+                  (b1 * a3 + b5 * a4 + b9  * a5),
+                  (b2 * a3 + b6 * a4 + b10 * a5),
+                  (b3 * a3 + b7 * a4 + b11 * a5),
+
+                  (b0 * a6 + b4 * a7 + b8  * a8),
+                  (b1 * a6 + b5 * a7 + b9  * a8),
+                  (b2 * a6 + b6 * a7 + b10 * a8),
+                  (b3 * a6 + b7 * a7 + b11 * a8),
+
+                  b12, b13, b14, b15)
+
+def m43mulm44_batch(a, b):
+    (a0, a1, a2, a3, a4, a5, a6, a7, a8, a9, a10, a11) = _columns(a, 12)
+    (b0, b1, b2, b3, b4, b5, b6, b7, b8, b9, b10, b11, b12, b13, b14, b15) = _columns(b, 16)
+    return _stack((b0 * a0 + b4 * a1 + b8  * a2),
+                  (b1 * a0 + b5 * a1 + b9  * a2),
+                  (b2 * a0 + b6 * a1 + b10 * a2),
+                  (b3 * a0 + b7 * a1 + b11 * a2),
+                  (b0 * a3 + b4 * a4 + b8  * a5),
+                  (b1 * a3 + b5 * a4 + b9  * a5),
+                  (b2 * a3 + b6 * a4 + b10 * a5),
+                  (b3 * a3 + b7 * a4 + b11 * a5),
+                  (b0 * a6 + b4 * a7 + b8  * a8),
+                  (b1 * a6 + b5 * a7 + b9  * a8),
+                  (b2 * a6 + b6 * a7 + b10 * a8),
+                  (b3 * a6 + b7 * a7 + b11 * a8),
+                  (b0 * a9 + b4 * a10 + b8  * a11 + b12),
+                  (b1 * a9 + b5 * a10 + b9  * a11 + b13),
+                  (b2 * a9 + b6 * a10 + b10 * a11 + b14),
+                  (b3 * a9 + b7 * a10 + b11 * a11 + b15))
+
+def m44mul_batch(a, b):
+    a = _batch(a)
+    b = _batch(b)
+    rows = [ ]
+    for r in range(4):
+        (a0, a1, a2, a3) = _columns(a[..., r * 4:r * 4 + 4], 4)
+        rows.append(v4muls_batch(b[..., 0:4], a0) + v4muls_batch(b[..., 4:8], a1) +
+                    v4muls_batch(b[..., 8:12], a2) + v4muls_batch(b[..., 12:16], a3))
+    return numpy.concatenate(numpy.broadcast_arrays(*rows), axis=-1)
+
+def m44transpose_batch(m):
+    (m0, m1, m2, m3, m4, m5, m6, m7, m8, m9, m10, m11, m12, m13, m14, m15) = _columns(m, 16)
+    return _stack(m0, m4, m8,  m12,
+                  m1, m5, m9,  m13,
+                  m2, m6, m10, m14,
+                  m3, m7, m11, m15)
+
+#######################################################################################################################
+
+def quatdot_batch(q1, q2):
+    return v4dot_batch(q1, q2)
+
+def quatmul_batch(q1, q2):
+    (v2, w2) = (_batch(q1)[..., :3], _batch(q1)[..., 3])
+    (v1, w1) = (_batch(q2)[..., :3], _batch(q2)[..., 3])
+
+    imag = v3add3_batch(v3muls_batch(v2, w1), v3muls_batch(v1, w2), v3cross_batch(v2, v1))
+    real = (w1 * w2) - v3dot_batch(v1, v2)
+
+    (i0, i1, i2) = _columns(imag, 3)
+    return _stack(i0, i1, i2, real)
+
+def quatnormalize_batch(q):
+    q = _batch(q)
+    norme = numpy.sqrt(quatdot_batch(q, q))
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        normalized = q * (1.0 / norme)[..., numpy.newaxis]
+    return numpy.where((norme == 0.0)[..., numpy.newaxis], 0.0, normalized)
+
+def quatconjugate_batch(q):
+    (x, y, z, w) = _columns(q, 4)
+    return _stack(-x, -y, -z, w)
+
+def quatlerp_batch(q1, q2, t):
+    t = _batch(t)
+    t = numpy.where(v4dot_batch(q1, q2) > 0.0, t, -t)
+    return v4add_batch(v4muls_batch(v4sub_batch(q2, q1), t), q1)
+
+def quatslerp_batch(q1, q2, t):
+    q1 = _batch(q1)
+    q2 = _batch(q2)
+    t = _batch(t)
+    cosom = quatdot_batch(q1, q2)
+
+    negative = cosom < 0.0
+    q1 = numpy.where(negative[..., numpy.newaxis], v4muls_batch(q1, -1.0), q1)
+    cosom = numpy.where(negative, -cosom, cosom)
+
+    # use a lerp for angles <= 1 degree
+    lerp = cosom > math.cos(math.pi / 180.0)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        omega = numpy.arccos(cosom)
+        sin_omega = numpy.sin(omega)
+        s1 = numpy.sin((1.0 - t) * omega) / sin_omega
+        s2 = numpy.sin(t * omega) / sin_omega
+        slerped = v4add_batch(v4muls_batch(q1, s1), v4muls_batch(q2, s2))
+
+    return numpy.where(lerp[..., numpy.newaxis], quatnormalize_batch(quatlerp_batch(q1, q2, t)), slerped)
+
+def quattransformv_batch(q, v):
+    q = _batch(q)
+    (qimaginary, qw) = (q[..., :3], q[..., 3])
+
+    s = (qw * qw) - v3dot_batch(qimaginary, qimaginary)
+
+    r = v3muls_batch(v, s)
+
+    s = v3dot_batch(qimaginary, v)
+    r = v3add_batch(r, v3muls_batch(qimaginary, s + s))
+    r = v3add_batch(r, v3muls_batch(v3cross_batch(qimaginary, v), qw + qw))
+    return r
+
+def quatto_m43_batch(q):
+    (q0, q1, q2, q3) = _columns(q, 4)
+
+    xx = 2.0 * q0 * q0
+    yy = 2.0 * q1 * q1
+    zz = 2.0 * q2 * q2
+    xy = 2.0 * q0 * q1
+    zw = 2.0 * q2 * q3
+    xz = 2.0 * q0 * q2
+    yw = 2.0 * q1 * q3
+    yz = 2.0 * q1 * q2
+    xw = 2.0 * q0 * q3
+
+    zero = numpy.zeros_like(xx)
+    return _stack(1.0 - yy - zz, xy - zw,       xz + yw,
+                  xy + zw,       1.0 - xx - zz, yz - xw,
+                  xz - yw,       yz + xw,       1.0 - xx - yy,
+                  zero,          zero,          zero)
+
+def quatfrom_m33_batch(m):
+    (m0, m1, m2, m3, m4, m5, m6, m7, m8) = _columns(m, 9)
+    trace = m0 + m4 + m8 + 1
+    use_trace = trace > PRECISION
+    use_x = ~use_trace & (m0 > m4) & (m0 > m8)
+    use_y = ~use_trace & ~use_x & (m4 > m8)
+
+    # Every branch is evaluated, the ones not selected may divide by zero.
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        w = numpy.sqrt(trace) / 2
+        trace_q = ((m5 - m7) / (4*w), (m6 - m2) / (4*w), (m1 - m3) / (4*w), w)
+
+        s = numpy.sqrt( 1.0 + m0 - m4 - m8 ) * 2 # S=4*qx
+        x_q = (0.25 * s, (m3 + m1) / s, (m6 + m2) / s, (m5 - m7) / s)
+
+        s = numpy.sqrt( 1.0 + m4 - m0 - m8 ) * 2 # S=4*qy
+        y_q = ((m3 + m1) / s, 0.25 * s, (m7 + m5) / s, (m6 - m2) / s)
+
+        s = numpy.sqrt( 1.0 + m8 - m0 - m4 ) * 2 # S=4*qz
+        z_q = ((m6 + m2) / s, (m7 + m5) / s, 0.25 * s, (m1 - m3) / s)
+
+    (x, y, z, w) = [ numpy.select([use_trace, use_x, use_y], [t, a, b], c)
+                     for (t, a, b, c) in zip(trace_q, x_q, y_q, z_q) ]
+
+    return quatnormalize_batch(_stack(-x, -y, -z, w))
+
+def quatfrom_m43_batch(m):
+    return quatfrom_m33_batch(_batch(m)[..., :9])
@@ -6,6 +6,11 @@ Utilities to manipulate JSON data.
 import logging
 LOG = logging.getLogger('asset')
 
+from simplejson import encoder as json_encoder, dumps as json_dumps
+from simplejson.encoder import encode_basestring_ascii
+
+from turbulenz_tools.tools.vertexcache import cache_metrics, fetch_metrics
+
 def merge_dictionaries(outof, into, prefix='\t'):
     """Merge the dictionary 'outof' into the dictionary 'into'. If matching keys are found and the value is a
     dictionary, then the sub dictionary is merged."""
@@ -28,6 +33,206 @@ def float_to_string(f):
         return "1"
     return "%g" % (f)
 
+#######################################################################################################################
+
+_INFINITY = float('inf')
+
+def _float_string(f):
+    """float_to_string rejecting the non finite values, as simplejson does."""
+    a = abs(f)
+    if a < 1e-6:
+        return "0"
+    elif abs(1 - f) < 1e-6:
+        return "1"
+    elif a < _INFINITY:
+        return "%g" % (f)
+    raise ValueError('Out of range float values are not JSON compliant: %r' % f)
+
+def _number_array(values):
+    """Encode a flat list of floats and ints in one go. Returns None if it holds anything else."""
+    strings = [ ]
+    append = strings.append
+    for v in values:
+        t = type(v)
+        if t is float:
+            a = abs(v)
+            if a < 1e-6:
+                append("0")
+            elif abs(1 - v) < 1e-6:
+                append("1")
+            elif a < _INFINITY:
+                append("%g" % (v))
+            else:
+                append(_float_string(v))
+        elif t is int:
+            append(str(v))
+        else:
+            return None
+    return strings
+
+def _scalar_string(o):
+    """Encode a scalar value, returns None for containers and unsupported types."""
+    if isinstance(o, basestring):
+        return encode_basestring_ascii(o)
+    elif o is None:
+        return 'null'
+    elif o is True:
+        return 'true'
+    elif o is False:
+        return 'false'
+    elif isinstance(o, (int, long)):
+        return str(int(o))
+    elif isinstance(o, float):
+        return _float_string(float(o))
+    return None
+
+def _key_string(key):
+    if isinstance(key, basestring):
+        return key
+    elif isinstance(key, float):
+        return _float_string(float(key))
+    elif key is True:
+        return 'true'
+    elif key is False:
+        return 'false'
+    elif key is None:
+        return 'null'
+    elif isinstance(key, (int, long)):
+        return str(int(key))
+    raise TypeError('keys must be str, int, float, bool or None, not %s' % key.__class__.__name__)
+
+# pylint: disable=R0912
+def _iterencode_asset(o, chunks, sort_keys, indent, level):
+    """Append the JSON encoding of o to chunks."""
+    if isinstance(o, dict):
+        if not o:
+            chunks.append('{}')
+            return
+        if indent is None:
+            newline_indent = None
+            separator = ','
+            chunks.append('{')
+        else:
+            level += 1
+            newline_indent = '\n' + indent * level
+            separator = ',' + newline_indent
+            chunks.append('{' + newline_indent)
+        items = [ (_key_string(k), v) for k, v in o.iteritems() ]
+        if sort_keys:
+            items.sort(key=lambda item: item[0])
+        key_separator = ':' if indent is None else ': '
+        first = True
+        for k, v in items:
+            if first:
+                first = False
+            else:
+                chunks.append(separator)
+            chunks.append(encode_basestring_ascii(k) + key_separator)
+            _iterencode_asset(v, chunks, sort_keys, indent, level)
+        if newline_indent is not None:
+            chunks.append('\n' + indent * (level - 1))
+        chunks.append('}')
+
+    elif isinstance(o, (list, tuple)) and not hasattr(o, '_asdict'):
+        if not o:
+            chunks.append('[]')
+            return
+        if indent is None:
+            newline_indent = None
+            separator = ','
+        else:
+            level += 1
+            newline_indent = '\n' + indent * level
+            separator = ',' + newline_indent
+        # Flat arrays of numbers are the bulk of the geometry and animation data.
+        numbers = _number_array(o)
+        if numbers is not None:
+            if newline_indent is None:
+                chunks.append('[' + separator.join(numbers) + ']')
+            else:
+                chunks.append('[' + newline_indent + separator.join(numbers) + '\n' + indent * (level - 1) + ']')
+            return
+        chunks.append('[' if newline_indent is None else '[' + newline_indent)
+        first = True
+        for v in o:
+            if first:
+                first = False
+            else:
+                chunks.append(separator)
+            _iterencode_asset(v, chunks, sort_keys, indent, level)
+        if newline_indent is not None:
+            chunks.append('\n' + indent * (level - 1))
+        chunks.append(']')
+
+    else:
+        string = _scalar_string(o)
+        if string is None:
+            # Anything more exotic is left to simplejson.
+            json_encoder.FLOAT_REPR = float_to_string
+            if indent is None:
+                string = json_dumps(o, sort_keys=sort_keys, separators=(',', ':'))
+            else:
+                string = json_dumps(o, sort_keys=sort_keys, indent=indent)
+        chunks.append(string)
+# pylint: enable=R0912
+
+def dumps_asset(asset, sort_keys=True, indent=None):
+    """Encode the asset as JSON with float_to_string applied to all the floats.
+    This matches simplejson with FLOAT_REPR set to float_to_string, which the C speedups of simplejson don't honour,
+    and flat arrays of numbers are encoded in one go rather than through a callback per value.
+    Without an indent the output is compact, otherwise it uses the separators of simplejson."""
+    if indent is not None and not isinstance(indent, basestring):
+        indent = ' ' * indent
+    chunks = [ ]
+    _iterencode_asset(asset, chunks, sort_keys, indent, 0)
+    return ''.join(chunks)
+
+def _dump_sections(o, target, sort_keys, indent, level, release, depth):
+    """Write o to target encoding the entries of dictionaries down to depth one at a time."""
+    if depth == 0 or not isinstance(o, dict) or not o:
+        chunks = [ ]
+        _iterencode_asset(o, chunks, sort_keys, indent, level)
+        target.writelines(chunks)
+        return
+    if indent is None:
+        newline_indent = None
+        separator = ','
+        target.write('{')
+    else:
+        level += 1
+        newline_indent = '\n' + indent * level
+        separator = ',' + newline_indent
+        target.write('{' + newline_indent)
+    # Only hold the keys so released values can be freed.
+    keys = [ (_key_string(k), k) for k in o.iterkeys() ]
+    if sort_keys:
+        keys.sort(key=lambda key: key[0])
+    key_separator = ':' if indent is None else ': '
+    first = True
+    for key_string, key in keys:
+        if first:
+            first = False
+        else:
+            target.write(separator)
+        target.write(encode_basestring_ascii(key_string) + key_separator)
+        _dump_sections(o[key], target, sort_keys, indent, level, release, depth - 1)
+        if release:
+            del o[key]
+    if newline_indent is not None:
+        target.write('\n' + indent * (level - 1))
+    target.write('}')
+
+def dump_asset(asset, target, sort_keys=True, indent=None, release=False):
+    """Write the asset as JSON to the file stream, the output is the same as dumps_asset.
+    The top level sections and their entries are encoded and written one at a time so only the encoding of a single
+    geometry, node or animation is held in memory. With `release` each is removed from the asset once written, leaving
+    it empty."""
+    if indent is not None and not isinstance(indent, basestring):
+        indent = ' ' * indent
+    _dump_sections(asset, target, sort_keys, indent, 0, release, 2)
+
+#######################################################################################################################
+
 def metrics(asset):
     """Generate a collection of simple size metrics about the asset."""
     def __approximate_size(num):
@@ -37,6 +242,42 @@ def metrics(asset):
                 return "%3.1f%s" % (num, x)
             num /= 1024.0
 
+    def __vertex_metrics(shape):
+        """Simulate the vertex caches on the triangles of the shape.
+        Returns the cache misses, triangles, vertexes, position bytes fetched and position bytes used."""
+        inputs = shape['inputs']
+        indices_per_vertex = max([ i['offset'] for i in inputs.itervalues() ] or [ 0 ]) + 1
+        position_size = 0
+        if 'POSITION' in inputs and inputs['POSITION']['source'] in shape['sources']:
+            position_offset = inputs['POSITION']['offset']
+            position_size = shape['sources'][inputs['POSITION']['source']]['stride'] * 4
+        results = [ 0, 0, 0, 0, 0 ]
+        if 'surfaces' in shape:
+            surfaces = shape['surfaces'].values()
+        else:
+            surfaces = [ shape ]
+        for surface in surfaces:
+            triangles = surface.get('triangles')
+            if not isinstance(triangles, list) or not triangles:
+                continue
+            if indices_per_vertex == 1:
+                vertexes = triangles
+            else:
+                vertexes = [ tuple(triangles[n:n + indices_per_vertex])
+                             for n in xrange(0, len(triangles), indices_per_vertex) ]
+            num_triangles = len(vertexes) / 3
+            num_vertexes = len(set(vertexes))
+            (acmr, _) = cache_metrics(vertexes)
+            results[0] += acmr * num_triangles
+            results[1] += num_triangles
+            results[2] += num_vertexes
+            if position_size:
+                positions = triangles[position_offset::indices_per_vertex]
+                used = len(set(positions)) * position_size
+                results[3] += fetch_metrics(positions, position_size) * used
+                results[4] += used
+        return results
+
     def __count_nodes(nodes):
         """Recursively count the nodes."""
         num_nodes = len(nodes)
@@ -75,6 +316,16 @@ def metrics(asset):
                 m['approximate_size'] += len(shape['triangles']) * 2  # Assume short per index
             elif 'quads' in shape:
                 m['approximate_size'] += len(shape['quads']) * 2      # Assume short per index
+        vertex_metrics = [ 0, 0, 0, 0, 0 ]
+        for _, shape in asset['geometries'].items():
+            if 'inputs' in shape:
+                vertex_metrics = [ a + b for a, b in zip(vertex_metrics, __vertex_metrics(shape)) ]
+        (misses, num_triangles, num_vertexes, fetched, used) = vertex_metrics
+        if num_triangles:
+            m['average_acmr'] = round(misses / num_triangles, 3)
+            m['average_atvr'] = round(misses / num_vertexes, 3)
+        if used:
+            m['position_overfetch'] = round(fetched / used, 3)
         m['average_primitives'] = m['total_primitives'] / m['num_geometries']
         m['average_positions'] = m['total_positions'] / m['num_geometries']
         m['approximate_readable_size'] = __approximate_size(m['approximate_size'])
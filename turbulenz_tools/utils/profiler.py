@@ -37,6 +37,9 @@ class ProfilerDummyImpl(object):
     def stop(cls, _):
         return
     @classmethod
+    def add_result(cls, _, __):
+        return
+    @classmethod
     def get_root_nodes(cls):
         return []
     @classmethod
@@ -72,6 +75,12 @@ class ProfilerImpl(object):
         self._current_node.stop()
         self._current_node = self._current_stack.pop()
 
+    def add_result(self, section_name, duration):
+        # Record a section timed elsewhere, e.g. in another process
+        result = ResultNode(section_name)
+        result.duration = duration
+        self._current_node.add_child(result)
+
     def get_root_nodes(self):
         return self._root.children
 
@@ -84,9 +93,9 @@ class ProfilerImpl(object):
             if node.duration == -1:
                 duration = "(unterminated)"
             else:
-                duration = node.duration
+                duration = "%.6f" % node.duration
             _indent_string = " "*_indent
-            print "%s%-16s - %s%.6f" % (_indent_string, node.name, _indent_string, duration)
+            print "%s%-16s - %s%s" % (_indent_string, node.name, _indent_string, duration)
             for c in node.children:
                 _dump_node(c, _indent+2)
 
@@ -114,6 +123,10 @@ class Profiler(object):
     def stop(cls, section_name):
         cls._profiler_impl.stop(section_name)
 
+    @classmethod
+    def add_result(cls, section_name, duration):
+        cls._profiler_impl.add_result(section_name, duration)
+
     @classmethod
     def get_root_nodes(cls):
         return cls._profiler_impl.get_root_nodes()
@@ -190,6 +203,13 @@ def _profiler_test():
     assert 0 < s2.duration
     assert 6 == len(s2.children)
 
+    p.start('section3')
+    p.add_result('section3.1', 2.5)
+    p.stop ('section3')
+    s3 = p.get_root_nodes()[2]
+    assert 1 == len(s3.children)
+    assert 2.5 == s3.children[0].duration
+
     p.dump_data()
 
 if __name__ == "__main__":
@@ -7,7 +7,7 @@
 # All modifications are:
 # Copyright (c) 2010-2011,2013 Turbulenz Limited
 
-from simplejson import loads as json_loads, dumps as json_dumps, encoder as json_encoder
+from simplejson import loads as json_loads
 
 # pylint: disable=W0404
 try:
@@ -16,10 +16,10 @@ except ImportError:
     from xml.etree import ElementTree
 # pylint: enable=W0404
 
-from turbulenz_tools.tools.json2json import float_to_string
+from turbulenz_tools.utils.json_utils import dumps_asset
 
-__version__ = '1.0.0'
-__dependencies__ = ['turbulenz_tools.tools.json2json']
+__version__ = '1.1.0'
+__dependencies__ = [ ]
 
 #######################################################################################################################
 
@@ -156,14 +156,10 @@ def elem2json(elem, strip=True, indent=0, convert_types=False):
 
     internal = elem2internal(elem, strip=strip, convert_types=convert_types)
 
-    # Module 'simplejson' has no 'encoder' member
-    # pylint: disable=E1101
-    json_encoder.FLOAT_REPR = float_to_string
-    # pylint: enable=E1101
     if indent > 0:
-        output = json_dumps(internal, sort_keys=True, indent=indent)
+        output = dumps_asset(internal, sort_keys=True, indent=indent)
     else:
-        output = json_dumps(internal, sort_keys=True, separators=(',', ':'))
+        output = dumps_asset(internal, sort_keys=True)
 
     return output
 